@@ -0,0 +1,88 @@
+import argparse
+import datetime
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from periods import Period  # noqa: E402
+from timeseries import Series, bucket_grid  # noqa: E402
+
+# Vertaa sarjaendpointtien vastausmuotoja (rows ja columnar): vastauksen
+# koko tavuina sekä rakentamiseen ja JSON serialisointiin kuluva aika
+# kuukauden ja vuoden sarjoille. Päivämäärät serialisoidaan ISO muodossa
+# kuten FastAPI tekee. Esim.
+#   python benchmarks/columnar.py --repeat 20
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# (nimi, jakso, ämpärin koko, aikasarake, label)
+_SERIES = [
+    ("month/day", Period(datetime.date(2024, 3, 1), datetime.date(2024, 3, 31)), "day", "day", "day"),
+    ("month/hour", Period(datetime.date(2024, 3, 1), datetime.date(2024, 3, 31)), "hour", "time", None),
+    ("year/month", Period(datetime.date(2024, 1, 1), datetime.date(2024, 12, 31)), "month", "month", "month"),
+    ("year/day", Period(datetime.date(2024, 1, 1), datetime.date(2024, 12, 31)), "day", "time", None),
+    ("year/hour", Period(datetime.date(2024, 1, 1), datetime.date(2024, 12, 31)), "hour", "time", None),
+]
+
+
+def _default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(value)
+
+
+def _dumps_json(data):
+    return json.dumps({"data": data}, default=_default).encode()
+
+
+def _dumps_orjson(data):
+    return orjson.dumps({"data": data})
+
+
+def _time(function, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    serializers = {"json": _dumps_json}
+    if orjson is not None:
+        serializers["orjson"] = _dumps_orjson
+
+    print(f"{'series':<11} {'buckets':>8} {'serializer':<10} {'format':<9} {'bytes':>9} {'ms':>8}")
+
+    for name, period, granularity, time_key, label in _SERIES:
+        labels = bucket_grid(period, granularity).labels
+        series = Series(labels, [round(random.uniform(0, 50), 3) for _ in labels])
+        # columnar laskee ajat joka kerta uudelleen, cached käyttää
+        # välimuistissa olevan sarjan valmiiksi laskettuja aikoja
+        formats = {
+            "rows": lambda: series.records(time_key, "total_kwh", label),
+            "columnar": lambda: Series(series.labels, series.values).columnar(),
+            "cached": series.columnar,
+        }
+
+        for serializer, dumps in serializers.items():
+            for format, build in formats.items():
+                seconds, body = _time(lambda: dumps(build()), args.repeat)
+                print(f"{name:<11} {len(labels):>8} {serializer:<10} {format:<9} {len(body):>9} {seconds * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
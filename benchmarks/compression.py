@@ -0,0 +1,95 @@
+import argparse
+import datetime
+import gzip
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from compression import _StreamCompressor, brotli  # noqa: E402
+from fastjson import FastJSONResponse  # noqa: E402
+from serialization import ENDPOINTS  # noqa: E402
+
+# Vertaa vastausten pakkausta: pakatun vastauksen koko ja pakkaamiseen
+# kuluva CPU aika gzipin ja brotlin eri tasoilla. Vastaukset rakennetaan
+# kuten benchmarks/serialization.py:ssä, ja lisäksi mukana on NDJSON vienti
+# (kokonaan ja striimattuna EXPORT_CHUNK_ROWS rivin osissa). Esim.
+#   python benchmarks/compression.py --repeat 5 --export-rows 100000
+
+# (nimi, pakkausfunktio)
+_CODECS = [(f"gzip-{level}", lambda body, level=level: gzip.compress(body, compresslevel=level, mtime=0))
+           for level in (1, 6, 9)]
+if brotli is not None:
+    _CODECS += [(f"br-{quality}", lambda body, quality=quality: brotli.compress(body, quality=quality))
+                for quality in (1, 4, 5, 11)]
+
+
+# Viennin NDJSON rivit kuten export.ndjson_chunks tuottaa ne
+def _export_chunks(rows: int, chunk_rows: int):
+    start = datetime.datetime(2024, 3, 1)
+    sensors = [f"sensor{i}" for i in range(4)]
+    lines = [json.dumps({"sensor_id": sensors[i % len(sensors)],
+                         "timestamp": (start + datetime.timedelta(minutes=i // len(sensors))).isoformat(),
+                         "value": round(random.uniform(0, 50), 3)}) + "\n"
+             for i in range(rows)]
+    return ["".join(lines[i:i + chunk_rows]).encode() for i in range(0, rows, chunk_rows)]
+
+
+def _streamed(chunks, encoding: str):
+    compressor = _StreamCompressor(encoding)
+    return b"".join(compressor.chunk(chunk) for chunk in chunks) + compressor.finish()
+
+
+def _time(function, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+# br-11 kestää vientien kokoisilla vastauksilla kymmeniä sekunteja
+_SLOW_CODECS = ("br-11",)
+_SLOW_MAX_SIZE = 1024 * 1024
+
+
+def _report(name: str, body: bytes, repeat: int):
+    for codec, compress in _CODECS:
+        if codec in _SLOW_CODECS and len(body) > _SLOW_MAX_SIZE:
+            continue
+        seconds, compressed = _time(lambda: compress(body), repeat)
+        print(f"{name:<42} {len(body):>9} {codec:<10} {len(compressed):>9} "
+              f"{len(compressed) / len(body):>6.1%} {seconds * 1000:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--export-rows", type=int, default=100000)
+    parser.add_argument("--chunk-rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"brotli: {'installed' if brotli is not None else 'not installed'}")
+    print(f"{'payload':<42} {'bytes':>9} {'codec':<10} {'packed':>9} {'ratio':>6} {'ms':>8}")
+
+    for endpoint, build in ENDPOINTS.items():
+        _report(endpoint, FastJSONResponse(build()).body, args.repeat)
+
+    chunks = _export_chunks(args.export_rows, args.chunk_rows)
+    body = b"".join(chunks)
+    _report(f"/export ndjson ({args.export_rows} rows)", body, args.repeat)
+
+    # Striimattu vienti pakataan middlewaren oletustasolla osa kerrallaan
+    for encoding in ("gzip", "br") if brotli is not None else ("gzip",):
+        seconds, compressed = _time(lambda: _streamed(chunks, encoding), args.repeat)
+        print(f"{'/export ndjson (streamed)':<42} {len(body):>9} {encoding:<10} {len(compressed):>9} "
+              f"{len(compressed) / len(body):>6.1%} {seconds * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import statistics
+import time
+import urllib.request
+
+# Mittaa kevyiden /currents kutsujen viiveen (p50/p99), kun samaan aikaan
+# ajetaan raskaita /monthly/{date} kutsuja. Käynnistä ensin uvicorn ja aja:
+#   python benchmarks/concurrency.py --url http://localhost:8000 --date 2024-03-15
+
+
+def _get(url: str):
+    start = time.perf_counter()
+    with urllib.request.urlopen(url) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+async def _heavy_worker(base_url: str, date: str, stop: asyncio.Event):
+    paths = [
+        f"/api/measurement/consumption/total/monthly/{date}",
+        f"/api/measurement/production/total/monthly/{date}",
+    ]
+    i = 0
+    while not stop.is_set():
+        await asyncio.to_thread(_get, base_url + paths[i % len(paths)])
+        i += 1
+
+
+async def _light_requests(base_url: str, count: int):
+    timings = []
+    for _ in range(count):
+        timings.append(await asyncio.to_thread(_get, base_url + "/api/measurement/temperature/currents"))
+    return timings
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--date", default="2024-03-15")
+    parser.add_argument("--heavy", type=int, default=8, help="rinnakkaisten /monthly kutsujen määrä")
+    parser.add_argument("--requests", type=int, default=200, help="/currents kutsujen määrä")
+    args = parser.parse_args()
+
+    stop = asyncio.Event()
+    heavy = [asyncio.create_task(_heavy_worker(args.url, args.date, stop)) for _ in range(args.heavy)]
+
+    timings = await _light_requests(args.url, args.requests)
+
+    stop.set()
+    await asyncio.gather(*heavy, return_exceptions=True)
+
+    print(f"/currents with {args.heavy} parallel /monthly requests, n={len(timings)}")
+    print(f"p50: {statistics.median(timings) * 1000:.1f} ms")
+    print(f"p99: {_percentile(timings, 99) * 1000:.1f} ms")
+    print(f"max: {max(timings) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+import argparse
+import datetime
+import math
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from downsample import Lttb  # noqa: E402
+
+# Mittaa downsample.Lttb harvennuksen keston ja muistinkäytön ja vertaa
+# sitä tavalliseen LTTB:hen, joka pitää koko sarjan listana muistissa.
+# Molemmat jakavat ämpärit pisteiden määrän mukaan, joten niiden tulosten
+# on oltava samat. --coverage pienentää osuutta aikavälistä, jolla on
+# dataa (esim. anturi, joka on asennettu jakson loppupuolella); tuloksessa
+# on silti points pistettä. Esim.
+#   python benchmarks/downsample.py --rows 10000,100000,1000000 --points 500
+
+_START = datetime.datetime(2024, 1, 1)
+
+
+# Tavallinen LTTB koko sarjalle kerralla
+def _reference_lttb(series, points: int):
+    buckets = points - 2
+    start = series[0][0]
+    xy = [((timestamp - start).total_seconds(), value) for timestamp, value in series]
+
+    inner = len(series) - 2
+    bounds = [1 + math.ceil(i * inner / buckets) for i in range(buckets + 1)]
+
+    selected = [0]
+    for i in range(buckets):
+        bucket = range(bounds[i], bounds[i + 1])
+        if i + 1 < buckets:
+            following = xy[bounds[i + 1]:bounds[i + 2]]
+            next_x = sum(x for x, _ in following) / len(following)
+            next_y = sum(y for _, y in following) / len(following)
+        else:
+            next_x, next_y = xy[-1]
+
+        a_x, a_y = xy[selected[-1]]
+        selected.append(max(bucket, key=lambda j: abs((a_x - next_x) * (xy[j][1] - a_y)
+                                                     - (a_x - xy[j][0]) * (next_y - a_y))))
+    selected.append(len(series) - 1)
+
+    return [series[j] for j in selected]
+
+
+def _series(rows: int, coverage: float):
+    # Minuuttisarja, josta puuttuu alusta 1 - coverage osuus
+    offset = int(rows / coverage) - rows
+    value = 0.0
+    series = []
+    for i in range(rows):
+        value += random.gauss(0, 1)
+        series.append((_START + datetime.timedelta(minutes=offset + i), value))
+    return series
+
+
+def _streamed(series, points: int):
+    lttb = Lttb(len(series), points)
+    for timestamp, value in series:
+        lttb.add(timestamp, value)
+    return lttb.finish()
+
+
+def _measure(function, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return best, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", default="10000,100000,1000000", help="pilkulla erotetut sarjojen pituudet")
+    parser.add_argument("--points", type=int, default=500)
+    parser.add_argument("--coverage", type=float, default=1.0, help="osuus aikavälistä, jolla on dataa")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'points':>7} {'stream ms':>10} {'stream KiB':>11} {'list ms':>9} {'list KiB':>9} "
+          f"{'rows/s':>11}")
+
+    for rows in (int(rows) for rows in args.rows.split(",")):
+        series = _series(rows, args.coverage)
+
+        stream_seconds, stream_peak, streamed = _measure(lambda: _streamed(series, args.points), args.repeat)
+        list_seconds, list_peak, reference = _measure(lambda: _reference_lttb(series, args.points), args.repeat)
+        assert streamed == reference
+        assert len(streamed) == args.points
+
+        print(f"{rows:>9} {len(streamed):>7} {stream_seconds * 1000:>10.1f} {stream_peak / 1024:>11.0f} "
+              f"{list_seconds * 1000:>9.1f} {list_peak / 1024:>9.0f} {rows / stream_seconds:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import csv
+import io
+import json
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# Vertaa /api/export/{fact_table} muotoja (ndjson, csv, arrow, parquet):
+# siirrettyjen tavujen määrä, latausaika ja vastauksen jäsentämisaika
+# riveiksi / tauluksi. Arrow ja parquet jäsennetään vain, jos pyarrow on
+# asennettu myös tällä koneella. Esim.
+#   python benchmarks/export.py --url http://localhost:8000 --token <access_token> \
+#       --fact-table productions_fact --sensors sensor1,sensor2 --start 2024-01-01T00:00:00 --end 2024-03-31T23:59:59
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+def _download(url: str, token: str):
+    request = urllib.request.Request(url, headers={"Authorization": f"Bearer {token}"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        body = response.read()
+    return body, time.perf_counter() - start
+
+
+def _parse_ndjson(body: bytes):
+    return len([json.loads(line) for line in body.splitlines()])
+
+
+def _parse_csv(body: bytes):
+    return len(list(csv.DictReader(io.StringIO(body.decode()))))
+
+
+def _parse_arrow(body: bytes):
+    return pa.ipc.open_stream(body).read_all().num_rows
+
+
+def _parse_parquet(body: bytes):
+    return pq.read_table(io.BytesIO(body)).num_rows
+
+
+_PARSERS = {
+    "ndjson": _parse_ndjson,
+    "csv": _parse_csv,
+    "arrow": _parse_arrow,
+    "parquet": _parse_parquet,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--fact-table", default="productions_fact")
+    parser.add_argument("--sensors", required=True, help="pilkulla erotetut sensor_id:t")
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", required=True)
+    parser.add_argument("--formats", default="ndjson,csv,arrow,parquet")
+    args = parser.parse_args()
+
+    print(f"{'format':<8} {'rows':>10} {'bytes':>14} {'download s':>11} {'parse s':>9} {'total s':>9}")
+
+    for format in args.formats.split(","):
+        query = urllib.parse.urlencode({"sensors": args.sensors, "start": args.start, "end": args.end,
+                                        "format": format})
+        try:
+            body, download = _download(f"{args.url}/api/export/{args.fact_table}?{query}", args.token)
+        except urllib.error.HTTPError as e:
+            print(f"{format:<8} HTTP {e.code}: {e.read().decode()}")
+            continue
+
+        if format in ("arrow", "parquet") and pa is None:
+            print(f"{format:<8} {'-':>10} {len(body):>14} {download:>11.2f} {'-':>9} {download:>9.2f}")
+            continue
+
+        start = time.perf_counter()
+        rows = _PARSERS[format](body)
+        parse = time.perf_counter() - start
+
+        print(f"{format:<8} {rows:>10} {len(body):>14} {download:>11.2f} {parse:>9.2f} {download + parse:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
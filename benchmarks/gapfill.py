@@ -0,0 +1,85 @@
+import argparse
+import datetime
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gapfill import BucketGrid, fill  # noqa: E402
+
+# Vertaa gapfill.fill täyttöä vanhojen customfunctions apufunktioiden
+# tapaan (jokaiselle ämpärille "not in" haku haettujen avainten listasta,
+# O(ämpärit * rivit)). Ruudukot kasvavat vuorokauden tunneista useiden
+# kuukausien minuutteihin. Vanha tapa ajetaan vain --legacy-max ämpäriin
+# asti, koska sen kesto kasvaa neliöllisesti. Esim.
+#   python benchmarks/gapfill.py --days 1,7,30,90,180 --coverage 0.9
+
+_START = datetime.datetime(2024, 1, 1)
+
+
+# Vanhojen generate_zero_for_missing_* funktioiden algoritmi
+def _legacy_fill(labels, rows):
+    fetched = [label for label, _ in rows]
+    data = []
+    index = 0
+    for label in labels:
+        if label not in fetched:
+            data.append(0)
+        else:
+            data.append(rows[index][1])
+            index += 1
+    return data
+
+
+def _rows(grid: BucketGrid, coverage: float):
+    return [(label, random.random()) for label in grid.labels if random.random() < coverage]
+
+
+def _time(function, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", default="1,7,30,90,180", help="pilkulla erotetut jakson pituudet päivinä")
+    parser.add_argument("--steps", default="hour,minute")
+    parser.add_argument("--coverage", type=float, default=0.9, help="osuus ämpäreistä, joilla on rivi")
+    parser.add_argument("--legacy-max", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    steps = {"minute": datetime.timedelta(minutes=1), "hour": datetime.timedelta(hours=1)}
+
+    print(f"{'step':<7} {'days':>5} {'buckets':>9} {'rows':>9} {'legacy ms':>10} {'zero ms':>9} {'ffill ms':>9} "
+          f"{'cols ms':>9}")
+
+    for step in args.steps.split(","):
+        for days in (int(days) for days in args.days.split(",")):
+            grid = BucketGrid.between(_START, _START + datetime.timedelta(days=days) - steps[step], steps[step])
+            rows = _rows(grid, args.coverage)
+            records = [(label, {"value": value, "count": 1}) for label, value in rows]
+
+            zero, filled = _time(lambda: fill(grid, rows), args.repeat)
+            ffill, _ = _time(lambda: fill(grid, rows, "ffill"), args.repeat)
+            columns, _ = _time(lambda: fill(grid, records, columns=("value", "count")), args.repeat)
+
+            legacy = "-"
+            if len(grid) <= args.legacy_max:
+                seconds, expected = _time(lambda: _legacy_fill(grid.labels, rows), 1)
+                assert expected == filled
+                legacy = f"{seconds * 1000:.1f}"
+
+            print(f"{step:<7} {days:>5} {len(grid):>9} {len(rows):>9} {legacy:>10} {zero * 1000:>9.1f} "
+                  f"{ffill * 1000:>9.1f} {columns * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import datetime
+import json
+import random
+import time
+import urllib.request
+
+# Kirjoittaa synteettisiä lukemia /api/ingest endpointin kautta ja tulostaa
+# rivit sekunnissa. Anturien on oltava sensors_dim taulussa. Esim.
+#   python benchmarks/ingest.py --url http://localhost:8000 --token <access_token> \
+#       --fact-table measurements_fact --sensors sensor1,sensor2 --readings 10000000
+
+
+def _post(url: str, token: str, body: dict):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), method="POST",
+                                     headers={"Content-Type": "application/json",
+                                              "Authorization": f"Bearer {token}"})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--fact-table", default="measurements_fact")
+    parser.add_argument("--sensors", required=True, help="pilkulla erotetut sensor_id:t")
+    parser.add_argument("--readings", type=int, default=10_000_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--start", default="2030-01-01T00:00:00",
+                        help="ensimmäinen aikaleima, oltava uudempi kuin dates_dim taulun uusin rivi")
+    args = parser.parse_args()
+
+    sensors = args.sensors.split(",")
+    timestamp = datetime.datetime.fromisoformat(args.start)
+    step = datetime.timedelta(seconds=1)
+
+    sent = 0
+    inserted = 0
+    new_dates = 0
+    start = time.perf_counter()
+
+    while sent < args.readings:
+        readings = []
+        while len(readings) < args.batch and sent + len(readings) < args.readings:
+            for sensor_id in sensors:
+                readings.append({"sensor_id": sensor_id, "timestamp": timestamp.isoformat(),
+                                 "value": round(random.uniform(0, 100), 3)})
+            timestamp += step
+
+        result = _post(f"{args.url}/api/ingest", args.token, {"fact_table": args.fact_table, "readings": readings})
+        sent += len(readings)
+        inserted += result["inserted"]
+        new_dates += result["new_dates"]
+
+        elapsed = time.perf_counter() - start
+        print(f"{sent} readings, {sent / elapsed:.0f} rows/s", end="\r")
+
+    elapsed = time.perf_counter() - start
+    print()
+    print(f"sent: {sent}, inserted: {inserted}, new dates_dim rows: {new_dates}")
+    print(f"elapsed: {elapsed:.1f} s, {sent / elapsed:.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import datetime
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from fastjson import FastJSONResponse, orjson  # noqa: E402
+from periods import Period  # noqa: E402
+from timeseries import Series, SensorSeries, bucket_grid  # noqa: E402
+
+# Vertaa endpointtien vastausten serialisointia ennen (jsonable_encoder +
+# JSONResponse, FastAPIn oletus) ja jälkeen (FastJSONResponse). Vastaukset
+# rakennetaan samoin kuin endpointeissa satunnaisilla arvoilla, joten
+# kantaa ei tarvita. Esim.
+#   python benchmarks/serialization.py --repeat 20
+
+_DAY = Period(datetime.date(2024, 3, 15), datetime.date(2024, 3, 15))
+_MONTH = Period(datetime.date(2024, 3, 1), datetime.date(2024, 3, 31))
+_YEAR = Period(datetime.date(2024, 1, 1), datetime.date(2024, 12, 31))
+
+
+def _series(period: Period, granularity: str):
+    labels = bucket_grid(period, granularity).labels
+    return Series(labels, [round(random.uniform(0, 50), 3) for _ in labels])
+
+
+def _rows(period: Period, granularity: str, time_key: str, keys):
+    labels = bucket_grid(period, granularity).labels
+    return [{time_key: label, **{key: round(random.uniform(0, 50), 3) for key in keys}} for label in labels]
+
+
+def _currents():
+    now = datetime.datetime(2024, 3, 15, 12)
+    sensors = [{"sensor": f"device: sensor {i}", "sensor_id": f"id{i}", "C": 21.5} for i in range(4)]
+    return {"data": [{"oldest_time": str(now), "refreshed_at": now}, sensors]}
+
+
+# Endpoint -> vastauksen rakentava funktio
+ENDPOINTS = {
+    "/consumption/total/hourly/{date}": lambda: {"data": _series(_DAY, "hour").records("hour", "total_kwh", "hour")},
+    "/consumption/total/daily/month/{date}":
+        lambda: {"data": _series(_MONTH, "day").records("day", "total_kwh", "day")},
+    "/consumption/total/monthly/{date}":
+        lambda: {"data": _series(_YEAR, "month").records("month", "total_kwh", "month")},
+    "/consumption/total/range (hour)":
+        lambda: {"data": _series(_MONTH, "hour").records("time", "total_kwh"), "granularity": "hour"},
+    "/consumption/breakdown/daily/month/{date}":
+        lambda: {"data": _rows(_MONTH, "day", "day", ("heating_kwh", "lighting_kwh", "outlets_kwh", "total_kwh"))},
+    "/balance/range (day)": lambda: {"data": _rows(_YEAR, "day", "time", ("production_kwh", "consumption_kwh",
+                                                                          "net_kwh", "self_consumption")),
+                                     "granularity": "day"},
+    "/sensors/{fact_table} (3 x hour)": lambda: {"data": SensorSeries(
+        bucket_grid(_MONTH, "hour").labels,
+        {key: _series(_MONTH, "hour").values for key in (229, 116, 7)}).as_dict(), "granularity": "hour"},
+    "/temperature/currents": _currents,
+}
+
+
+def _before(content):
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def _after(content):
+    return FastJSONResponse(content).body
+
+
+def _time(function, content, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = function(content)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"serializer: {'orjson' if orjson is not None else 'json (orjson not installed)'}")
+    print(f"{'endpoint':<42} {'bytes':>8} {'before ms':>10} {'after ms':>9} {'speedup':>8}")
+
+    for endpoint, build in ENDPOINTS.items():
+        content = build()
+        before, body = _time(_before, content, args.repeat)
+        after, _ = _time(_after, content, args.repeat)
+        print(f"{endpoint:<42} {len(body):>8} {before * 1000:>10.2f} {after * 1000:>9.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
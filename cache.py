@@ -0,0 +1,174 @@
+import datetime
+import os
+import time
+from collections import OrderedDict
+
+from calendar_index import calendar_index
+
+# Välimuistin enimmäiskoko (tietueita) ja avoimen jakson tietueen
+# enimmäisikä sekunteina.
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 1024))
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 300))
+
+
+# Aikasarjojen ja yhteenvetojen LRU-välimuisti. Tietueet ovat kahta lajia:
+# - suljetut jaksot, jotka päättyvät ennen koosteiden vesirajan päivää.
+#   Niiden data muuttuu vain myöhässä saapuneista lukemista, joten ne
+#   pidetään kunnes LRU poistaa ne tai closed_changes laskuri kasvaa.
+# - avoimet jaksot, jotka poistetaan kun faktataulun datan versio muuttuu
+#   tai viimeistään RESPONSE_CACHE_TTL sekunnin kuluttua.
+# Datan versiot luetaan kaikissa workereissa rollup_watermarks taulusta
+# (ks. rollups.read_versions), joten ne ovat kaikissa workereissa samat.
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (value, fact_table, period_end, closed, expires_at)
+        self._entries = OrderedDict()
+
+        # Faktataulujen datan versiot (ks. rollups.read_versions),
+        # vesirajojen päivämäärät ja sukupolvet. Sukupolvi kasvaa, kun
+        # vesiraja tai jokin laskureista muuttuu.
+        self._versions = {}
+        self._watermarks = {}
+        self._watermark_dates = {}
+        self._generations = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, fact_table, period_end, closed, expires_at = entry
+
+        if not closed and expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def watermark(self, fact_table: str):
+        return self._watermarks.get(fact_table)
+
+    # Taulun datan versio merkkijonona ETagia varten, tai None jos sitä
+    # ei ole vielä luettu
+    def data_version(self, fact_table: str):
+        version = self._versions.get(fact_table)
+        if version is None:
+            return None
+
+        return f"{version['watermark']}-{version['write_count']}-{version['max_key']}"
+
+    def generation(self, fact_table: str):
+        return self._generations.get(fact_table, 0)
+
+    # Tallentaa tuloksen. generation on taulun sukupolvi ennen kyselyä: jos
+    # vesiraja on edennyt kyselyn aikana, tulos voi olla jo vanhentunut
+    # eikä sitä tallenneta.
+    def put(self, key, value, fact_table: str, period_end: datetime.date, generation: int):
+        if generation != self.generation(fact_table):
+            return
+
+        closed = self.is_closed(fact_table, period_end)
+        self._entries[key] = (value, fact_table, period_end, closed, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    # Jakso on suljettu, kun se päättyy ennen koosteiden vesirajan päivää.
+    # Silloin jakson kaikki rivit on jo koostettu.
+    def is_closed(self, fact_table: str, period_end: datetime.date):
+        watermark_date = self._watermark_dates.get(fact_table)
+        return watermark_date is not None and period_end < watermark_date
+
+    # Poistaa avoimien jaksojen tietueet. Jos include_closed on True,
+    # poistetaan myös suljetut, changed_from annettuna vain ne, jotka
+    # päättyvät sinä päivänä tai myöhemmin. Ilman fact_tablea koskee
+    # kaikkia tauluja.
+    def invalidate(self, fact_table: str | None = None, include_closed: bool = False,
+                   changed_from: datetime.date | None = None):
+        keys = [key for key, (_, table, period_end, closed, _) in self._entries.items()
+                if (fact_table is None or table == fact_table)
+                and (not closed or include_closed and (changed_from is None or period_end >= changed_from))]
+
+        for key in keys:
+            del self._entries[key]
+
+        self.invalidations += len(keys)
+        return len(keys)
+
+    # Kutsutaan, kun datan versiot on luettu kannasta. Kun vesiraja on
+    # edennyt tai tauluun on kirjoitettu ingestin kautta, taulun avoimet
+    # tietueet poistetaan. Pelkkä max_keyn muutos vaikuttaa vain ETageihin:
+    # avoimien jaksojen vesirajan jälkeiset rivit luetaan joka tapauksessa
+    # uudelleen viimeistään ttl:n kuluttua.
+    # Kun closed_changes on kasvanut, suljettuihin jaksoihin on tullut
+    # myöhässä saapuneita lukemia changed_from päivästä alkaen. Jos
+    # laskuri on kasvanut useammalla kuin yhdellä, välissä olleiden
+    # muutosten päiviä ei tiedetä, joten kaikki suljetut poistetaan.
+    def sync_versions(self, versions: dict):
+        for fact_table, version in versions.items():
+            date_key = version["watermark"]
+            previous = self._versions.get(fact_table)
+            self._versions[fact_table] = version
+
+            if previous is not None and all(previous[name] == version[name]
+                                            for name in ("watermark", "write_count", "closed_changes")):
+                # Kalenteri-indeksi ei välttämättä ollut vielä ladattu
+                if self._watermark_dates.get(fact_table) is None:
+                    self._watermark_dates[fact_table] = _key_date(date_key)
+                continue
+
+            self._watermarks[fact_table] = date_key
+            self._watermark_dates[fact_table] = _key_date(date_key)
+            self._generations[fact_table] = self.generation(fact_table) + 1
+
+            if previous is None or previous["closed_changes"] == version["closed_changes"]:
+                self.invalidate(fact_table)
+            elif version["closed_changes"] == previous["closed_changes"] + 1:
+                self.invalidate(fact_table, include_closed=True, changed_from=version["changed_from"])
+            else:
+                self.invalidate(fact_table, include_closed=True)
+
+    def stats(self):
+        closed = sum(1 for _, _, _, is_closed, _ in self._entries.values() if is_closed)
+        return {
+            "entries": len(self._entries),
+            "closed_entries": closed,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "watermarks": dict(self._watermarks),
+        }
+
+
+# date_keyn päivämäärä kalenteri-indeksistä, tai None jos sitä ei tiedetä.
+# Tällöin mitään jaksoa ei pidetä suljettuna.
+def _key_date(date_key: int):
+    if not calendar_index.usable():
+        return None
+
+    try:
+        year, month, day, _ = calendar_index.calendar(date_key)
+    except KeyError:
+        return None
+
+    return datetime.date(year, month, day)
+
+
+# Sovelluksen yhteinen välimuisti
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
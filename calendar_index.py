@@ -0,0 +1,158 @@
+import asyncio
+import datetime
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+
+from sqlalchemy import text
+
+from db import dw_session
+
+# Kuinka usein (sekunteina) indeksiin haetaan uudet dates_dim rivit.
+CALENDAR_REFRESH_INTERVAL = int(os.environ.get("CALENDAR_REFRESH_INTERVAL", 30))
+
+# Montako riviä haetaan kerralla kantaa luettaessa.
+_FETCH_CHUNK_SIZE = 50000
+
+
+# Muistissa pidettävä dates_dim-indeksi. Rivit ovat date_keyn mukaan
+# järjestyksessä rinnakkaisissa taulukoissa, joten rivi vie muistia
+# 9 tavua (date_key 4, vuosi 2, muut 1 tavun). Koska date_keyt kasvavat
+# ajan mukana, sekä date_key -> kalenteri että päivämäärä -> date_key
+# -haut ovat binäärihakuja.
+class CalendarIndex:
+    def __init__(self):
+        self.date_keys = array('i')
+        self.years = array('h')
+        self.months = array('b')
+        self.days = array('b')
+        self.hours = array('b')
+        # Viimeisen rivin koko ajankohta (y, m, d, h, min, sec, ms).
+        # Minuutteja ja sekunteja tarvitaan vain järjestyksen tarkistukseen,
+        # joten niitä ei pidetä taulukoissa.
+        self._last_time = ()
+
+        # Indeksiä käytetään vasta kun alkulataus on valmis. Jos date_keyt
+        # eivät olekaan aikajärjestyksessä, indeksi merkitään
+        # käyttökelvottomaksi ja haut tehdään kannasta.
+        self.loaded = False
+        self.ordered = True
+
+        # Estää samanaikaiset päivitykset, jotka lisäisivät samat rivit kahdesti
+        self._refresh_lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.date_keys)
+
+    def usable(self):
+        return self.loaded and self.ordered and len(self.date_keys) > 0
+
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.date_keys, self.years, self.months, self.days, self.hours))
+
+    def last_key(self):
+        return self.date_keys[-1] if len(self.date_keys) > 0 else 0
+
+    def last_date(self):
+        if len(self.date_keys) == 0:
+            return None
+        return datetime.date(self.years[-1], self.months[-1], self.days[-1])
+
+    def _append_rows(self, rows):
+        previous = self._last_time
+        ordered = self.ordered
+
+        for row in rows:
+            current = tuple(row[1:])
+            if current < previous:
+                ordered = False
+            previous = current
+
+            self.date_keys.append(row[0])
+            self.years.append(row[1])
+            self.months.append(row[2])
+            self.days.append(row[3])
+            self.hours.append(row[4])
+
+        self._last_time = previous
+        self.ordered = ordered
+
+    # Hakee kannasta rivit, joiden date_key on suurempi kuin indeksin viimeinen.
+    # Palauttaa lisättyjen rivien määrän.
+    async def refresh(self, dw):
+        async with self._refresh_lock:
+            _query = text("SELECT date_key, year, month, day, hour, min, sec, ms FROM dates_dim "
+                          "WHERE date_key > :last_key ORDER BY date_key;")
+            rows = await dw.stream(_query, {"last_key": self.last_key()},
+                                   execution_options={"yield_per": _FETCH_CHUNK_SIZE})
+
+            count = len(self.date_keys)
+            async for partition in rows.partitions():
+                self._append_rows(partition)
+
+            return len(self.date_keys) - count
+
+    # Alkulataus. Rivit luetaan uuteen indeksiin, joka vaihdetaan käyttöön
+    # vasta kun se on kokonaan ladattu.
+    async def load(self, dw):
+        index = CalendarIndex()
+        await index.refresh(dw)
+
+        for name in ("date_keys", "years", "months", "days", "hours", "_last_time", "ordered"):
+            setattr(self, name, getattr(index, name))
+        self.loaded = True
+
+    def _calendar_tuple(self, i):
+        return self.years[i], self.months[i], self.days[i], self.hours[i]
+
+    # Ensimmäisen rivin indeksi, jonka ajankohta on >= point (tuple (y, m, d[, h]))
+    def _bisect(self, point):
+        return bisect_left(range(len(self.date_keys)), point,
+                           key=lambda i: self._calendar_tuple(i)[:len(point)])
+
+    def _position(self, date_key):
+        i = bisect_left(self.date_keys, date_key)
+        if i == len(self.date_keys) or self.date_keys[i] != date_key:
+            raise KeyError(date_key)
+        return i
+
+    # date_key -> (year, month, day, hour)
+    def calendar(self, date_key):
+        i = self._position(date_key)
+        return self.years[i], self.months[i], self.days[i], self.hours[i]
+
+    # Jakson (first_key, last_key) tai None, jos jaksolla ei ole rivejä.
+    def key_range(self, start: datetime.date, end: datetime.date):
+        first = self._bisect((start.year, start.month, start.day))
+        last = bisect_right(range(len(self.date_keys)), (end.year, end.month, end.day),
+                            key=lambda i: self._calendar_tuple(i)[:3]) - 1
+
+        if first > last:
+            return None
+
+        return self.date_keys[first], self.date_keys[last]
+
+
+# Sovelluksen yhteinen indeksi
+calendar_index = CalendarIndex()
+
+
+# Taustatehtävä, joka käynnistetään main.py:n lifespanissa. Ladataan
+# indeksi ja haetaan sen jälkeen säännöllisesti uudet rivit.
+async def maintain_calendar_index():
+    while not calendar_index.loaded:
+        try:
+            async with dw_session() as _dw:
+                await calendar_index.load(_dw)
+            print(f"Calendar index loaded: {len(calendar_index)} rows, {calendar_index.nbytes()} bytes")
+        except Exception as e:
+            print(f"Calendar index load failed: {e}")
+            await asyncio.sleep(CALENDAR_REFRESH_INTERVAL)
+
+    while True:
+        await asyncio.sleep(CALENDAR_REFRESH_INTERVAL)
+        try:
+            async with dw_session() as _dw:
+                await calendar_index.refresh(_dw)
+        except Exception as e:
+            print(f"Calendar index refresh failed: {e}")
@@ -0,0 +1,234 @@
+import gzip
+import hashlib
+import os
+import zlib
+from collections import OrderedDict
+
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Pienempiä vastauksia (tavuina) ei pakata: pakkaus ei juuri pienennä niitä
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+# gzip 1-9 ja brotli 0-11. Oletukset ovat hyvä kompromissi CPU:n ja koon
+# välillä (ks. benchmarks/compression.py).
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", 4))
+# Montako pakattua vastausta pidetään muistissa
+COMPRESSED_CACHE_SIZE = int(os.environ.get("COMPRESSED_CACHE_SIZE", 512))
+# Tätä suuremmat vastaukset pakataan säikeessä, jotta event loop ei pysähdy
+_THREAD_MIN_SIZE = 128 * 1024
+
+# Jo valmiiksi pakattuja muotoja ei pakata uudelleen
+_EXCLUDED_CONTENT_TYPES = ("application/vnd.apache.parquet", "application/zip", "application/gzip", "image/")
+
+
+# Asiakkaan hyväksymä pakkaus Accept-Encoding headerista: br, jos brotli on
+# asennettu, muuten gzip. None, jos kumpikaan ei käy.
+def choose_encoding(accept_encoding: str):
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str):
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+# Striimatun vastauksen pakkaaja: jokainen osa pakataan ja lähetetään heti
+# (flush), jotta asiakas saa rivit sitä mukaa kun ne luetaan kannasta.
+class _StreamCompressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def chunk(self, body: bytes):
+        if self.encoding == "br":
+            return self._compressor.process(body) + self._compressor.flush()
+        return self._compressor.compress(body) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.finish() if self.encoding == "br" else self._compressor.flush()
+
+
+# Pakatut vastaukset (pakkaamattoman rungon tiiviste, pakkaus) -> tavut.
+# Avain lasketaan rungosta eikä ETagista, koska saman ETagin vastaukset
+# voivat erota (esim. /currents vastausten refreshed_at). Vanhentuneita
+# tietueita ei siis voi palauttaa, ja ne poistuvat LRU:n mukana.
+# Välimuistista tulevia vastauksia ei pakata uudelleen jokaisella
+# requestilla: tiivisteen laskeminen on paljon pakkaamista nopeampaa.
+class CompressedCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        body = self._entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def put(self, key, body: bytes):
+        self._entries[key] = body
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": sum(len(body) for body in self._entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+compressed_cache = CompressedCache(COMPRESSED_CACHE_SIZE)
+
+
+# ASGI middleware, joka pakkaa vastaukset gzipillä tai brotlilla
+# Accept-Encoding headerin mukaan. Kokonaiset vastaukset pakataan vain, jos
+# ne ovat vähintään minimum_size tavua. Striimatut vastaukset (esim.
+# /api/export) pakataan osa kerrallaan.
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+
+        self.send = None
+        self.start = None
+        self.passthrough = False
+        self.stream = None
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self._send)
+
+    async def _send(self, message):
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = "content-encoding" in headers \
+                or any(content_type.startswith(excluded) for excluded in _EXCLUDED_CONTENT_TYPES)
+            self.start = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._flush_start()
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.stream is not None:
+            body = self.stream.chunk(body) if more_body else self.stream.chunk(body) + self.stream.finish()
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        if more_body:
+            # Striimattu vastaus: kokoa ei tiedetä etukäteen
+            self.stream = _StreamCompressor(self.encoding)
+            headers = self._encoded_headers()
+            del headers["content-length"]
+            await self._flush_start()
+            await self.send({"type": "http.response.body", "body": self.stream.chunk(body), "more_body": True})
+            return
+
+        if len(body) < self.minimum_size:
+            await self._flush_start()
+            await self.send(message)
+            return
+
+        body = await self._compressed(body)
+        headers = self._encoded_headers()
+        headers["content-length"] = str(len(body))
+        await self._flush_start()
+        await self.send({"type": "http.response.body", "body": body})
+
+    # Pakattu vastaus välimuistista, jos sama runko on jo pakattu. Vain
+    # ETagilliset vastaukset tallennetaan: ne toistuvat, kun taas muut
+    # (esim. uniikit viennit) vain syrjäyttäisivät niitä LRU:sta.
+    async def _compressed(self, body: bytes):
+        cacheable = "etag" in Headers(raw=self.start["headers"]) and self.start["status"] == 200
+
+        if cacheable:
+            key = (hashlib.blake2b(body, digest_size=16).digest(), self.encoding)
+            compressed = compressed_cache.get(key)
+            if compressed is not None:
+                return compressed
+
+        if len(body) >= _THREAD_MIN_SIZE:
+            compressed = await run_in_threadpool(compress, body, self.encoding)
+        else:
+            compressed = compress(body, self.encoding)
+
+        if cacheable:
+            compressed_cache.put(key, compressed)
+
+        return compressed
+
+    def _encoded_headers(self):
+        headers = MutableHeaders(scope=self.start)
+        headers["content-encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        return headers
+
+    async def _flush_start(self):
+        if self.start is not None:
+            await self.send(self.start)
+            self.start = None
@@ -1,45 +1,153 @@
+import asyncio
 import os
+import time
+from contextlib import AsyncExitStack
 from typing import Annotated
 
 from dotenv import load_dotenv
 from fastapi import Depends
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
 # Aukaistaan .env filu ja haetaan DW (olap) ja DB (oltp)
 load_dotenv(dotenv_path=".env")
 
+# Kannat käytetään asynkronisen ajurin kautta, jotta kyselyt eivät pysäytä
+# uvicornin event looppia. .env:n osoitteiden ajuri vaihdetaan ASYNC_DRIVER
+# -muuttujan mukaiseksi (oletus mysql+aiomysql).
+async_driver = os.environ.get("ASYNC_DRIVER", "mysql+aiomysql")
+
+
+def _async_url(url: str):
+    return make_url(url).set(drivername=async_driver)
+
+
+# Poolin asetukset luetaan enginekohtaisesti .env:stä, esim. DW_POOL_SIZE
+# ja DB_POOL_SIZE. Yhteensä kanta voi saada workeria kohden enintään
+# pool_size + max_overflow yhteyttä enginestä.
+def _pool_options(prefix: str):
+    return {
+        "pool_size": int(os.environ.get(f"{prefix}_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get(f"{prefix}_MAX_OVERFLOW", 10)),
+        "pool_timeout": float(os.environ.get(f"{prefix}_POOL_TIMEOUT", 30)),
+        # MySQL katkaisee käyttämättömät yhteydet wait_timeoutin jälkeen
+        "pool_recycle": int(os.environ.get(f"{prefix}_POOL_RECYCLE", 3600)),
+        "pool_pre_ping": os.environ.get(f"{prefix}_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+    }
+
+
+# Poolin laskurit /api/admin/pool endpointia varten. Odotusaika mitataan
+# siitä, kun request pyytää yhteyttä, siihen kun se saadaan poolista.
+class PoolStats:
+    def __init__(self, engine, max_overflow: int):
+        self.engine = engine
+        self.max_overflow = max_overflow
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+        event.listen(engine.sync_engine, "connect", self._on_connect)
+        event.listen(engine.sync_engine, "checkout", self._on_checkout)
+        event.listen(engine.sync_engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self.invalidations += 1
+
+    # Otetaan sessiolle yhteys poolista heti ja kirjataan odotusaika
+    async def checkout(self, session: AsyncSession):
+        start = time.perf_counter()
+        try:
+            await session.connection()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            self.waits += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def snapshot(self):
+        pool = self.engine.pool
+        return {
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": self.max_overflow,
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "invalidations": self.invalidations,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": self.wait_total / self.waits * 1000 if self.waits else 0,
+            "wait_max_ms": self.wait_max * 1000,
+        }
+
+
+# Avataan käynnistyksessä poolin verran yhteyksiä yhtä aikaa, jotta
+# ensimmäiset requestit eivät joudu odottamaan yhteyden muodostamista.
+async def warm_up_pool(engine, connections: int):
+    async with AsyncExitStack() as stack:
+        conns = await asyncio.gather(*(stack.enter_async_context(engine.connect()) for _ in range(connections)))
+        await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in conns))
+
+
 # DW käyttää OLAP tietokantaa
 dw = os.environ.get("DW")
-dw_engine = create_engine(dw)
-dw_session = sessionmaker(bind=dw_engine)
+dw_pool_options = _pool_options("DW")
+dw_engine = create_async_engine(_async_url(dw), **dw_pool_options)
+dw_session = async_sessionmaker(bind=dw_engine, expire_on_commit=False)
+dw_pool_stats = PoolStats(dw_engine, dw_pool_options["max_overflow"])
 
 # DB käyttää OLTP tietokantaa
 db = os.environ.get("DB")
-db_engine = create_engine(db)
-db_session = sessionmaker(bind=db_engine)
+db_pool_options = _pool_options("DB")
+db_engine = create_async_engine(_async_url(db), **db_pool_options)
+db_session = async_sessionmaker(bind=db_engine, expire_on_commit=False)
+db_pool_stats = PoolStats(db_engine, db_pool_options["max_overflow"])
+
+
+async def warm_up_pools():
+    await asyncio.gather(
+        warm_up_pool(dw_engine, dw_pool_options["pool_size"]),
+        warm_up_pool(db_engine, db_pool_options["pool_size"]),
+    )
 
 
-def get_dw():
+async def get_dw():
     _dw = None
     try:
         _dw = dw_session()
+        await dw_pool_stats.checkout(_dw)
         yield _dw
     finally:
         if _dw is not None:
-            _dw.close()
+            await _dw.close()
 
 
-def get_db():
+async def get_db():
     _db = None
     try:
         _db = db_session()
+        await db_pool_stats.checkout(_db)
         yield _db
     finally:
         if _db is not None:
-            _db.close()
+            await _db.close()
 
 
 # Nämä importataan sinne, missä databaseja tarvii
-DW = Annotated[Session, Depends(get_dw)]
-DB = Annotated[Session, Depends(get_db)]
+DW = Annotated[AsyncSession, Depends(get_dw)]
+DB = Annotated[AsyncSession, Depends(get_db)]
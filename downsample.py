@@ -0,0 +1,106 @@
+import datetime
+
+from export import ExportSlice, count_rows, stream_rows
+
+# Pisteiden oletus- ja enimmäismäärä harvennetussa sarjassa
+DEFAULT_POINTS = 500
+MAX_POINTS = 5000
+
+
+# Largest-Triangle-Three-Buckets -harvennus, joka käsittelee pisteet yksi
+# kerrallaan aikajärjestyksessä. Sarjan count pistettä jaetaan
+# (points - 2) ämpäriin pisteiden määrän mukaan kuten tavallisessa LTTB:ssä,
+# jolloin jokaisessa ämpärissä on pisteitä ja tuloksessa on points pistettä,
+# vaikka data kattaisi vain osan pyydetystä aikavälistä. Jokaisesta
+# ämpäristä valitaan piste, joka muodostaa suurimman kolmion edellisen
+# valitun pisteen ja seuraavan ämpärin keskiarvon kanssa. Ensimmäinen ja
+# viimeinen piste otetaan aina mukaan. Muistissa on kerrallaan vain kaksi
+# ämpäriä.
+class Lttb:
+    def __init__(self, count: int, points: int):
+        self.count = count
+        self.buckets = points - 2
+
+        self.start = None
+        self.selected = []
+        # Montako pistettä on lisätty ämpäreihin
+        self._added = 0
+        self._bucket_index = None
+        self._bucket = []
+        # Ämpäri, jonka piste valitaan, kun seuraava ämpäri on täynnä
+        self._pending = None
+        # Viimeisin piste. Se lisätään ämpäriin vasta kun seuraava tulee,
+        # koska sarjan viimeinen piste ei kuulu mihinkään ämpäriin.
+        self._last = None
+
+    def add(self, timestamp: datetime.datetime, value: float):
+        if self.start is None:
+            self.start = timestamp
+        point = ((timestamp - self.start).total_seconds(), value, timestamp)
+
+        if not self.selected:
+            self.selected.append(point)
+            return
+
+        if self._last is not None:
+            self._add_to_bucket(self._last)
+        self._last = point
+
+    def _add_to_bucket(self, point):
+        # Pisteet 1..count-2 jaetaan tasan ämpäreihin. Jos kantaan on tullut
+        # rivejä laskemisen jälkeen, ylimääräiset menevät viimeiseen ämpäriin.
+        index = min(self._added * self.buckets // max(self.count - 2, 1), self.buckets - 1)
+        self._added += 1
+
+        if index != self._bucket_index:
+            self._close_bucket()
+            self._bucket_index = index
+        self._bucket.append(point)
+
+    def _close_bucket(self):
+        if not self._bucket:
+            return
+
+        if self._pending is not None:
+            count = len(self._bucket)
+            self._select(self._pending, sum(p[0] for p in self._bucket) / count,
+                         sum(p[1] for p in self._bucket) / count)
+
+        self._pending = self._bucket
+        self._bucket = []
+
+    # Valitsee ämpäristä pisteen, jonka kolmio edellisen valitun pisteen (a)
+    # ja seuraavan ämpärin keskiarvon (c) kanssa on suurin
+    def _select(self, bucket, next_x: float, next_y: float):
+        a_x, a_y, _ = self.selected[-1]
+        best = max(bucket, key=lambda p: abs((a_x - next_x) * (p[1] - a_y) - (a_x - p[0]) * (next_y - a_y)))
+        self.selected.append(best)
+
+    # Palauttaa harvennetun sarjan (timestamp, value) -pareina
+    def finish(self):
+        self._close_bucket()
+
+        if self._last is not None:
+            if self._pending is not None:
+                self._select(self._pending, self._last[0], self._last[1])
+            self.selected.append(self._last)
+
+        return [(timestamp, value) for _, value, timestamp in self.selected]
+
+
+# Harventaa yhden anturin raakalukemat enintään points pisteeseen. Rivit
+# lasketaan ensin, jotta ämpärit voidaan jakaa pisteiden määrän mukaan, ja
+# luetaan sitten kannasta striimaten, joten aikavälin pituus ei vaikuta
+# muistinkäyttöön. Jos rivejä on enintään points, ne palautetaan sellaisenaan.
+async def downsample(dw, export: ExportSlice, points: int):
+    count = await count_rows(dw, export)
+
+    if count <= points:
+        return [(timestamp, value) async for partition in stream_rows(export) for _, timestamp, value in partition]
+
+    lttb = Lttb(count, points)
+    async for partition in stream_rows(export):
+        for _, timestamp, value in partition:
+            lttb.add(timestamp, value)
+
+    return lttb.finish()
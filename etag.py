@@ -0,0 +1,109 @@
+import hashlib
+import os
+
+from fastapi import HTTPException, Request, Response, status
+
+import periods
+from cache import response_cache
+from latest import latest_readings
+from response_format import requested_format
+from timeseries import RANGE_DEFAULT_BUCKETS, range_period
+
+# Päättyneiden jaksojen Cache-Control max-age sekunteina. Oletuksena 0,
+# jolloin nekin tarkistetaan ETagilla joka kerta: myöhässä saapuneet
+# lukemat (POST /api/ingest) voivat muuttaa myös päättyneitä jaksoja.
+CLOSED_PERIOD_MAX_AGE = int(os.environ.get("CLOSED_PERIOD_MAX_AGE", 0))
+
+# Polun osa -> jakso, jonka endpoint laskee annetusta päivämäärästä
+_PERIOD_TOKENS = {
+    "hourly": periods.day,
+    "day": periods.day,
+    "week": periods.week,
+    "month": periods.month,
+    "monthly": periods.year,
+    "year": periods.year,
+    "seven_day_period": periods.seven_days,
+}
+
+
+# Päättelee pyydetyn jakson polusta, esim. /daily/week/{date} -> viikko ja
+# /summary/{period}/{date} -> period. /range endpointeilla jakso on from..to
+# laajennettuna kokonaisiin ämpäreihin. Palauttaa None, jos endpointilla ei
+# ole jaksoa (esim. /currents).
+def request_period(request: Request):
+    if "from" in request.query_params and "to" in request.query_params:
+        try:
+            return range_period(request.query_params["from"], request.query_params["to"],
+                                int(request.query_params.get("max_buckets", RANGE_DEFAULT_BUCKETS)))[1]
+        except ValueError:
+            return None
+
+    date = request.path_params.get("date")
+    if date is None:
+        return None
+
+    tokens = [request.path_params["period"]] if "period" in request.path_params \
+        else reversed(request.url.path.split("/")[:-1])
+
+    for token in tokens:
+        if token in _PERIOD_TOKENS:
+            try:
+                return _PERIOD_TOKENS[token](date)
+            except ValueError:
+                return None
+
+    return None
+
+
+# Faktataulun datan versio: koosteiden vesiraja, kirjoituslaskuri ja
+# taulun suurin date_key (ks. rollups.read_versions) sekä tämän workerin
+# muistissa olevien uusimpien lukemien date_key. Kolme ensimmäistä luetaan
+# kannasta, joten ne ovat kaikissa workereissa samat. Laskuri kattaa myös
+# myöhässä saapuneet lukemat, joiden date_key on vanhempi kuin uusin.
+# Uusimpien lukemien date_key pitää /currents vastausten ETagin samana
+# kuin niiden sisällön, vaikka max_key ehtisi edelle.
+def _data_version(fact_table: str):
+    version = response_cache.data_version(fact_table)
+    if version is None:
+        return None
+
+    return f"{version}-{latest_readings.last_keys.get(fact_table, 0)}"
+
+
+# Riippuvuus, joka lisätään /api/measurement routereille. ETag lasketaan
+# polusta, vastausmuodosta (Accept header voi valita columnar muodon) ja
+# faktataulujen datan versioista. Jos asiakkaan If-None-Match
+# vastaa sitä, palautetaan 304 ennen kuin endpoint ajaa kyselyitä. Usean
+# taulun routerilla jakso on suljettu vain, jos se on suljettu kaikissa.
+# Ilman fact_tables argumentteja taulu luetaan polun {fact_table}
+# parametrista (esim. /series ja /sensors).
+def conditional_get(*fact_tables: str):
+    async def dependency(request: Request, response: Response):
+        tables = fact_tables or (request.path_params["fact_table"],)
+        versions = [_data_version(fact_table) for fact_table in tables]
+        if None in versions:
+            return
+        version = ":".join(versions)
+
+        key = f"{request.url.path}?{request.url.query}:{requested_format(request)}:{version}"
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        etag = f'W/"{digest}"'
+
+        period = request_period(request)
+        if period is not None and all(response_cache.is_closed(fact_table, period.end) for fact_table in tables):
+            cache_control = f"public, max-age={CLOSED_PERIOD_MAX_AGE}" if CLOSED_PERIOD_MAX_AGE > 0 \
+                else "public, no-cache"
+        else:
+            cache_control = "no-cache"
+
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+            if "*" in candidates or etag in candidates or etag[2:] in candidates:
+                raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        response.headers.update(headers)
+
+    return dependency
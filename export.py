@@ -0,0 +1,260 @@
+import csv
+import datetime
+import io
+import json
+import os
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+from calendar_index import calendar_index
+from db import dw_session
+from periods import Period, resolve_date_keys
+from rollups import FACT_TABLES
+from sensor_registry import sensor_registry
+
+# Arrow- ja Parquet-muodot ovat käytössä vain, jos pyarrow on asennettu
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Montako riviä kannasta luetaan kerrallaan palvelinpuolen kursorilla.
+# Vientiä pidetään muistissa enintään tämän verran rivejä kerrallaan.
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", 10000))
+
+# Parquet-tiedoston rivijoukon (row group) vähimmäiskoko. Kannasta luetut
+# osat kerätään yhteen, kunnes tämä täyttyy.
+PARQUET_ROW_GROUP_ROWS = 100000
+
+_COLUMNS = ("sensor_id", "timestamp", "value")
+
+_TIMESTAMP = ("TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day), "
+              "CONCAT_WS(':', d.hour, d.min, d.sec))")
+
+
+class ExportError(ValueError):
+    pass
+
+
+# Vietävä faktataulun viipale: anturit (sensor_keyt ja niitä vastaavat
+# sensor_id:t samassa järjestyksessä) ja aikaväli. first_key..last_key on
+# aikavälin päivien date_key-väli (None, jos päiville ei ole rivejä).
+# Tarkka kellonaikaraja tarkistetaan vasta välin päädyissä.
+@dataclass(frozen=True)
+class ExportSlice:
+    fact_table: str
+    sensor_keys: tuple
+    sensor_ids: tuple
+    start: datetime.datetime
+    end: datetime.datetime
+    key_range: tuple | None
+
+
+# Tarkistaa pyynnön ja hakee anturien sensor_keyt anturirekisteristä ja
+# aikavälin date_keyt.
+# Tämä ajetaan ennen kuin vastausta aletaan lähettää, jotta virheet saadaan
+# palautettua normaaleina virhevastauksina.
+async def resolve_slice(dw, fact_table: str, sensor_ids, start: datetime.datetime, end: datetime.datetime):
+    if fact_table not in FACT_TABLES:
+        raise ExportError(f"Unknown fact table: {fact_table}")
+
+    if start > end:
+        raise ExportError("start must not be after end")
+
+    sensor_ids = sorted(set(sensor_ids))
+    if not sensor_ids:
+        raise ExportError("At least one sensor is required")
+
+    keys = await sensor_registry.resolve(dw, sensor_ids)
+
+    unknown = [sensor_id for sensor_id in sensor_ids if sensor_id not in keys]
+    if unknown:
+        raise ExportError(f"Unknown sensors: {', '.join(unknown)}")
+
+    key_range = await resolve_date_keys(dw, Period(start.date(), end.date()))
+
+    sensors = sorted((sensor_key, sensor_id) for sensor_id, sensor_key in keys.items())
+
+    return ExportSlice(fact_table, tuple(key for key, _ in sensors), tuple(sensor_id for _, sensor_id in sensors),
+                       start, end, key_range)
+
+
+# Lukee viipaleen rivit (sensor_id, timestamp, value) EXPORT_CHUNK_ROWS
+# kokoisina listoina. Kysely ajetaan omalla sessiollaan, koska vastausta
+# lähetetään vielä endpointin palattua. stream() käyttää palvelinpuolen
+# kursoria, joten muistissa on kerrallaan vain yksi osa. Rivit tulevat
+# anturin ja ajan mukaan järjestyksessä: pääavaimen (sensor_key, date_key)
+# järjestyksessä, jos date_keyt ovat aikajärjestyksessä, muuten
+# aikaleiman mukaan (ks. ingest._insert_date_rows).
+async def stream_rows(export: ExportSlice):
+    if export.key_range is None:
+        return
+
+    where, params = _slice_filter(export)
+    order = "f.date_key" if calendar_index.ordered else "timestamp, f.date_key"
+    _query = text(f"SELECT s.sensor_id, {_TIMESTAMP} AS timestamp, f.value "
+                  f"FROM {export.fact_table} f "
+                  "JOIN sensors_dim s ON s.sensor_key = f.sensor_key "
+                  "JOIN dates_dim d ON d.date_key = f.date_key "
+                  f"WHERE {where} "
+                  f"ORDER BY f.sensor_key, {order};")
+
+    async with dw_session() as _dw:
+        rows = await _dw.stream(_query, params, execution_options={"yield_per": EXPORT_CHUNK_ROWS})
+        async for partition in rows.partitions():
+            yield partition
+
+
+# Viipaleen rivien määrä
+async def count_rows(dw, export: ExportSlice):
+    if export.key_range is None:
+        return 0
+
+    where, params = _slice_filter(export)
+    _query = text(f"SELECT COUNT(*) FROM {export.fact_table} f "
+                  "JOIN dates_dim d ON d.date_key = f.date_key "
+                  f"WHERE {where};")
+
+    return (await dw.execute(_query, params)).scalar()
+
+
+# Viipaleen WHERE-ehto ja sen parametrit
+def _slice_filter(export: ExportSlice):
+    params = {f"sensor_key_{i}": sensor_key for i, sensor_key in enumerate(export.sensor_keys)}
+    params.update({"first_key": export.key_range[0], "last_key": export.key_range[1],
+                   "start": export.start, "end": export.end})
+
+    where = (f"f.sensor_key IN ({', '.join(f':sensor_key_{i}' for i in range(len(export.sensor_keys)))}) "
+             "AND f.date_key BETWEEN :first_key AND :last_key "
+             f"AND {_TIMESTAMP} BETWEEN :start AND :end")
+
+    return where, params
+
+
+# Yksi JSON-objekti riviä kohden
+async def ndjson_chunks(export: ExportSlice):
+    async for partition in stream_rows(export):
+        yield "".join(json.dumps({"sensor_id": sensor_id, "timestamp": timestamp.isoformat(), "value": value}) + "\n"
+                      for sensor_id, timestamp, value in partition)
+
+
+async def csv_chunks(export: ExportSlice):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(_COLUMNS)
+
+    async for partition in stream_rows(export):
+        writer.writerows((sensor_id, timestamp.isoformat(), value) for sensor_id, timestamp, value in partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Pelkkä otsikkorivi, jos rivejä ei ollut
+    if buffer.tell() > 0:
+        yield buffer.getvalue()
+
+
+# Tiedostomainen kohde, jonka pyarrow kirjoittaa. Kirjoitetut tavut
+# otetaan talteen take():lla lähetettäviksi. Sijainti (tell) kasvaa koko
+# ajan, koska Parquet-kirjoittaja tallentaa rivijoukkojen sijainnit
+# tiedoston loppuun.
+class _ChunkSink:
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+# sensor_id on sanakirjakoodattu: sanakirjana ovat viipaleen anturit, joten
+# se on sama kaikissa erissä ja pandas lukee sarakkeen kategoriana.
+def _arrow_schema():
+    return pa.schema([
+        ("sensor_id", pa.dictionary(pa.int32(), pa.string())),
+        ("timestamp", pa.timestamp("s")),
+        ("value", pa.float64()),
+    ])
+
+
+def _record_batch(export: ExportSlice, schema, partition):
+    positions = {sensor_id: i for i, sensor_id in enumerate(export.sensor_ids)}
+    sensor_ids, timestamps, values = zip(*partition)
+
+    return pa.RecordBatch.from_arrays([
+        pa.DictionaryArray.from_arrays(pa.array([positions[sensor_id] for sensor_id in sensor_ids], pa.int32()),
+                                       pa.array(export.sensor_ids, pa.string())),
+        pa.array(timestamps, pa.timestamp("s")),
+        pa.array(values, pa.float64()),
+    ], schema=schema)
+
+
+# Arrow IPC stream: skeema ja sen jälkeen yksi record batch kannasta luettua
+# osaa kohden
+async def arrow_chunks(export: ExportSlice):
+    sink = _ChunkSink()
+    schema = _arrow_schema()
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.take()
+        async for partition in stream_rows(export):
+            writer.write_batch(_record_batch(export, schema, partition))
+            yield sink.take()
+
+    yield sink.take()
+
+
+async def parquet_chunks(export: ExportSlice):
+    sink = _ChunkSink()
+    schema = _arrow_schema()
+    batches = []
+
+    with pq.ParquetWriter(sink, schema) as writer:
+        async for partition in stream_rows(export):
+            batches.append(_record_batch(export, schema, partition))
+
+            if sum(batch.num_rows for batch in batches) >= PARQUET_ROW_GROUP_ROWS:
+                writer.write_table(pa.Table.from_batches(batches, schema))
+                batches = []
+                yield sink.take()
+
+        if batches:
+            writer.write_table(pa.Table.from_batches(batches, schema))
+
+    yield sink.take()
+
+
+# format -> (generaattori, media type, tiedostopääte)
+EXPORT_FORMATS = {
+    "ndjson": (ndjson_chunks, "application/x-ndjson", "ndjson"),
+    "csv": (csv_chunks, "text/csv", "csv"),
+    "arrow": (arrow_chunks, "application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": (parquet_chunks, "application/vnd.apache.parquet", "parquet"),
+}
+
+# Muodot, jotka tarvitsevat pyarrow-kirjaston
+ARROW_FORMATS = ("arrow", "parquet")
+
+
+def format_available(format: str):
+    return format not in ARROW_FORMATS or pa is not None
@@ -0,0 +1,96 @@
+import decimal
+import datetime
+import functools
+import inspect
+import json
+from collections.abc import Mapping
+
+from fastapi import Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Tyypit, joita orjson (tai json) ei osaa itse serialisoida
+def _default(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    # SQLAlchemyn RowMapping (ja muut mappingit) sekä Row
+    if isinstance(value, Mapping):
+        return dict(value)
+    if hasattr(value, "_mapping"):
+        return dict(value._mapping)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    # Vain json: orjson serialisoi päivämäärät itse samaan ISO muotoon
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# Sovelluksen oletusvastausluokka. Serialisoi orjsonilla, jos se on
+# asennettu, muuten standardikirjaston jsonilla. date, datetime, Decimal
+# ja kannan rivit serialisoidaan suoraan ilman jsonable_encoderia.
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+        return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False,
+                          separators=(",", ":")).encode()
+
+
+# Kääri endpointin niin, että se palauttaa valmiin FastJSONResponsen.
+# FastAPI ajaa muut paluuarvot jsonable_encoderin läpi, mikä on suurten
+# sarjojen serialisoinnin hitain osa. Riippuvuuksien (esim. ETag) asettamat
+# headerit ja status kopioidaan vastaukseen kuten FastAPI tekee.
+def _direct_endpoint(endpoint, status_code: int | None):
+    signature = inspect.signature(endpoint)
+    response_name = next((name for name, parameter in signature.parameters.items()
+                          if parameter.annotation is Response), None)
+    added = response_name is None
+
+    if added:
+        response_name = "_fastjson_response"
+        signature = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter(response_name, inspect.Parameter.KEYWORD_ONLY, annotation=Response),
+        ])
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        sub_response = kwargs.pop(response_name) if added else kwargs[response_name]
+
+        if inspect.iscoroutinefunction(endpoint):
+            content = await endpoint(**kwargs)
+        else:
+            content = await run_in_threadpool(endpoint, **kwargs)
+
+        if isinstance(content, Response):
+            return content
+
+        response = FastJSONResponse(content, status_code=sub_response.status_code or status_code or 200)
+        response.headers.raw.extend(sub_response.headers.raw)
+        return response
+
+    wrapper.__signature__ = signature
+    return wrapper
+
+
+# Routereiden route_class. Endpointit, joilla ei ole response_modelia eikä
+# paluuarvon tyyppiä, serialisoidaan suoraan FastJSONResponsella. Muut
+# (esim. auth ja ingest pydantic mallit) validoidaan kuten ennenkin.
+class FastJSONRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        response_model = kwargs.get("response_model")
+        if (response_model is None or isinstance(response_model, DefaultPlaceholder)) \
+                and inspect.signature(endpoint).return_annotation is inspect.Signature.empty:
+            endpoint = _direct_endpoint(endpoint, kwargs.get("status_code"))
+
+        super().__init__(path, endpoint, **kwargs)
@@ -0,0 +1,107 @@
+import datetime
+from dataclasses import dataclass, field
+
+# Miten ämpärit, joilta ei ole rivejä, täytetään:
+# - zero: nollalla (summat ja lukumäärät)
+# - null: Nonella (keskiarvot, minimit ja maksimit, joille nolla olisi oikea arvo)
+# - ffill: edellisen ämpärin arvolla (esim. lämpötila tai akun varaus).
+#   Ensimmäistä arvoa edeltävät ämpärit jäävät Noneksi.
+FILL_POLICIES = ("zero", "null", "ffill")
+
+# Merkitsee täyttämättömän ämpärin, jotta None-arvoiset rivit voi erottaa
+# puuttuvista
+_MISSING = object()
+
+
+# Tasavälinen ämpäriruudukko: count ämpäriä alkaen start. Ämpärin koko on
+# joko step (timedelta) tai months kuukautta. Rivin paikka lasketaan
+# suoraan ajankohdasta, joten ruudukkoon ei tarvitse hakuja.
+@dataclass(frozen=True)
+class BucketGrid:
+    start: datetime.date
+    count: int
+    step: datetime.timedelta | None = None
+    months: int = 0
+    labels: list = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if (self.step is None) == (self.months == 0):
+            raise ValueError("Give either step or months")
+
+        if self.months:
+            first = self.start.year * 12 + self.start.month - 1
+            labels = [self.start.replace(year=month // 12, month=month % 12 + 1)
+                      for month in range(first, first + self.count * self.months, self.months)]
+        else:
+            labels = [self.start + self.step * i for i in range(self.count)]
+        object.__setattr__(self, "labels", labels)
+
+    # Ruudukko first ... last (molemmat mukaan). first on ensimmäisen
+    # ämpärin alku.
+    @classmethod
+    def between(cls, first, last, step: datetime.timedelta):
+        return cls(first, max((last - first) // step + 1, 0), step=step)
+
+    @classmethod
+    def months_between(cls, first: datetime.date, last: datetime.date, months: int = 1):
+        count = ((last.year - first.year) * 12 + last.month - first.month) // months + 1
+        return cls(first, max(count, 0), months=months)
+
+    def __len__(self):
+        return self.count
+
+    # Ämpäri, johon ajankohta kuuluu, tai None, jos se on ruudukon ulkopuolella
+    def index(self, label):
+        if self.months:
+            position = ((label.year - self.start.year) * 12 + label.month - self.start.month) // self.months
+        else:
+            position = (label - self.start) // self.step
+
+        return position if 0 <= position < self.count else None
+
+
+# Sijoittaa rivit ruudukkoon ja täyttää loput ämpärit policyn mukaan.
+# rows ovat (ajankohta, arvo) pareja tai, jos columns on annettu,
+# (ajankohta, rivi) pareja, joista luetaan sarakkeet columns. Palauttaa
+# listan (tai sarake -> lista, jos columns on annettu) ruudukon
+# järjestyksessä. Jokainen rivi käsitellään kerran, joten kesto on
+# O(rivit + ämpärit). Samaan ämpäriin osuvista riveistä jää viimeinen.
+def fill(grid: BucketGrid, rows, policy: str = "zero", columns: tuple | None = None):
+    if policy not in FILL_POLICIES:
+        raise ValueError(f"Unknown fill policy: {policy}")
+
+    names = ("value",) if columns is None else columns
+    values = {name: [_MISSING] * grid.count for name in names}
+    placed = [(name, values[name]) for name in names]
+
+    for label, row in rows:
+        position = grid.index(label)
+        if position is None:
+            continue
+
+        if columns is None:
+            values["value"][position] = row
+        else:
+            for name, column in placed:
+                column[position] = row[name]
+
+    for name, column in placed:
+        _fill_missing(column, policy)
+
+    return values["value"] if columns is None else values
+
+
+def _fill_missing(column: list, policy: str):
+    if policy == "ffill":
+        previous = None
+        for i, value in enumerate(column):
+            if value is _MISSING:
+                column[i] = previous
+            else:
+                previous = value
+        return
+
+    replacement = 0 if policy == "zero" else None
+    for i, value in enumerate(column):
+        if value is _MISSING:
+            column[i] = replacement
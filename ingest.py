@@ -0,0 +1,241 @@
+import asyncio
+import datetime
+import os
+from collections import OrderedDict
+
+from sqlalchemy import text
+
+from cache import response_cache
+from rollups import FACT_TABLES, apply_rows_to_rollups, bump_write_count, key_date, lock_watermark, mark_closed_change
+from sensor_registry import sensor_registry
+
+# Montako timestamp -> date_key paria pidetään muistissa
+INGEST_DATE_KEY_CACHE = int(os.environ.get("INGEST_DATE_KEY_CACHE", 100000))
+
+# Montako riviä kirjoitetaan tai haetaan yhdellä lauseella
+INGEST_CHUNK_ROWS = int(os.environ.get("INGEST_CHUNK_ROWS", 5000))
+
+# Kuinka paljon (sekunteina) lukeman aikaleima saa olla palvelimen kelloa
+# edellä. Tulevaisuuteen osuvat lukemat (kellon heitto, viallinen laite)
+# hylätään, jotta dates_dim tauluun ei synny tulevia rivejä.
+INGEST_MAX_FUTURE_SECONDS = int(os.environ.get("INGEST_MAX_FUTURE_SECONDS", 300))
+
+
+class IngestError(ValueError):
+    pass
+
+
+# Lukeman ajankohta dates_dim-rivin kenttinä
+# (year, month, day, hour, min, sec, ms)
+def calendar_fields(timestamp: datetime.datetime):
+    return (timestamp.year, timestamp.month, timestamp.day, timestamp.hour, timestamp.minute, timestamp.second,
+            timestamp.microsecond // 1000)
+
+
+# LRU välimuisti dates_dim kentät -> date_key. Uudet lukemat osuvat yleensä
+# samoihin ajankohtiin, joten suurin osa erän ajankohdista löytyy tästä.
+class DateKeyCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._keys = OrderedDict()
+
+    def get(self, fields):
+        date_key = self._keys.get(fields)
+        if date_key is not None:
+            self._keys.move_to_end(fields)
+        return date_key
+
+    def put_many(self, mapping: dict):
+        for fields, date_key in mapping.items():
+            self._keys[fields] = date_key
+            self._keys.move_to_end(fields)
+
+        while len(self._keys) > self.max_entries:
+            self._keys.popitem(last=False)
+
+
+date_keys = DateKeyCache(INGEST_DATE_KEY_CACHE)
+
+# Estää saman workerin erien samanaikaiset dates_dim lisäykset
+_ingest_lock = asyncio.Lock()
+
+
+def _chunks(items, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# Hakee kannasta annettujen ajankohtien date_keyt. Haku rajataan
+# (year, month, day, hour) -indeksillä ja tarkat kentät verrataan täällä.
+async def _select_date_keys(dw, fields_list):
+    found = {}
+    wanted = set(fields_list)
+    hours = sorted({fields[:4] for fields in fields_list})
+
+    for chunk in _chunks(hours, INGEST_CHUNK_ROWS):
+        params = {}
+        tuples = []
+        for i, (year, month, day, hour) in enumerate(chunk):
+            params.update({f"y{i}": year, f"m{i}": month, f"d{i}": day, f"h{i}": hour})
+            tuples.append(f"(:y{i}, :m{i}, :d{i}, :h{i})")
+
+        _query = text("SELECT date_key, year, month, day, hour, min, sec, ms FROM dates_dim "
+                      f"WHERE (year, month, day, hour) IN ({', '.join(tuples)});")
+        for row in (await dw.execute(_query, params)).all():
+            fields = tuple(row[1:])
+            if fields in wanted:
+                found[fields] = row[0]
+
+    return found
+
+
+# Lisää puuttuvat dates_dim rivit aikajärjestyksessä. Taulun viimeinen rivi
+# lukitaan, jotta rinnakkaiset lisäykset menevät jonoon. Taulun uusinta
+# riviä vanhemmat ajankohdat (jälkikäteen ladatut lukemat) saavat myös
+# uudet, suuremmat date_keyt. Silloin date_keyt eivät enää ole
+# aikajärjestyksessä: kalenteri-indeksi merkitsee itsensä järjestämättömäksi
+# ja haut tehdään kannasta (ks. calendar_index.py).
+async def _insert_date_rows(dw, missing):
+    await dw.execute(text("SELECT date_key FROM dates_dim ORDER BY date_key DESC LIMIT 1 FOR UPDATE;"))
+
+    # Toinen erä on voinut lisätä osan riveistä lukkoa odottaessa
+    missing = sorted(set(missing) - set(await _select_date_keys(dw, missing)))
+
+    for chunk in _chunks(missing, INGEST_CHUNK_ROWS):
+        await dw.execute(text("INSERT INTO dates_dim (year, month, week, day, hour, min, sec, ms) "
+                              "VALUES (:year, :month, :week, :day, :hour, :min, :sec, :ms);"),
+                         [{"year": year, "month": month,
+                           "week": datetime.date(year, month, day).isocalendar()[1],
+                           "day": day, "hour": hour, "min": minute, "sec": sec, "ms": ms}
+                          for year, month, day, hour, minute, sec, ms in chunk])
+
+    return len(missing)
+
+
+# Lukemat, joiden aikaleima on yli INGEST_MAX_FUTURE_SECONDS palvelimen
+# kellon edellä. Aikavyöhykkeettömiä aikaleimoja verrataan paikalliseen
+# aikaan.
+def _future_timestamps(readings):
+    tolerance = datetime.timedelta(seconds=INGEST_MAX_FUTURE_SECONDS)
+    local_limit = datetime.datetime.now() + tolerance
+    utc_limit = datetime.datetime.now(datetime.timezone.utc) + tolerance
+
+    return [timestamp for _, timestamp, _ in readings
+            if timestamp > (local_limit if timestamp.tzinfo is None else utc_limit)]
+
+
+# Kirjoittaa erän lukemia faktatauluun. readings on lista
+# (sensor_id, timestamp, value) -tupleja. Aikaleiman kellonaika tallennetaan
+# sellaisenaan, aikavyöhyketietoa ei käytetä.
+# Palauttaa {"received", "inserted", "late", "new_dates"}.
+async def ingest_readings(dw, fact_table: str, readings):
+    if fact_table not in FACT_TABLES:
+        raise IngestError(f"Unknown fact table: {fact_table}")
+
+    if len(readings) == 0:
+        return {"received": 0, "inserted": 0, "late": 0, "new_dates": 0}
+
+    future = _future_timestamps(readings)
+    if future:
+        raise IngestError(f"Readings more than {INGEST_MAX_FUTURE_SECONDS} s in the future: "
+                          f"{len(future)} readings, first {future[0].isoformat()}")
+
+    sensor_ids = {sensor_id for sensor_id, _, _ in readings}
+    sensors = await sensor_registry.resolve(dw, sensor_ids)
+    unknown = sorted(sensor_ids - sensors.keys())
+    if unknown:
+        raise IngestError(f"Unknown sensors: {', '.join(unknown)}")
+
+    fields_list = [calendar_fields(timestamp) for _, timestamp, _ in readings]
+
+    async with _ingest_lock:
+        try:
+            resolved = {}
+            missing = []
+            for fields in set(fields_list):
+                date_key = date_keys.get(fields)
+                if date_key is None:
+                    missing.append(fields)
+                else:
+                    resolved[fields] = date_key
+
+            new_dates = 0
+            if missing:
+                resolved_missing = await _select_date_keys(dw, missing)
+                still_missing = [fields for fields in missing if fields not in resolved_missing]
+
+                if still_missing:
+                    new_dates = await _insert_date_rows(dw, still_missing)
+                    resolved_missing.update(await _select_date_keys(dw, still_missing))
+
+                resolved.update(resolved_missing)
+
+            rows = {}
+            for (sensor_id, _, value), fields in zip(readings, fields_list):
+                rows[(sensors[sensor_id], resolved[fields])] = value
+
+            # Vesiraja lukitaan, jotta tausta-ajo ei koosta tauluun samaan
+            # aikaan. Vesirajan alle osuvat rivit lisätään koosteisiin itse.
+            watermark = await lock_watermark(dw, fact_table)
+            below_watermark = [key for key in rows if key[1] <= watermark]
+            existing = set(await _existing_fact_keys(dw, fact_table, below_watermark))
+            below_watermark = [key for key in below_watermark if key not in existing]
+
+            # Myöhässä ovat lukemat, joiden päivä on jo suljettu jakso eli
+            # ennen vesirajan päivää. date_keyn perusteella sitä ei voi
+            # päätellä, koska jälkikäteen ladattujen lukemien date_keyt
+            # ovat vesirajan yläpuolella.
+            watermark_date = await key_date(dw, watermark) if watermark else None
+            key_dates = {date_key: datetime.date(*fields[:3]) for fields, date_key in resolved.items()}
+            late_dates = [key_dates[key[1]] for key in rows
+                          if key not in existing and watermark_date is not None and key_dates[key[1]] < watermark_date]
+
+            inserted = 0
+            for chunk in _chunks(list(rows.items()), INGEST_CHUNK_ROWS):
+                result = await dw.execute(text(f"INSERT IGNORE INTO {fact_table} (sensor_key, date_key, value) "
+                                               "VALUES (:sensor_key, :date_key, :value);"),
+                                          [{"sensor_key": sensor_key, "date_key": date_key, "value": value}
+                                           for (sensor_key, date_key), value in chunk])
+                inserted += result.rowcount
+
+            if below_watermark:
+                await apply_rows_to_rollups(dw, fact_table, below_watermark)
+            if inserted:
+                # ETag muuttuu kaikissa workereissa, vaikka lukemat eivät
+                # olisi taulun uusimpia
+                await bump_write_count(dw, fact_table)
+            if inserted and late_dates:
+                await mark_closed_change(dw, fact_table, min(late_dates))
+
+            await dw.commit()
+        except Exception:
+            await dw.rollback()
+            raise
+
+    # Välimuistit päivitetään vasta onnistuneen commitin jälkeen
+    date_keys.put_many(resolved)
+    # Muut workerit poistavat suljetut jaksot, kun ne lukevat kasvaneen
+    # closed_changes laskurin (rollups.read_versions). Tämä worker tekee sen
+    # heti.
+    if inserted and late_dates:
+        response_cache.invalidate(fact_table, include_closed=True, changed_from=min(late_dates))
+
+    return {"received": len(readings), "inserted": inserted, "late": len(late_dates), "new_dates": new_dates}
+
+
+# Faktataulussa jo olevat (sensor_key, date_key) -parit annetuista
+async def _existing_fact_keys(dw, fact_table: str, keys):
+    existing = []
+
+    for chunk in _chunks(keys, INGEST_CHUNK_ROWS):
+        params = {}
+        pairs = []
+        for i, (sensor_key, date_key) in enumerate(chunk):
+            params.update({f"s{i}": sensor_key, f"d{i}": date_key})
+            pairs.append(f"(:s{i}, :d{i})")
+
+        _query = text(f"SELECT sensor_key, date_key FROM {fact_table} "
+                      f"WHERE (sensor_key, date_key) IN ({', '.join(pairs)});")
+        existing.extend(tuple(row) for row in (await dw.execute(_query, params)).all())
+
+    return existing
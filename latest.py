@@ -0,0 +1,123 @@
+import asyncio
+import datetime
+import os
+
+from sqlalchemy import text
+
+from db import dw_session
+from sensor_registry import sensor_registry
+
+# Kuinka usein (sekunteina) uusimmat lukemat haetaan kannasta.
+LATEST_REFRESH_INTERVAL = float(os.environ.get("LATEST_REFRESH_INTERVAL", 5))
+
+# Faktataulut, joiden uusimpia lukemia /currents ja /battery/current käyttävät
+LATEST_FACT_TABLES = ("temperatures_fact", "productions_fact", "measurements_fact")
+
+_TIMESTAMP = ("TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day), "
+              "CONCAT_WS(':', d.hour, d.min, d.sec)) AS timestamp")
+
+
+# Muistissa pidettävät anturikohtaiset uusimmat lukemat. Alkulatauksen
+# jälkeen kannasta haetaan vain rivit, joiden date_key on suurempi kuin
+# taulusta viimeksi nähty, jolloin haku käyttää date_key-indeksiä.
+class LatestReadings:
+    def __init__(self):
+        # (fact_table, sensor_key) -> {"date_key", "value", "timestamp"}
+        self.readings = {}
+        # fact_table -> suurin nähty date_key
+        self.last_keys = {}
+
+        self.loaded = False
+        # Milloin kanta on viimeksi luettu onnistuneesti
+        self.refreshed_at = None
+
+        self._lock = asyncio.Lock()
+
+    def _store_rows(self, fact_table: str, rows):
+        for row in rows:
+            # Jälkikäteen ladatut lukemat saavat suuremman date_keyn kuin
+            # anturin uusin lukema, joten verrataan aikaleimoja
+            current = self.readings.get((fact_table, row["sensor_key"]))
+            if current is not None and current["timestamp"] > row["timestamp"]:
+                self.last_keys[fact_table] = max(self.last_keys.get(fact_table, 0), row["date_key"])
+                continue
+
+            self.readings[(fact_table, row["sensor_key"])] = {
+                "date_key": row["date_key"],
+                "value": row["value"],
+                "timestamp": row["timestamp"],
+            }
+            self.last_keys[fact_table] = max(self.last_keys.get(fact_table, 0), row["date_key"])
+
+    # Alkulataus: jokaisen anturin uusin rivi. Ajetaan vain kerran, koska
+    # MAX-haku käy läpi taulun kaikki anturit.
+    async def load(self, dw):
+        async with self._lock:
+            if self.loaded:
+                return
+
+            for fact_table in LATEST_FACT_TABLES:
+                _query = text(f"SELECT f.sensor_key, f.date_key, f.value, {_TIMESTAMP} "
+                              f"FROM {fact_table} f "
+                              f"JOIN (SELECT sensor_key, MAX(date_key) AS date_key FROM {fact_table} "
+                              "GROUP BY sensor_key) m ON m.sensor_key = f.sensor_key AND m.date_key = f.date_key "
+                              "JOIN dates_dim d ON d.date_key = f.date_key;")
+                self._store_rows(fact_table, (await dw.execute(_query)).mappings().all())
+
+            await sensor_registry.ensure_loaded(dw)
+            self.loaded = True
+            self.refreshed_at = datetime.datetime.now(datetime.timezone.utc)
+
+    # Hakee viimeksi nähtyjen date_keyjen jälkeen tulleet rivit
+    async def refresh(self, dw):
+        async with self._lock:
+            for fact_table in LATEST_FACT_TABLES:
+                _query = text(f"SELECT f.sensor_key, f.date_key, f.value, {_TIMESTAMP} "
+                              f"FROM {fact_table} f "
+                              "JOIN dates_dim d ON d.date_key = f.date_key "
+                              "WHERE f.date_key > :last_key "
+                              "ORDER BY f.date_key;")
+                rows = (await dw.execute(_query, {"last_key": self.last_keys.get(fact_table, 0)})).mappings().all()
+                self._store_rows(fact_table, rows)
+
+            # Uusi anturi, jota ei vielä ole anturirekisterissä
+            if any(sensor_registry.get(sensor_key) is None for _, sensor_key in self.readings):
+                await sensor_registry.refresh(dw)
+
+            self.refreshed_at = datetime.datetime.now(datetime.timezone.utc)
+
+    # Endpointit kutsuvat tätä ennen lukemista, jotta ensimmäiset requestit
+    # toimivat vaikka taustatehtävä ei olisi vielä ladannut lukemia.
+    async def ensure_loaded(self, dw):
+        if not self.loaded:
+            await self.load(dw)
+
+    # Annettujen antureiden uusimmat lukemat anturirekisterin tietoineen.
+    # Anturit, joilta ei ole lukemia, jäävät pois.
+    def latest(self, fact_table: str, sensor_keys):
+        result = []
+        for sensor_key in sensor_keys:
+            reading = self.readings.get((fact_table, sensor_key))
+            if reading is not None:
+                result.append({**(sensor_registry.get(sensor_key) or {}), "sensor_key": sensor_key, **reading})
+
+        return result
+
+
+# Sovelluksen yhteinen lukemavarasto
+latest_readings = LatestReadings()
+
+
+# Taustatehtävä, joka käynnistetään main.py:n lifespanissa
+async def maintain_latest_readings():
+    while True:
+        try:
+            async with dw_session() as _dw:
+                if latest_readings.loaded:
+                    await latest_readings.refresh(_dw)
+                else:
+                    await latest_readings.load(_dw)
+        except Exception as e:
+            print(f"Latest readings refresh failed: {e}")
+
+        await asyncio.sleep(LATEST_REFRESH_INTERVAL)
@@ -1,18 +1,60 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from routers import (battery, totalconsumpt, totalconsumpt_avg, totalconsumpt_sum,
-                     temperature, temperature_avg, windproduction, solarproduction, totalprod, totalprod_sum, totalprod_avg, auth)
+                     temperature, temperature_avg, windproduction, solarproduction, totalprod, totalprod_sum, totalprod_avg, auth,
+                     admin, dashboard, ingest, export, series, sensors, consumpt_breakdown, net_balance)
+from calendar_index import maintain_calendar_index
+from compression import CompressionMiddleware
+from db import warm_up_pools
+from fastjson import FastJSONResponse
+from latest import maintain_latest_readings
+from rollups import maintain_data_versions, refresh_rollups_periodically
+from sensor_registry import maintain_sensor_registry
+
+
+# Käynnistetään taustatehtävät sovelluksen käynnistyessä ja pysäytetään ne sammuttaessa
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await warm_up_pools()
+    except Exception as e:
+        print(f"Connection pool warm-up failed: {e}")
+
+    tasks = [
+        asyncio.create_task(maintain_sensor_registry()),
+        asyncio.create_task(refresh_rollups_periodically()),
+        asyncio.create_task(maintain_data_versions()),
+        asyncio.create_task(maintain_calendar_index()),
+        asyncio.create_task(maintain_latest_readings()),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
 
 
-app = FastAPI()
+# Vastaukset serialisoidaan orjsonilla (ks. fastjson.py)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+# gzip/brotli pakkaus Accept-Encoding headerin mukaan (ks. compression.py)
+app.add_middleware(CompressionMiddleware)
 app.include_router(auth.router)
+app.include_router(admin.router)
+app.include_router(ingest.router)
+app.include_router(export.router)
 app.include_router(battery.router)
+app.include_router(dashboard.router)
+app.include_router(series.router)
+app.include_router(sensors.router)
 app.include_router(totalconsumpt.router)
 app.include_router(totalconsumpt_avg.router)
 app.include_router(totalconsumpt_sum.router)
+app.include_router(consumpt_breakdown.router)
 app.include_router(temperature.router)
 app.include_router(temperature_avg.router)
 app.include_router(totalprod.router)
 app.include_router(totalprod_sum.router)
 app.include_router(totalprod_avg.router)
+app.include_router(net_balance.router)
 app.include_router(windproduction.router)
 app.include_router(solarproduction.router)
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class Reading(BaseModel):
+    sensor_id: str
+    timestamp: datetime
+    value: float
+
+
+class IngestBatch(BaseModel):
+    fact_table: str
+    readings: list[Reading]
+
+
+class IngestRes(BaseModel):
+    received: int
+    inserted: int
+    late: int
+    new_dates: int
@@ -0,0 +1,133 @@
+import datetime
+from calendar import monthrange
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+from calendar_index import calendar_index
+
+
+# Aikajakso päivämäärinä. Molemmat päät kuuluvat jaksoon.
+@dataclass(frozen=True)
+class Period:
+    start: datetime.date
+    end: datetime.date
+
+    def days(self):
+        return (self.end - self.start).days + 1
+
+
+def parse_date(date: str) -> datetime.date:
+    return datetime.datetime.strptime(date, '%Y-%m-%d').date()
+
+
+# Jaksot, joita routerit käyttävät. Ottavat vastaan ISO 8601 merkkijonon YYYY-MM-DD.
+def day(date: str) -> Period:
+    _date = parse_date(date)
+    return Period(_date, _date)
+
+
+def week(date: str) -> Period:
+    _date = parse_date(date)
+    monday = _date - datetime.timedelta(days=_date.weekday())
+    return Period(monday, monday + datetime.timedelta(days=6))
+
+
+def month(date: str) -> Period:
+    _date = parse_date(date)
+    return Period(_date.replace(day=1), _date.replace(day=monthrange(_date.year, _date.month)[1]))
+
+
+def year(date: str) -> Period:
+    _date = parse_date(date)
+    return Period(datetime.date(_date.year, 1, 1), datetime.date(_date.year, 12, 31))
+
+
+def seven_days(date: str) -> Period:
+    _date = parse_date(date)
+    return Period(_date - datetime.timedelta(days=6), _date)
+
+
+# Vapaa aikaväli, esim. /range?from=...&to=...
+def between(start: str, end: str) -> Period:
+    period = Period(parse_date(start), parse_date(end))
+    if period.start > period.end:
+        raise ValueError("from must not be after to")
+    return period
+
+
+# Rakentaa jaksolle dates_dim-ehdon, joka käyttää (year, month, day) indeksiä.
+# Jakso pilkotaan kuukausiksi: kokonaiset kuukaudet rajataan pelkällä
+# year/month-yhtäsuuruudella, vajaat lisäksi day BETWEEN -ehdolla.
+# Palauttaa ehdon ja sen parametrit.
+def calendar_predicate(period: Period, alias: str = "d"):
+    clauses = []
+    params = {}
+    current = period.start.replace(day=1)
+
+    while current <= period.end:
+        i = len(clauses)
+
+        # Kokonainen vuosi rajataan pelkällä year-ehdolla
+        if current.month == 1 and period.start <= current and period.end >= datetime.date(current.year, 12, 31):
+            params[f"cal_year_{i}"] = current.year
+            clauses.append(f"({alias}.year = :cal_year_{i})")
+            current = datetime.date(current.year + 1, 1, 1)
+            continue
+
+        last_of_month = monthrange(current.year, current.month)[1]
+        first_day = period.start.day if (current.year, current.month) == (period.start.year, period.start.month) else 1
+        last_day = period.end.day if (current.year, current.month) == (period.end.year, period.end.month) \
+            else last_of_month
+
+        params[f"cal_year_{i}"] = current.year
+        params[f"cal_month_{i}"] = current.month
+        clause = f"({alias}.year = :cal_year_{i} AND {alias}.month = :cal_month_{i}"
+
+        if first_day != 1 or last_day != last_of_month:
+            params[f"cal_first_day_{i}"] = first_day
+            params[f"cal_last_day_{i}"] = last_day
+            clause += f" AND {alias}.day BETWEEN :cal_first_day_{i} AND :cal_last_day_{i}"
+
+        clauses.append(clause + ")")
+        current = (current + datetime.timedelta(days=last_of_month)).replace(day=1)
+
+    return "(" + " OR ".join(clauses) + ")", params
+
+
+# Muuttaa jakson yhtenäiseksi date_key-väliksi (first_key, last_key).
+# Jakson rivit ovat välillä MIN(date_key)..MAX(date_key), joten
+# faktataulujen (sensor_key, date_key) pääavain voi tehdä range scanin.
+# date_keyt kasvavat yleensä ajan mukana, mutta jälkikäteen ladatut
+# ajankohdat saavat suuremman avaimen, jolloin välillä voi olla myös muiden
+# jaksojen rivejä. Kutsujan on siksi rajattava rivit myös aikaleimalla.
+# Väli luetaan muistissa olevasta kalenteri-indeksistä, ja kannasta vain
+# jos indeksi ei ole vielä käytettävissä.
+# Palauttaa None, jos jaksolle ei ole yhtään dates_dim riviä.
+async def resolve_date_keys(dw, period: Period):
+    if await _calendar_index_covers(dw, period):
+        return calendar_index.key_range(period.start, period.end)
+
+    predicate, params = calendar_predicate(period)
+    _query = text("SELECT MIN(d.date_key) AS first_key, MAX(d.date_key) AS last_key "
+                  f"FROM dates_dim d WHERE {predicate};")
+
+    row = (await dw.execute(_query, params)).mappings().first()
+
+    if row is None or row["first_key"] is None:
+        return None
+
+    return row["first_key"], row["last_key"]
+
+
+# Indeksiä voi käyttää, kun se on ladattu ja sisältää jakson loppuun asti
+# kaikki rivit. Jos jakso ulottuu indeksin viimeiseen päivään tai sen yli,
+# haetaan ensin indeksiin kannassa jo olevat uudet rivit.
+async def _calendar_index_covers(dw, period: Period):
+    if not calendar_index.usable():
+        return False
+
+    if period.end >= calendar_index.last_date():
+        await calendar_index.refresh(dw)
+
+    return calendar_index.usable()
@@ -0,0 +1,38 @@
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Request, status
+
+# Sarjaendpointtien vastausmuodot:
+# - rows: {"data": [{"date": ..., "total_kwh": ...}, ...]} (oletus)
+# - columnar: {"data": {"t": [...], "v": [...]}}, jossa t on ämpärien alut
+#   epoch sekunteina. Avaimia ei toisteta jokaisessa alkiossa.
+RESPONSE_FORMATS = ("rows", "columnar")
+
+# Accept headerin arvo, jolla columnar muodon voi pyytää ilman query-parametria
+COLUMNAR_MEDIA_TYPE = "application/vnd.coolbox.columnar+json"
+
+
+# Vastausmuoto ?format= parametrista tai Accept headerista. Parametri
+# voittaa, jos molemmat on annettu.
+def requested_format(request: Request):
+    format = request.query_params.get("format")
+    if format is not None:
+        return format
+
+    return "columnar" if COLUMNAR_MEDIA_TYPE in request.headers.get("accept", "") else "rows"
+
+
+# Riippuvuus sarjaendpointeille. format parametri on mukana, jotta se näkyy
+# API dokumentaatiossa.
+def response_format(request: Request, format: str | None = None):
+    format = requested_format(request)
+    if format not in RESPONSE_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown format: {format}",
+        )
+
+    return format
+
+
+ResponseFormat = Annotated[str, Depends(response_format)]
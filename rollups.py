@@ -0,0 +1,253 @@
+import asyncio
+import os
+
+from sqlalchemy import text
+
+from cache import response_cache
+from db import dw_session
+
+# Faktataulut, joista ylläpidetään anturikohtaisia tunti-, päivä- ja
+# kuukausikoosteita (SUM/COUNT/MIN/MAX). Taulujen nimet liitetään SQL:ään
+# suoraan, joten vain tämän listan nimiä saa käyttää.
+FACT_TABLES = (
+    "measurements_fact",
+    "total_consumptions_fact",
+    "heating_consumptions_fact",
+    "lighting_consumptions_fact",
+    "outlets_consumptions_fact",
+    "productions_fact",
+    "temperatures_fact",
+)
+
+# Kuinka monta date_keytä käsitellään yhdessä transaktiossa. Rajaa
+# alkulatauksen transaktiot kohtuullisen kokoisiksi.
+ROLLUP_BATCH_KEYS = int(os.environ.get("ROLLUP_BATCH_KEYS", 500000))
+
+# Montako (sensor_key, date_key) -paria käsitellään yhdellä lauseella,
+# kun myöhässä saapuneita rivejä lisätään koosteisiin.
+ROLLUP_KEY_CHUNK = 1000
+
+# Montako uusinta date_keytä jätetään vesirajan yläpuolelle. Toinen
+# kirjoittaja (esim. lataaja tai transaktio, joka commitoidaan MAX-haun
+# jälkeen) voi vielä lisätä rivejä uusimmille avaimille, eikä vesirajan
+# alle jääviä rivejä enää lueta koosteisiin.
+ROLLUP_LAG_KEYS = int(os.environ.get("ROLLUP_LAG_KEYS", 60))
+
+# Kuinka usein (sekunteina) koosteet päivitetään taustalla.
+ROLLUP_REFRESH_INTERVAL = int(os.environ.get("ROLLUP_REFRESH_INTERVAL", 60))
+
+# Kuinka usein (sekunteina) faktataulujen datan versiot luetaan
+# rollup_watermarks taulusta välimuistia ja ETageja varten.
+DATA_VERSION_REFRESH_INTERVAL = float(os.environ.get("DATA_VERSION_REFRESH_INTERVAL", 5))
+
+# Jokainen lause lukee ehdon {where} rajaamat faktarivit (yleensä vesirajan
+# jälkeen tulleet) ja lisää ne koosteisiin. Olemassa oleviin ämpäreihin
+# uudet arvot summataan päälle.
+_ROLLUP_STATEMENTS = (
+    "INSERT INTO hourly_rollups "
+    "(fact_table, sensor_key, date, hour, value_sum, value_count, value_min, value_max) "
+    "SELECT * FROM ("
+    "SELECT :fact_table AS fact_table, f.sensor_key, "
+    "DATE(CONCAT_WS('-', d.year, d.month, d.day)) AS date, d.hour, "
+    "SUM(f.value) AS new_sum, COUNT(*) AS new_count, MIN(f.value) AS new_min, MAX(f.value) AS new_max "
+    "FROM {fact} f "
+    "JOIN dates_dim d ON d.date_key = f.date_key "
+    "WHERE {where} "
+    "GROUP BY f.sensor_key, d.year, d.month, d.day, d.hour) AS new "
+    "ON DUPLICATE KEY UPDATE value_sum = value_sum + new_sum, value_count = value_count + new_count, "
+    "value_min = LEAST(value_min, new_min), value_max = GREATEST(value_max, new_max);",
+
+    "INSERT INTO daily_rollups "
+    "(fact_table, sensor_key, date, value_sum, value_count, value_min, value_max) "
+    "SELECT * FROM ("
+    "SELECT :fact_table AS fact_table, f.sensor_key, "
+    "DATE(CONCAT_WS('-', d.year, d.month, d.day)) AS date, "
+    "SUM(f.value) AS new_sum, COUNT(*) AS new_count, MIN(f.value) AS new_min, MAX(f.value) AS new_max "
+    "FROM {fact} f "
+    "JOIN dates_dim d ON d.date_key = f.date_key "
+    "WHERE {where} "
+    "GROUP BY f.sensor_key, d.year, d.month, d.day) AS new "
+    "ON DUPLICATE KEY UPDATE value_sum = value_sum + new_sum, value_count = value_count + new_count, "
+    "value_min = LEAST(value_min, new_min), value_max = GREATEST(value_max, new_max);",
+
+    "INSERT INTO monthly_rollups "
+    "(fact_table, sensor_key, year, month, value_sum, value_count, value_min, value_max) "
+    "SELECT * FROM ("
+    "SELECT :fact_table AS fact_table, f.sensor_key, d.year, d.month, "
+    "SUM(f.value) AS new_sum, COUNT(*) AS new_count, MIN(f.value) AS new_min, MAX(f.value) AS new_max "
+    "FROM {fact} f "
+    "JOIN dates_dim d ON d.date_key = f.date_key "
+    "WHERE {where} "
+    "GROUP BY f.sensor_key, d.year, d.month) AS new "
+    "ON DUPLICATE KEY UPDATE value_sum = value_sum + new_sum, value_count = value_count + new_count, "
+    "value_min = LEAST(value_min, new_min), value_max = GREATEST(value_max, new_max);",
+)
+
+_WATERMARK_RANGE = "f.date_key > :low AND f.date_key <= :high"
+
+_KEY_DATE = "DATE(CONCAT_WS('-', year, month, day))"
+
+
+# Lukitsee faktataulun vesirajan kutsujan transaktion loppuun asti ja
+# palauttaa sen. Vesirajarivi luodaan tarvittaessa.
+async def lock_watermark(dw, fact_table: str):
+    await dw.execute(text("INSERT IGNORE INTO rollup_watermarks (fact_table, date_key, updated_at) "
+                          "VALUES (:fact_table, 0, NOW());"), {"fact_table": fact_table})
+    return (await dw.execute(text("SELECT date_key FROM rollup_watermarks "
+                                  "WHERE fact_table = :fact_table FOR UPDATE;"),
+                             {"fact_table": fact_table})).scalar_one()
+
+
+# Kasvattaa faktataulun kirjoituslaskuria kutsujan transaktiossa. Laskuri
+# on osa taulun datan versiota (ks. read_versions), joten kaikkien
+# workerien ETagit ja välimuistit huomaavat kirjoituksen, myös kun
+# lukemat osuvat jo olemassa oleviin date_keyihin. Kutsujan on pidettävä
+# vesiraja lukittuna (lock_watermark).
+async def bump_write_count(dw, fact_table: str):
+    await dw.execute(text("UPDATE rollup_watermarks SET write_count = write_count + 1 "
+                          "WHERE fact_table = :fact_table;"), {"fact_table": fact_table})
+
+
+# date_keyn kalenteripäivä, tai None jos avainta ei ole
+async def key_date(dw, date_key: int):
+    return (await dw.execute(text(f"SELECT {_KEY_DATE} FROM dates_dim WHERE date_key = :date_key;"),
+                             {"date_key": date_key})).scalar()
+
+
+# Merkitsee, että faktataulun suljettuihin jaksoihin (vesirajan päivää
+# edeltäviin päiviin) on tullut rivejä changed_from päivästä alkaen.
+# Jokainen worker poistaa välimuististaan suljetut jaksot, joihin muutos
+# osuu (ks. ResponseCache.sync_versions). Kutsujan on pidettävä vesiraja
+# lukittuna.
+async def mark_closed_change(dw, fact_table: str, changed_from):
+    await dw.execute(text("UPDATE rollup_watermarks SET closed_changes = closed_changes + 1, "
+                          "changed_from = :changed_from WHERE fact_table = :fact_table;"),
+                     {"fact_table": fact_table, "changed_from": changed_from})
+
+
+# Faktataulujen datan versiot muodossa
+# {"productions_fact": {"watermark": 123456, "write_count": 7, "max_key": 123516,
+#                       "closed_changes": 2, "changed_from": datetime.date(2024, 3, 1)}, ...}
+# max_key on taulun suurin date_key. Se muuttuu, kun raakalukemia tulee
+# muutakin kautta kuin ingestistä, joten raakadataa lukevien endpointtien
+# (series, minuuttitason /range) ETagit vanhenevat kaikilla tauluilla.
+# date_key on indeksoitu, joten MAX on halpa.
+async def read_versions(dw):
+    max_keys = " UNION ALL ".join(f"SELECT '{fact_table}' AS fact_table, MAX(date_key) AS max_key FROM {fact_table}"
+                                  for fact_table in FACT_TABLES)
+    rows = (await dw.execute(text("SELECT w.fact_table, w.date_key AS watermark, w.write_count, "
+                                  "COALESCE(m.max_key, 0) AS max_key, w.closed_changes, w.changed_from "
+                                  "FROM rollup_watermarks w "
+                                  f"JOIN ({max_keys}) AS m ON m.fact_table = w.fact_table;"))).mappings().all()
+    return {row["fact_table"]: {name: value for name, value in row.items() if name != "fact_table"}
+            for row in rows}
+
+
+# Lisää koosteisiin faktarivit, jotka on kirjoitettu vesirajan alle (esim.
+# myöhässä saapuneet lukemat). Tausta-ajo ei enää lue niitä, joten ne
+# summataan koosteisiin suoraan. keys on lista (sensor_key, date_key)
+# -pareja. Kutsujan on pidettävä vesiraja lukittuna (lock_watermark).
+async def apply_rows_to_rollups(dw, fact_table: str, keys):
+    if fact_table not in FACT_TABLES:
+        raise ValueError(f"Unknown fact table: {fact_table}")
+
+    for start in range(0, len(keys), ROLLUP_KEY_CHUNK):
+        chunk = keys[start:start + ROLLUP_KEY_CHUNK]
+        params = {"fact_table": fact_table}
+        pairs = []
+        for i, (sensor_key, date_key) in enumerate(chunk):
+            params[f"sensor_key_{i}"] = sensor_key
+            params[f"date_key_{i}"] = date_key
+            pairs.append(f"(:sensor_key_{i}, :date_key_{i})")
+
+        where = f"(f.sensor_key, f.date_key) IN ({', '.join(pairs)})"
+        for statement in _ROLLUP_STATEMENTS:
+            await dw.execute(text(statement.format(fact=fact_table, where=where)), params)
+
+
+# Päivittää yhden faktataulun koosteet vesirajasta eteenpäin yhden erän
+# (ROLLUP_BATCH_KEYS) verran. Palauttaa uuden vesirajan ja tiedon siitä,
+# jäikö tauluun vielä käsittelemättömiä rivejä.
+async def refresh_fact_rollups_batch(dw, fact_table: str):
+    if fact_table not in FACT_TABLES:
+        raise ValueError(f"Unknown fact table: {fact_table}")
+
+    # Vesirajarivi luodaan omassa transaktiossaan, jotta alla oleva
+    # FOR UPDATE -lukitus on ainoa lukko, jota workerit kilpailevat.
+    await dw.execute(text("INSERT IGNORE INTO rollup_watermarks (fact_table, date_key, updated_at) "
+                          "VALUES (:fact_table, 0, NOW());"), {"fact_table": fact_table})
+    await dw.commit()
+
+    # Lukitaan vesiraja, ettei kaksi workeria summaa samoja rivejä kahdesti.
+    low = (await dw.execute(text("SELECT date_key FROM rollup_watermarks "
+                                 "WHERE fact_table = :fact_table FOR UPDATE;"),
+                            {"fact_table": fact_table})).scalar_one()
+    max_key = (await dw.execute(text(f"SELECT MAX(date_key) FROM {fact_table};"))).scalar()
+
+    # Uusimmat ROLLUP_LAG_KEYS avainta käsitellään vasta myöhemmällä ajolla
+    max_key = max_key - ROLLUP_LAG_KEYS if max_key is not None else None
+    if max_key is None or max_key <= low:
+        await dw.commit()
+        return low, False
+
+    high = min(max_key, low + ROLLUP_BATCH_KEYS)
+    params = {"fact_table": fact_table, "low": low, "high": high}
+
+    for statement in _ROLLUP_STATEMENTS:
+        await dw.execute(text(statement.format(fact=fact_table, where=_WATERMARK_RANGE)), params)
+
+    # Jälkikäteen ladattujen lukemien date_keyt ovat vesirajan yläpuolella,
+    # vaikka niiden päivät ovat jo suljettuja jaksoja. Tällöin suljetut
+    # jaksot on poistettava välimuisteista.
+    if low > 0:
+        changed_from = (await dw.execute(text(f"SELECT MIN({_KEY_DATE}) FROM dates_dim "
+                                              "WHERE date_key > :low AND date_key <= :high;"), params)).scalar()
+        watermark_date = await key_date(dw, low)
+        if changed_from is not None and watermark_date is not None and changed_from < watermark_date:
+            await mark_closed_change(dw, fact_table, changed_from)
+
+    await dw.execute(text("UPDATE rollup_watermarks SET date_key = :high, updated_at = NOW() "
+                          "WHERE fact_table = :fact_table;"), params)
+    await dw.commit()
+
+    return high, high < max_key
+
+
+# Päivittää kaikkien faktataulujen koosteet ajan tasalle. Palauttaa
+# vesirajat muodossa {"productions_fact": 123456, ...}
+async def refresh_rollups(dw):
+    watermarks = {}
+
+    for fact_table in FACT_TABLES:
+        has_more = True
+        while has_more:
+            watermarks[fact_table], has_more = await refresh_fact_rollups_batch(dw, fact_table)
+
+    return watermarks
+
+
+# Taustatehtävä, joka käynnistetään main.py:n lifespanissa.
+async def refresh_rollups_periodically():
+    while True:
+        try:
+            async with dw_session() as _dw:
+                # Vesirajan edetessä välimuistin avoimet jaksot vanhenevat
+                await refresh_rollups(_dw)
+                response_cache.sync_versions(await read_versions(_dw))
+        except Exception as e:
+            print(f"Rollup refresh failed: {e}")
+
+        await asyncio.sleep(ROLLUP_REFRESH_INTERVAL)
+
+
+# Taustatehtävä, joka käynnistetään main.py:n lifespanissa. Lukee muiden
+# workerien ja ingestin kirjoittamat datan versiot.
+async def maintain_data_versions():
+    while True:
+        try:
+            async with dw_session() as _dw:
+                response_cache.sync_versions(await read_versions(_dw))
+        except Exception as e:
+            print(f"Data version refresh failed: {e}")
+
+        await asyncio.sleep(DATA_VERSION_REFRESH_INTERVAL)
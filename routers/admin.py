@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends
+
+from cache import response_cache
+from compression import compressed_cache
+from db import dw_pool_stats, db_pool_stats
+from fastjson import FastJSONRoute
+from routers.auth import require_role
+
+# Ylläpidon endpointit. Vaativat admin roolin.
+router = APIRouter(
+    prefix='/api/admin',
+    tags=['Admin'],
+    dependencies=[Depends(require_role("admin"))],
+    route_class=FastJSONRoute
+)
+
+
+# Poolien tilanne ja laskurit workerin käynnistyksestä lähtien
+@router.get("/pool")
+async def get_pool_stats():
+    """
+    Get connection pool counters for the DW and DB engines
+    """
+    return {"data": {"dw": dw_pool_stats.snapshot(), "db": db_pool_stats.snapshot()}}
+
+
+# Vastausvälimuistin ja pakattujen vastausten välimuistin tilastot
+@router.get("/cache")
+async def get_cache_stats():
+    """
+    Get response cache statistics (hits, misses, evictions, invalidations)
+    """
+    return {"data": {**response_cache.stats(), "compressed": compressed_cache.stats()}}
+
+
+# Tyhjentää välimuistin. Oletuksena vain avoimet jaksot, include_closed=true
+# poistaa myös suljetut. Pakatut vastaukset tyhjennetään aina kokonaan.
+@router.post("/cache/invalidate")
+async def invalidate_cache(fact_table: str | None = None, include_closed: bool = False):
+    """
+    Invalidate cached responses, optionally only for one fact table
+    """
+    compressed_cache.clear()
+    return {"data": {"invalidated": response_cache.invalidate(fact_table, include_closed)}}
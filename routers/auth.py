@@ -10,11 +10,13 @@ from passlib.context import CryptContext
 from sqlalchemy import text
 from models.auth import LoginDetails, User, LoginRes, RegisterRes
 from db import DB
+from fastjson import FastJSONRoute
 
 
 router = APIRouter(
     prefix='/api/auth',
-    tags=['Authorization']
+    tags=['Authorization'],
+    route_class=FastJSONRoute
 )
 
 # Salasanan häshäys
@@ -54,9 +56,9 @@ def get_password_hash(password):
 
 
 # Autentisoi käyttäjän login tiedot ja palauttaa User data classin, mikäli käyttäjätunnus ja salasana ovat oikein
-def authenticate_user(db: DB, username: str, password: str):
+async def authenticate_user(db: DB, username: str, password: str):
     _query = text("SELECT * FROM auth_users WHERE username = :username")
-    user = db.execute(_query, {"username": username}).mappings().first()
+    user = (await db.execute(_query, {"username": username})).mappings().first()
 
     if not user:
         return False
@@ -69,7 +71,7 @@ def authenticate_user(db: DB, username: str, password: str):
 # Haetaan kirjautunut käyttäjä
 # token: Annotated[str, Depends(oauth2_scheme)] määrittää, että headerissa halutaan token bearer
 # Jonka avulla funktio saa haltuunsa jwt subin, eli access_jti, jonka avulla taasen haetaan käyttäjä.
-def get_current_user(db: DB, token: Annotated[str, Depends(oauth2_scheme)]):
+async def get_current_user(db: DB, token: Annotated[str, Depends(oauth2_scheme)]):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -86,7 +88,7 @@ def get_current_user(db: DB, token: Annotated[str, Depends(oauth2_scheme)]):
         print("JWT error")
         raise credentials_exception
 
-    user = get_user_by_access_token_identifier(db, access_jti)
+    user = await get_user_by_access_token_identifier(db, access_jti)
 
     if not user:
         print("no user")
@@ -95,12 +97,32 @@ def get_current_user(db: DB, token: Annotated[str, Depends(oauth2_scheme)]):
     return user
 
 
+# Riippuvuus, joka vaatii kirjautuneelta käyttäjältä jonkin annetuista
+# rooleista (auth_roles.role_name). Muuten 403.
+def require_role(*role_names: str):
+    async def dependency(db: DB, user: Annotated[User, Depends(get_current_user)]):
+        role_name = (await db.execute(
+            text("SELECT role_name FROM auth_roles WHERE role_id = :role_id"),
+            {"role_id": user.role_id}
+        )).scalar()
+
+        if role_name not in role_names:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not enough permissions",
+            )
+
+        return user
+
+    return dependency
+
+
 # Haetaan käyttäjä access_jti:n perusteella, jota käytetään tokenin subina
-def get_user_by_access_token_identifier(db: DB, sub):
-    user = db.execute(
+async def get_user_by_access_token_identifier(db: DB, sub):
+    user = (await db.execute(
         text("SELECT * FROM auth_users WHERE access_jti = :sub"),
         {"sub": sub}
-    ).mappings().first()
+    )).mappings().first()
 
     if not user:
         return False
@@ -111,7 +133,7 @@ def get_user_by_access_token_identifier(db: DB, sub):
 # Hae logged in user, vaatii tokenin
 @router.get("/user")
 async def get_logged_in_user(db: DB, token: Annotated[str, Depends(oauth2_scheme)]) -> User:
-    return get_current_user(db, token)
+    return await get_current_user(db, token)
 
 
 # Luo tietokantaan uusi käyttäjä
@@ -124,7 +146,7 @@ async def register_user(db: DB, req: LoginDetails) -> RegisterRes:
     hashed_pw = get_password_hash(req.password)
 
     # Löytyykö user role tietokannasta
-    role_id = db.execute(text("SELECT role_id FROM auth_roles WHERE role_name = 'user'")).mappings().first()
+    role_id = (await db.execute(text("SELECT role_id FROM auth_roles WHERE role_name = 'user'"))).mappings().first()
     if role_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -133,10 +155,10 @@ async def register_user(db: DB, req: LoginDetails) -> RegisterRes:
     role_id = role_id['role_id']
 
     # Onko käyttäjänimi jo käytössä
-    user_in_db = db.execute(
+    user_in_db = (await db.execute(
         text("SELECT username FROM auth_users WHERE username = :username"),
         {"username": req.username}
-    ).mappings().first()
+    )).mappings().first()
 
     if user_in_db is not None:
         raise HTTPException(
@@ -145,7 +167,7 @@ async def register_user(db: DB, req: LoginDetails) -> RegisterRes:
         )
 
     # Voidaan suorittaa insert ja commitoida se
-    db.execute(
+    await db.execute(
         _insert,
         {
             "username": req.username,
@@ -153,7 +175,7 @@ async def register_user(db: DB, req: LoginDetails) -> RegisterRes:
             "role_id": role_id
         }
     )
-    db.commit()
+    await db.commit()
 
     return RegisterRes(username=req.username, role_id=role_id)
 
@@ -164,7 +186,7 @@ async def login_openapi(
         db: DB,
         form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ) -> LoginRes:
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
 
     if not user:
         raise HTTPException(
@@ -176,14 +198,14 @@ async def login_openapi(
     # Luodaan access_token sub tietokantaan
     access_token_sub = str(uuid.uuid4())
 
-    db.execute(
+    await db.execute(
         text("UPDATE auth_users SET access_jti = :sub WHERE auth_users.user_id = :id"),
         {
             "sub": access_token_sub,
             "id": user.user_id
         }
     )
-    db.commit()
+    await db.commit()
 
     access_token = create_access_token(
         data={"sub": access_token_sub}, expires_delta=timedelta(minutes=15)
@@ -198,7 +220,7 @@ async def login(
         db: DB,
         req: LoginDetails
 ) -> LoginRes:
-    user = authenticate_user(db, req.username, req.password)
+    user = await authenticate_user(db, req.username, req.password)
 
     if not user:
         raise HTTPException(
@@ -210,14 +232,14 @@ async def login(
     # Luodaan access_token sub tietokantaan
     access_token_sub = str(uuid.uuid4())
 
-    db.execute(
+    await db.execute(
         text("UPDATE auth_users SET access_jti = :sub WHERE auth_users.user_id = :id"),
         {
             "sub": access_token_sub,
             "id": user.user_id
         }
     )
-    db.commit()
+    await db.commit()
 
     access_token = create_access_token(
         data={"sub": access_token_sub}, expires_delta=timedelta(days=7)
@@ -229,10 +251,10 @@ async def login(
 # Poistetaan jti tietokannasta uloskirjautuessa. Vaatii tokenin
 @router.post("/logout")
 async def logout(db: DB, token: Annotated[str, Depends(oauth2_scheme)]):
-    user = get_current_user(db, token)
+    user = await get_current_user(db, token)
 
-    db.execute(
+    await db.execute(
         text("UPDATE auth_users SET access_jti = NULL WHERE auth_users.user_id = :id"),
         {"id": user.user_id}
     )
-    db.commit()
+    await db.commit()
@@ -1,28 +1,168 @@
-from fastapi import APIRouter
-from sqlalchemy import text
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from db import DW
+from fastjson import FastJSONRoute
+from etag import conditional_get
+import periods
+from latest import latest_readings
+from response_format import ResponseFormat
+from sensor_registry import role_keys, role_sensors, sensor_registry
+from timeseries import SeriesQuery, fetch_sensor_series, range_period, SUMMARY_PERIODS, RANGE_DEFAULT_BUCKETS
 
 
 router = APIRouter(
     prefix='/api/measurement/battery',
-    tags=['Battery']
+    tags=['Battery'],
+    dependencies=[Depends(conditional_get("measurements_fact"))],
+    route_class=FastJSONRoute
 )
 
+# Akun anturit anturirekisteristä (rooli battery)
+BatterySensors = Annotated[tuple, Depends(role_sensors("battery"))]
+
+# Akun suureet ja niiden anturien yksiköt sensors_dim taulussa
+BATTERY_QUANTITIES = {
+    "soc": ("%",),
+    "voltage": ("V",),
+    "power": ("W", "kW"),
+}
+
 
 # Palauttaa uusimmat tilastot akun tiedoista
 @router.get("/current")
-async def get_most_recent_values_from_battery(dw: DW):
-    _query = text(
-        "SELECT s.sensor_name AS sensor, m.value AS value "
-        "FROM measurements_fact AS m JOIN dates_dim AS d ON d.date_key = m.date_key "
-        "JOIN sensors_dim AS s ON s.sensor_key = m.sensor_key "
-        "WHERE s.device_id = 'TB_batterypack' AND m.date_key = ("
-        "   SELECT MAX(date_key) "
-        "   FROM measurements_fact "
-        "   WHERE sensor_key = s.sensor_key "
-        ") "
-        "ORDER BY s.sensor_id;")
-    rows = dw.execute(_query)
-    data = rows.mappings().all()
-
-    return {'current_battery_stats': data}
+async def get_most_recent_values_from_battery(dw: DW, sensors: BatterySensors):
+    await latest_readings.ensure_loaded(dw)
+    readings = latest_readings.latest("measurements_fact", sensors)
+    data = [{"sensor": reading["sensor_name"], "value": reading["value"]} for reading in readings]
+
+    return {'current_battery_stats': data, 'refreshed_at': latest_readings.refreshed_at}
+
+
+# Akun suureen (soc, voltage tai power) anturi anturirekisteristä
+async def _battery_sensor(quantity: str):
+    if quantity not in BATTERY_QUANTITIES:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unknown battery quantity",
+        )
+
+    sensor_keys = sensor_registry.with_unit(await role_keys("battery"), BATTERY_QUANTITIES[quantity])
+    if not sensor_keys:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No {quantity} sensor for the battery",
+        )
+
+    return sensor_registry.get(sensor_keys[0])
+
+
+# Suureen keskiarvot measurements_fact koosteista. Ämpärit, joilta ei ole
+# mittauksia, ovat None (nolla olisi oikea lukema).
+async def _battery_history(dw, quantity: str, period: periods.Period, granularity: str, time_key: str, format: str,
+                           label: str | None = None):
+    sensor = await _battery_sensor(quantity)
+    series = await fetch_sensor_series(dw, SeriesQuery("measurements_fact", period, granularity, "avg",
+                                                       sensors=(sensor["sensor_key"],), by_sensor=True))
+
+    if format == "columnar":
+        return {"t": series.epochs, "v": series.values[sensor["sensor_key"]], "unit": sensor["unit"]}
+
+    return [{time_key: t if label is None else getattr(t, label), "avg": value, "unit": sensor["unit"]}
+            for t, value in zip(series.labels, series.values[sensor["sensor_key"]])]
+
+
+# Tämä on akun chartin DAY nappia varten. quantity on soc, voltage tai power
+@router.get("/{quantity}/hourly/{date}")
+async def get_battery_history_hourly_by_day(dw: DW, quantity: str, date: str, response_format: ResponseFormat):
+    """
+    Get hourly battery values (avg) from a given day. quantity is soc, voltage or power.
+    String ISO 8601 format YYYY-MM-DD
+    """
+    return {"data": await _battery_history(dw, quantity, periods.day(date), "hour", "hour",
+                                           response_format, label="hour")}
+
+
+# Tämä on akun chartin WEEK nappia varten.
+@router.get("/{quantity}/daily/week/{date}")
+async def get_battery_history_daily_by_week(dw: DW, quantity: str, date: str, response_format: ResponseFormat):
+    """
+    Get daily battery values (avg) from a given week. quantity is soc, voltage or power.
+    """
+    return {"data": await _battery_history(dw, quantity, periods.week(date), "day", "date", response_format)}
+
+
+# Tämä on akun chartin MONTH nappia varten
+@router.get("/{quantity}/daily/month/{date}")
+async def get_battery_history_daily_by_month(dw: DW, quantity: str, date: str, response_format: ResponseFormat):
+    """
+    Get daily battery values (avg) from a given month. quantity is soc, voltage or power.
+    ISO 8601 format YYYY-MM-DD
+    """
+    return {"data": await _battery_history(dw, quantity, periods.month(date), "day", "day",
+                                           response_format, label="day")}
+
+
+# Tämä on akun chartin YEAR nappia varten. Viikot saa /range endpointista.
+@router.get("/{quantity}/monthly/{date}")
+async def get_battery_history_monthly_by_year(dw: DW, quantity: str, date: str, response_format: ResponseFormat):
+    """
+    Get monthly battery values (avg) from a given year. quantity is soc, voltage or power.
+    ISO 8601 format YYYY-MM-DD
+    """
+    return {"data": await _battery_history(dw, quantity, periods.year(date), "month", "month",
+                                           response_format, label="month")}
+
+
+# Vapaa aikaväli (from, to). Ämpärin koko valitaan kuten muiden
+# kaavioiden /range endpointeissa.
+@router.get("/{quantity}/range")
+async def get_battery_history_range(dw: DW, quantity: str,
+                                    start: Annotated[str, Query(alias="from")],
+                                    end: Annotated[str, Query(alias="to")],
+                                    response_format: ResponseFormat,
+                                    max_buckets: int = RANGE_DEFAULT_BUCKETS):
+    """
+    Get battery values (avg) between from and to (inclusive) with an automatically chosen bucket size
+    (minute, hour, day, week or month). quantity is soc, voltage or power. ISO 8601 format YYYY-MM-DD
+    """
+    try:
+        granularity, period = range_period(start, end, max_buckets)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
+
+    history = await _battery_history(dw, quantity, period, granularity, "time", response_format)
+
+    return {"data": history, "granularity": granularity}
+
+
+# Akkuun ladattu ja akusta purettu energia jaksolla (kWh). Energia lasketaan
+# tehon tuntikeskiarvoista (keskiteho * 1 h): positiivinen teho on latausta
+# ja negatiivinen purkua. Tunnit, joilta ei ole mittauksia, jätetään pois.
+# period on day, week, month, year tai seven_day_period.
+@router.get("/charge/{period}/{date}")
+async def get_battery_charge_totals(dw: DW, period: str, date: str):
+    """
+    Get energy charged to and discharged from the battery (kWh) for a given period
+    (day, week, month, year or seven_day_period), computed from hourly average power. ISO 8601 format YYYY-MM-DD
+    """
+    if period not in SUMMARY_PERIODS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unknown period",
+        )
+
+    sensor = await _battery_sensor("power")
+    series = await fetch_sensor_series(dw, SeriesQuery("measurements_fact", SUMMARY_PERIODS[period][0](date), "hour",
+                                                       "avg", sensors=(sensor["sensor_key"],), by_sensor=True))
+    to_kwh = 1 / 1000 if sensor["unit"] == "W" else 1
+    hourly_kwh = [value * to_kwh for value in series.values[sensor["sensor_key"]] if value is not None]
+
+    return {"data": {
+        "charged_kwh": sum(kwh for kwh in hourly_kwh if kwh > 0),
+        "discharged_kwh": -sum(kwh for kwh in hourly_kwh if kwh < 0),
+        "hours": len(hourly_kwh),
+    }}
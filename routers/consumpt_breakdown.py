@@ -0,0 +1,111 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from db import DW
+from fastjson import FastJSONRoute
+from etag import conditional_get
+import periods
+from response_format import ResponseFormat
+from timeseries import SeriesQuery, fetch_series_many, range_period, RANGE_DEFAULT_BUCKETS
+
+# Kulutuksen erittely: lämmitys, valaistus, pistorasiat ja kokonaiskulutus.
+# Vastauksen avain -> faktataulu
+BREAKDOWN_TABLES = {
+    "heating_kwh": "heating_consumptions_fact",
+    "lighting_kwh": "lighting_consumptions_fact",
+    "outlets_kwh": "outlets_consumptions_fact",
+    "total_kwh": "total_consumptions_fact",
+}
+
+router = APIRouter(
+    prefix='/api/measurement/consumption/breakdown',
+    tags=['Consumption - Breakdown'],
+    dependencies=[Depends(conditional_get(*BREAKDOWN_TABLES.values()))],
+    route_class=FastJSONRoute
+)
+
+
+# Kaikkien kulutuslajien sarjat haetaan yhdellä koostekyselyllä
+# (fact_table IN (...)), ja ne yhdistetään riveiksi
+# [{time_key: ..., "heating_kwh": ..., "lighting_kwh": ..., "outlets_kwh": ..., "total_kwh": ...}]
+# tai columnar muodossa {"t": [...], "v": {"heating_kwh": [...], ...}}
+async def _breakdown(dw, period: periods.Period, granularity: str, time_key: str, format: str,
+                     label: str | None = None):
+    series = await fetch_series_many(dw, [SeriesQuery(fact_table, period, granularity)
+                                          for fact_table in BREAKDOWN_TABLES.values()])
+    columns = {key: s.values for key, s in zip(BREAKDOWN_TABLES, series)}
+
+    if format == "columnar":
+        return {"t": series[0].epochs, "v": columns}
+
+    return [{time_key: t if label is None else getattr(t, label), **{key: values[i] for key, values in columns.items()}}
+            for i, t in enumerate(series[0].labels)]
+
+
+# Tämä on MainScreenin PANEELIA varten: 7 päivän jakso päivittäin
+@router.get("/seven_day_period/{date}")
+async def get_consumption_breakdown_daily_seven_day_period(dw: DW, date: str, response_format: ResponseFormat):
+    """
+    Get daily consumptions (heating, lighting, outlets and total) from 7 days before the given date (7-day period).
+    String ISO 8601 format YYYY-MM-DD
+    """
+    return {"data": await _breakdown(dw, periods.seven_days(date), "day", "date", response_format)}
+
+
+# Tämä on consumption chartin DAY nappia varten.
+@router.get("/hourly/{date}")
+async def get_consumption_breakdown_hourly_by_day(dw: DW, date: str, response_format: ResponseFormat):
+    """
+    Get hourly consumptions (heating, lighting, outlets and total) from a given day. String ISO 8601 format YYYY-MM-DD
+    """
+    return {"data": await _breakdown(dw, periods.day(date), "hour", "hour", response_format, label="hour")}
+
+
+# Tämä on consumption chartin WEEK nappia varten.
+@router.get("/daily/week/{date}")
+async def get_consumption_breakdown_daily_by_week(dw: DW, date: str, response_format: ResponseFormat):
+    """
+    Get daily consumptions (heating, lighting, outlets and total) from a given week.
+    """
+    return {"data": await _breakdown(dw, periods.week(date), "day", "date", response_format)}
+
+
+# Tämä on consumption chartin MONTH nappia varten
+@router.get("/daily/month/{date}")
+async def get_consumption_breakdown_daily_by_month(dw: DW, date: str, response_format: ResponseFormat):
+    """
+    Get daily consumptions (heating, lighting, outlets and total) from a given month. ISO 8601 format YYYY-MM-DD
+    """
+    return {"data": await _breakdown(dw, periods.month(date), "day", "day", response_format, label="day")}
+
+
+# Tämä on consumption chartin YEAR nappia varten
+@router.get("/monthly/{date}")
+async def get_consumption_breakdown_monthly_by_year(dw: DW, date: str, response_format: ResponseFormat):
+    """
+    Get monthly consumptions (heating, lighting, outlets and total) from a given year. ISO 8601 format YYYY-MM-DD
+    """
+    return {"data": await _breakdown(dw, periods.year(date), "month", "month", response_format, label="month")}
+
+
+# Vapaa aikaväli (from, to). Ämpärin koko valitaan kuten muiden
+# kaavioiden /range endpointeissa.
+@router.get("/range")
+async def get_consumption_breakdown_range(dw: DW,
+                                          start: Annotated[str, Query(alias="from")],
+                                          end: Annotated[str, Query(alias="to")],
+                                          response_format: ResponseFormat,
+                                          max_buckets: int = RANGE_DEFAULT_BUCKETS):
+    """
+    Get consumptions (heating, lighting, outlets and total) between from and to (inclusive) with an automatically
+    chosen bucket size (minute, hour, day, week or month). ISO 8601 format YYYY-MM-DD
+    """
+    try:
+        granularity, period = range_period(start, end, max_buckets)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
+
+    return {"data": await _breakdown(dw, period, granularity, "time", response_format), "granularity": granularity}
@@ -0,0 +1,75 @@
+import asyncio
+import os
+
+from fastapi import APIRouter
+
+from db import dw_session
+from fastjson import FastJSONRoute
+from routers import battery, totalconsumpt, totalprod, solarproduction, windproduction, temperature
+from sensor_registry import role_keys
+from timeseries import fetch_period_summary
+
+router = APIRouter(
+    prefix='/api/dashboard',
+    tags=['Dashboard'],
+    route_class=FastJSONRoute
+)
+
+# Montako DW-yhteyttä yksi dashboard-request saa käyttää yhtä aikaa. Pidä
+# poolin kokoa (DW_POOL_SIZE) pienempänä, ettei yksi request vie koko poolia.
+DASHBOARD_MAX_CONNECTIONS = int(os.environ.get("DASHBOARD_MAX_CONNECTIONS", 4))
+
+
+# Ajaa paneelin kyselyn omalla sessiollaan, koska yhtä AsyncSessionia ei
+# saa käyttää rinnakkain useasta tehtävästä.
+async def _panel(semaphore: asyncio.Semaphore, handler, *args):
+    async with semaphore:
+        async with dw_session() as _dw:
+            return await handler(_dw, *args)
+
+
+# MainScreenin kaikki paneelit yhdellä requestilla. Kyselyt ajetaan
+# rinnakkain poolin yhteyksillä. Summa ja keskiarvo lasketaan samasta
+# yhteenvedosta, ja paneelien data on samaa muotoa kuin erillisissä
+# endpointeissa.
+@router.get("/{date}")
+async def get_dashboard(date: str):
+    """
+    Get all MainScreen panels (7-day period ending at the given date and current values) in one response.
+    ISO 8601 format YYYY-MM-DD
+    """
+    semaphore = asyncio.Semaphore(DASHBOARD_MAX_CONNECTIONS)
+    # Paneelien anturit anturirekisterin rooleista (sama kuin endpointeissa
+    # ilman ?sensor_id= parametria)
+    indoor, temperatures, solar_sensors, wind_sensors, battery_sensors = [
+        await role_keys(role) for role in ("indoor_temperature", "temperature", "solar_production",
+                                           "wind_production", "battery")]
+
+    (consumption_total, consumption_summary, production_total, production_summary, solar, wind, temperature_avg,
+     temperature_currents, wind_currents, battery_current) = await asyncio.gather(
+        _panel(semaphore, totalconsumpt.get_total_consumption_statistics_daily_seven_day_period, date, "rows"),
+        _panel(semaphore, fetch_period_summary, "total_consumptions_fact", "seven_day_period", date),
+        _panel(semaphore, totalprod.get_total_production_statistic_daily_seven_day_period, date, "rows"),
+        _panel(semaphore, fetch_period_summary, "productions_fact", "seven_day_period", date),
+        _panel(semaphore, solarproduction.get_total_solar_production_seven_day_period, date, solar_sensors, "rows"),
+        _panel(semaphore, windproduction.get_total_kwh_wind_production_seven_day_period, date, wind_sensors, "rows"),
+        _panel(semaphore, temperature.get_indoor_avg_temperature_statistic_seven_day_period, date, indoor, "rows"),
+        _panel(semaphore, temperature.get_most_recent_temperatures, temperatures),
+        _panel(semaphore, windproduction.get_most_recent_wind_data, wind_sensors),
+        _panel(semaphore, battery.get_most_recent_values_from_battery, battery_sensors),
+    )
+
+    return {"data": {
+        "consumption_total": consumption_total["data"],
+        "consumption_sum": [{"sum_kwh": consumption_summary["sum"]}],
+        "consumption_avg": [{"avg_kwh": consumption_summary["avg"]}],
+        "production_total": production_total["data"],
+        "production_sum": [{"sum_kwh": production_summary["sum"]}],
+        "production_avg": [{"avg_kwh": production_summary["avg"]}],
+        "solar": solar["data"],
+        "wind": wind["data"],
+        "temperature_avg": temperature_avg["data"],
+        "temperature_currents": temperature_currents["data"],
+        "wind_currents": wind_currents["data"],
+        "battery_current": battery_current["current_battery_stats"],
+    }}
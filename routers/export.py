@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+
+from db import DW
+from fastjson import FastJSONRoute
+from export import EXPORT_FORMATS, ExportError, format_available, resolve_slice
+from routers.auth import get_current_user
+
+# Raakalukemien vienti. Vaatii kirjautumisen.
+router = APIRouter(
+    prefix='/api/export',
+    tags=['Export'],
+    dependencies=[Depends(get_current_user)],
+    route_class=FastJSONRoute
+)
+
+
+# Striimaa faktataulun raakalukemat annetuilta antureilta ja aikaväliltä.
+# format on ndjson, csv, arrow (Arrow IPC stream) tai parquet.
+# Vastaus kirjoitetaan sitä mukaa kuin rivejä luetaan kannasta, joten
+# muistinkäyttö ei riipu viennin koosta.
+@router.get("/{fact_table}")
+async def export_readings(dw: DW, fact_table: str, sensors: str, start: datetime, end: datetime,
+                          format: str = "ndjson"):
+    """
+    Stream raw readings (sensor_id, timestamp, value) of a fact table as NDJSON, CSV, Arrow IPC stream or Parquet.
+    sensors is a comma separated list of sensor_ids, start and end are ISO 8601 timestamps (inclusive)
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown format: {format}. Use one of: {', '.join(EXPORT_FORMATS)}",
+        )
+
+    if not format_available(format):
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail=f"Format {format} requires pyarrow, which is not installed on the server",
+        )
+
+    try:
+        export = await resolve_slice(dw, fact_table, [sensor_id for sensor_id in sensors.split(",") if sensor_id],
+                                     start, end)
+    except ExportError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
+
+    chunks, media_type, extension = EXPORT_FORMATS[format]
+    filename = f"{fact_table}_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}.{extension}"
+
+    return StreamingResponse(chunks(export), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from db import DW
+from fastjson import FastJSONRoute
+from ingest import IngestError, ingest_readings
+from models.ingest import IngestBatch, IngestRes
+from routers.auth import require_role
+
+# Lukemien kirjoitus DW:hen. Vaatii admin tai ingest roolin.
+router = APIRouter(
+    prefix='/api/ingest',
+    tags=['Ingest'],
+    dependencies=[Depends(require_role("admin", "ingest"))],
+    route_class=FastJSONRoute
+)
+
+
+# Kirjoittaa erän lukemia yhteen faktatauluun. Anturit haetaan sensor_id:n
+# perusteella, ja puuttuvat dates_dim rivit lisätään.
+@router.post("")
+async def ingest(dw: DW, req: IngestBatch) -> IngestRes:
+    """
+    Write a batch of (sensor_id, timestamp, value) readings to a fact table
+    """
+    try:
+        result = await ingest_readings(dw, req.fact_table,
+                                       [(reading.sensor_id, reading.timestamp, reading.value)
+                                        for reading in req.readings])
+    except IngestError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
+
+    return IngestRes(**result)
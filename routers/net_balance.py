@@ -0,0 +1,117 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from db import DW
+from fastjson import FastJSONRoute
+from etag import conditional_get
+import periods
+from response_format import ResponseFormat
+from timeseries import SeriesQuery, fetch_series_many, range_period, RANGE_DEFAULT_BUCKETS
+
+router = APIRouter(
+    prefix='/api/measurement/balance',
+    tags=['Net balance'],
+    dependencies=[Depends(conditional_get("productions_fact", "total_consumptions_fact"))],
+    route_class=FastJSONRoute
+)
+
+
+# Tuotanto ja kulutus luetaan koosteista yhdellä kyselyllä
+# (fact_table IN (...)), ja jokaiselle ämpärille lasketaan:
+# - net_kwh = tuotanto - kulutus
+# - self_consumption = osuus tuotannosta, joka kulutettiin samassa ämpärissä
+#   (min(tuotanto, kulutus) / tuotanto), None jos tuotantoa ei ollut
+# Columnar muodossa sarakkeet palautetaan listoina {"t": [...], "v": {...}}.
+async def _balance(dw, period: periods.Period, granularity: str, time_key: str, format: str,
+                   label: str | None = None):
+    production, consumption = await fetch_series_many(dw, [
+        SeriesQuery("productions_fact", period, granularity),
+        SeriesQuery("total_consumptions_fact", period, granularity),
+    ])
+
+    pairs = list(zip(production.values, consumption.values))
+    columns = {
+        "production_kwh": production.values,
+        "consumption_kwh": consumption.values,
+        "net_kwh": [produced - consumed for produced, consumed in pairs],
+        "self_consumption": [min(produced, consumed) / produced if produced > 0 else None
+                             for produced, consumed in pairs],
+    }
+
+    if format == "columnar":
+        return {"t": production.epochs, "v": columns}
+
+    return [{time_key: t if label is None else getattr(t, label), **{key: values[i] for key, values in columns.items()}}
+            for i, t in enumerate(production.labels)]
+
+
+# Tämä on MainScreenin PANEELIA varten: 7 päivän jakso päivittäin
+@router.get("/seven_day_period/{date}")
+async def get_net_balance_daily_seven_day_period(dw: DW, date: str, response_format: ResponseFormat):
+    """
+    Get daily production, consumption, net (production - consumption) and self-consumption ratio
+    from 7 days before the given date (7-day period). String ISO 8601 format YYYY-MM-DD
+    """
+    return {"data": await _balance(dw, periods.seven_days(date), "day", "date", response_format)}
+
+
+# Tämä on balance chartin DAY nappia varten.
+@router.get("/hourly/{date}")
+async def get_net_balance_hourly_by_day(dw: DW, date: str, response_format: ResponseFormat):
+    """
+    Get hourly production, consumption, net and self-consumption ratio from a given day.
+    String ISO 8601 format YYYY-MM-DD
+    """
+    return {"data": await _balance(dw, periods.day(date), "hour", "hour", response_format, label="hour")}
+
+
+# Tämä on balance chartin WEEK nappia varten.
+@router.get("/daily/week/{date}")
+async def get_net_balance_daily_by_week(dw: DW, date: str, response_format: ResponseFormat):
+    """
+    Get daily production, consumption, net and self-consumption ratio from a given week.
+    """
+    return {"data": await _balance(dw, periods.week(date), "day", "date", response_format)}
+
+
+# Tämä on balance chartin MONTH nappia varten
+@router.get("/daily/month/{date}")
+async def get_net_balance_daily_by_month(dw: DW, date: str, response_format: ResponseFormat):
+    """
+    Get daily production, consumption, net and self-consumption ratio from a given month.
+    ISO 8601 format YYYY-MM-DD
+    """
+    return {"data": await _balance(dw, periods.month(date), "day", "day", response_format, label="day")}
+
+
+# Tämä on balance chartin YEAR nappia varten
+@router.get("/monthly/{date}")
+async def get_net_balance_monthly_by_year(dw: DW, date: str, response_format: ResponseFormat):
+    """
+    Get monthly production, consumption, net and self-consumption ratio from a given year.
+    ISO 8601 format YYYY-MM-DD
+    """
+    return {"data": await _balance(dw, periods.year(date), "month", "month", response_format, label="month")}
+
+
+# Vapaa aikaväli (from, to). Ämpärin koko valitaan kuten muiden
+# kaavioiden /range endpointeissa.
+@router.get("/range")
+async def get_net_balance_range(dw: DW,
+                                start: Annotated[str, Query(alias="from")],
+                                end: Annotated[str, Query(alias="to")],
+                                response_format: ResponseFormat,
+                                max_buckets: int = RANGE_DEFAULT_BUCKETS):
+    """
+    Get production, consumption, net and self-consumption ratio between from and to (inclusive) with an
+    automatically chosen bucket size (minute, hour, day, week or month). ISO 8601 format YYYY-MM-DD
+    """
+    try:
+        granularity, period = range_period(start, end, max_buckets)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
+
+    return {"data": await _balance(dw, period, granularity, "time", response_format), "granularity": granularity}
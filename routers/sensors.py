@@ -0,0 +1,62 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from db import DW
+from etag import conditional_get
+from fastjson import FastJSONRoute
+from response_format import ResponseFormat
+from sensor_registry import sensor_registry
+from timeseries import RANGE_DEFAULT_BUCKETS, SensorSeries, fetch_range_sensor_series
+
+router = APIRouter(
+    prefix='/api/measurement/sensors',
+    tags=['Sensors'],
+    dependencies=[Depends(conditional_get())],
+    route_class=FastJSONRoute
+)
+
+# Montako anturia yhdellä requestilla saa hakea
+MAX_SENSORS = 50
+
+
+# Usean anturin sarjat yhteisellä aika-akselilla, esim. ulkomaston,
+# teknisen rakennuksen ja WC:n lämpötilat. Anturit annetaan sensor_ideinä
+# kuten /api/export ja ?sensor_id= parametreissa, ja ne muutetaan
+# sensor_keyiksi anturirekisterin kautta. Kaikki anturit haetaan yhdellä
+# kyselyllä. Ämpärin koko valitaan kuten /range endpointeissa.
+@router.get("/{fact_table}")
+async def get_sensor_series(dw: DW, fact_table: str, sensors: str,
+                            start: Annotated[str, Query(alias="from")],
+                            end: Annotated[str, Query(alias="to")],
+                            response_format: ResponseFormat,
+                            aggregation: str = "avg",
+                            max_buckets: int = RANGE_DEFAULT_BUCKETS):
+    """
+    Get series for several sensors (comma separated sensor_ids) between from and to
+    (inclusive, ISO 8601 format YYYY-MM-DD) on one shared time axis. Series are keyed by sensor_id.
+    aggregation is sum, avg, min, max or count. Buckets without data are 0 for sum and count, otherwise null.
+    """
+    try:
+        sensor_ids = sorted({sensor_id for sensor_id in sensors.split(",") if sensor_id})
+        if not 1 <= len(sensor_ids) <= MAX_SENSORS:
+            raise ValueError(f"Give between 1 and {MAX_SENSORS} sensors")
+
+        keys = await sensor_registry.resolve(dw, sensor_ids)
+        unknown = [sensor_id for sensor_id in sensor_ids if sensor_id not in keys]
+        if unknown:
+            raise ValueError(f"Unknown sensors: {', '.join(unknown)}")
+
+        granularity, series = await fetch_range_sensor_series(dw, fact_table, tuple(keys.values()), start, end,
+                                                              max_buckets, aggregation)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
+
+    # Välimuistissa sarjat ovat sensor_keyn mukaan, vastauksessa sensor_idn
+    ids = {sensor_key: sensor_id for sensor_id, sensor_key in keys.items()}
+    series = SensorSeries(series.labels, {ids[sensor_key]: values for sensor_key, values in series.values.items()})
+
+    return {"data": series.data(response_format), "granularity": granularity}
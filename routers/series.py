@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from db import DW
+from etag import conditional_get
+from fastjson import FastJSONRoute
+from downsample import DEFAULT_POINTS, MAX_POINTS, downsample
+from export import ExportError, resolve_slice
+
+
+router = APIRouter(
+    prefix='/api/measurement/series',
+    tags=['Series'],
+    dependencies=[Depends(conditional_get())],
+    route_class=FastJSONRoute
+)
+
+
+# Yhden anturin käyrä harvennettuna enintään points pisteeseen (LTTB).
+# Harvennus säilyttää käyrän huiput ja muodon, joten esim. lämpötila- ja
+# tuulikäyrät voi piirtää millä tahansa aikavälillä ilman raakadataa.
+@router.get("/{fact_table}/{sensor_id}")
+async def get_downsampled_series(dw: DW, fact_table: str, sensor_id: str, start: datetime, end: datetime,
+                                 points: int = DEFAULT_POINTS):
+    """
+    Get a sensor's readings between start and end (ISO 8601 timestamps, inclusive) downsampled
+    to at most `points` points with Largest-Triangle-Three-Buckets
+    """
+    if not 3 <= points <= MAX_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"points must be between 3 and {MAX_POINTS}",
+        )
+
+    try:
+        export = await resolve_slice(dw, fact_table, [sensor_id], start, end)
+    except ExportError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
+
+    series = await downsample(dw, export, points)
+
+    return {"data": [{"timestamp": timestamp, "value": value} for timestamp, value in series]}
@@ -1,156 +1,106 @@
-from fastapi import APIRouter
-from sqlalchemy import text
-from db import DW
-import datetime
+from typing import Annotated
 
-from customfunctions import generate_zero_for_missing_days_in_7_day_period_with_keys, \
-    generate_zero_for_missing_hours_in_day_with_keys, generate_zero_for_missing_days_in_week_query, \
-    generate_zero_for_missing_days_in_month_query, generate_zero_for_missing_months_in_year_query
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from db import DW
+from fastjson import FastJSONRoute
+from etag import conditional_get
+import periods
+from response_format import ResponseFormat
+from sensor_registry import role_sensors
+from timeseries import SeriesQuery, fetch_series, fetch_range_series, RANGE_DEFAULT_BUCKETS
 
 router = APIRouter(
     prefix='/api/measurement/solar',
-    tags=['Solar']
+    tags=['Solar'],
+    dependencies=[Depends(conditional_get("productions_fact"))],
+    route_class=FastJSONRoute
 )
 
+# Aurinkopaneelien anturit anturirekisteristä (rooli solar_production)
+SolarSensors = Annotated[tuple, Depends(role_sensors("solar_production"))]
+
+
 # Haetaan 7 edelliseltä päivältä solar tuotto, ryhmitetty päivittäin.
 @router.get("/total/seven_day_period/{date}")
-async def get_total_solar_production_seven_day_period(dw: DW, date: str):
+async def get_total_solar_production_seven_day_period(dw: DW, date: str, sensors: SolarSensors,
+                                                      response_format: ResponseFormat):
     """
     Get production stats (solar) from 7 days before the given date
     (7-day period) grouped by day. String format YYYY-MM-DD.
     """
-    _query = text("SELECT DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) as date, "
-                  "SUM(p.value) AS total_kwh "
-                  "FROM productions_fact p "
-                  "JOIN dates_dim d ON p.date_key = d.date_key "
-                  "WHERE DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) "
-                  "BETWEEN DATE_SUB(DATE(:date), INTERVAL 6 DAY) AND :date "
-                  "AND p.sensor_key = :sensor_key "
-                  "GROUP BY date;"
-    )
-    rows = dw.execute(_query, {"date": date, "sensor_key": 276})
-
-    fetched_data = rows.mappings().all()
-    _date = datetime.datetime.strptime(date, "%Y-%m-%d").date()
-
-    time_key = "date"
-    solar_unit_key = "total_kwh"
-
-    if len(fetched_data) > 0:
-        time_key = tuple(fetched_data[0].keys())[0]
-        solar_unit_key = tuple(fetched_data[0].keys())[1]
+    series = await fetch_series(dw, SeriesQuery("productions_fact", periods.seven_days(date), "day", sensors=sensors))
 
-    data = generate_zero_for_missing_days_in_7_day_period_with_keys(fetched_data, _date, time_key, solar_unit_key)
-
-    return{"data": data}
+    return {"data": series.data(response_format, "date", "total_kwh")}
 
 # Haetaan päiväkohtainen solar tuotto, ryhmitetty tunneittain.
 @router.get("/total/hourly/{date}")
-async def get_total_solar_production_hourly_by_day(dw: DW, date: str):
+async def get_total_solar_production_hourly_by_day(dw: DW, date: str, sensors: SolarSensors,
+                                                   response_format: ResponseFormat):
     """
     Get production stats (solar) for a given day grouped by hour.
     String format YYYY-MM-DD.
     """
-    _query = text("SELECT d.hour, SUM(p.value) AS total_kwh "
-                  "FROM productions_fact p "
-                  "JOIN dates_dim d ON p.date_key = d.date_key "
-                  "WHERE DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) = :date "
-                  "AND p.sensor_key = :sensor_key "
-                  "GROUP BY d.hour "
-                  "ORDER BY d.hour;"
-    )
-    rows = dw.execute(_query, {"date": date, "sensor_key": 276})
-
-    fetched_data = rows.mappings().all()
-
-    time_key = "hour"
-    solar_unit_key = "total_kwh"
+    series = await fetch_series(dw, SeriesQuery("productions_fact", periods.day(date), "hour", sensors=sensors))
 
-    if len(fetched_data) > 0:
-        time_key = tuple(fetched_data[0].keys())[0]
-        solar_unit_key = tuple(fetched_data[0].keys())[1]
-
-    data = generate_zero_for_missing_hours_in_day_with_keys(fetched_data, time_key, solar_unit_key)
-
-    return{"data": data}
+    return {"data": series.data(response_format, "hour", "total_kwh", label="hour")}
 
 # Haetaan viikkokohtainen solar tuotto, ryhmitetty päivittäin.
 @router.get("/total/daily/week/{date}")
-async def get_total_solar_production_daily_by_week(dw: DW, date: str):
+async def get_total_solar_production_daily_by_week(dw: DW, date: str, sensors: SolarSensors,
+                                                   response_format: ResponseFormat):
     """
     Get production stats (solar) for a given week grouped by day.
     String format YYYY-MM-DD.
     """
-    _query = text("SELECT DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) as date, "
-                  "SUM(p.value) AS total_kwh "
-                  "FROM productions_fact p "
-                  "JOIN dates_dim d ON p.date_key = d.date_key "
-                  "WHERE WEEK(DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))), 1) = WEEK(:date, 1) "
-                  "AND p.sensor_key = :sensor_key "
-                  "GROUP BY d.day;"
-    )
-    rows = dw.execute(_query, {"date": date, "sensor_key": 276})
-
-    fetched_data = rows.mappings().all()
+    series = await fetch_series(dw, SeriesQuery("productions_fact", periods.week(date), "day", sensors=sensors))
 
-    _date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
-
-    data = generate_zero_for_missing_days_in_week_query(fetched_data, _date)
-
-    return{"data": data}
+    return {"data": series.data(response_format, "date", "total_kwh")}
 
 # Haetaan kuukausikohtainen solar tuotto, ryhmitetty päivittäin.
 @router.get("/total/daily/month/{date}")
-async def get_total_solar_production_daily_by_month(dw: DW, date: str):
+async def get_total_solar_production_daily_by_month(dw: DW, date: str, sensors: SolarSensors,
+                                                    response_format: ResponseFormat):
     """
     Get production stats (solar) for a given month grouped by day.
     Month is calculated from a date string. String format YYYY-MM-DD.
     """
+    series = await fetch_series(dw, SeriesQuery("productions_fact", periods.month(date), "day", sensors=sensors))
 
-    _date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
-
-    year = _date.year
-    month = _date.month
-
-    _query = text("SELECT d.day, SUM(p.value) AS total_kwh "
-                  "FROM productions_fact p "
-                  "JOIN dates_dim d ON p.date_key = d.date_key "
-                  "WHERE d.year = ':year' AND d.month = ':month' "
-                  "AND p.sensor_key = :sensor_key "
-                  "GROUP BY d.day;"
-    )
-    rows = dw.execute(_query, {"year": year, "month": month, "sensor_key": 276})
-
-    fetched_data = rows.mappings().all()
-
-    data = generate_zero_for_missing_days_in_month_query(fetched_data, year, month)
-
-    return{"data": data}
+    return {"data": series.data(response_format, "day", "total_kwh", label="day")}
 
 # Haetaan vuosikohtainen solar tuotto, ryhmitetty kuukausittain.
 @router.get("/total/monthly/{date}")
-async def get_total_solar_production_monthly_by_year(dw: DW, date: str):
+async def get_total_solar_production_monthly_by_year(dw: DW, date: str, sensors: SolarSensors,
+                                                     response_format: ResponseFormat):
     """
     Get production stats (solar) for a given year grouped by month.
     String format YYYY-MM-DD.
     """
+    series = await fetch_series(dw, SeriesQuery("productions_fact", periods.year(date), "month", sensors=sensors))
 
-    _date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
+    return {"data": series.data(response_format, "month", "total_kwh", label="month")}
 
-    year = _date.year
-
-    _query = text("SELECT d.month, SUM(p.value) AS total_kwh "
-                  "FROM productions_fact p "
-                  "JOIN dates_dim d ON p.date_key = d.date_key "
-                  "WHERE d.year = ':year' "
-                  "AND p.sensor_key = :sensor_key "
-                  "GROUP BY d.month;"
-    )
-    rows = dw.execute(_query, {"year": year, "sensor_key": 276})
-
-    fetched_data = rows.mappings().all()
-
-    data = generate_zero_for_missing_months_in_year_query(fetched_data)
-
-    return{"data": data}
 
+# Haetaan aurinkopaneelien tuotto vapaalta aikaväliltä (from, to). Ämpärin koko (minute, hour, day,
+# week tai month) valitaan niin, että ämpäreitä on enintään max_buckets.
+@router.get("/total/range")
+async def get_total_solar_production_range(dw: DW,
+                                           start: Annotated[str, Query(alias="from")],
+                                           end: Annotated[str, Query(alias="to")],
+                                           sensors: SolarSensors,
+                                           response_format: ResponseFormat,
+                                           max_buckets: int = RANGE_DEFAULT_BUCKETS):
+    """
+    Get solar productions (total_kwh) between from and to (inclusive) with an automatically chosen bucket size
+    (minute, hour, day, week or month). ISO 8601 format YYYY-MM-DD
+    """
+    try:
+        granularity, series = await fetch_range_series(dw, "productions_fact", start, end, max_buckets,
+                                                       sensors=sensors)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
+
+    return {"data": series.data(response_format, "time", "total_kwh"), "granularity": granularity}
@@ -1,61 +1,43 @@
-import datetime
-from fastapi import APIRouter
-from sqlalchemy import text
-from customfunctions import generate_zero_for_missing_hours_in_day_with_keys, \
-    generate_zero_for_missing_days_in_week_query_with_keys, generate_zero_for_missing_days_in_month_query_with_keys, \
-    generate_zero_for_missing_months_in_year_query_with_keys, generate_zero_for_missing_days_in_7_day_period_with_keys
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from db import DW
+from fastjson import FastJSONRoute
+from etag import conditional_get
+import periods
+from latest import latest_readings
+from response_format import ResponseFormat
+from sensor_registry import role_sensors
+from timeseries import SeriesQuery, fetch_series, fetch_range_series, RANGE_DEFAULT_BUCKETS
 
 router = APIRouter(
     prefix='/api/measurement/temperature',
-    tags=['Temperature - Indoors']
+    tags=['Temperature - Indoors'],
+    dependencies=[Depends(conditional_get("temperatures_fact"))],
+    route_class=FastJSONRoute
 )
 
+# Anturit haetaan anturirekisterin rooleista. Oletusanturit voi korvata
+# ?sensor_id= parametrilla (pilkulla erotettu lista).
+TemperatureSensors = Annotated[tuple, Depends(role_sensors("temperature"))]
+IndoorSensors = Annotated[tuple, Depends(role_sensors("indoor_temperature"))]
+
 
 # Haetaan viimeisimmät lämpötilatiedot eri sensoreista:
 @router.get("/currents")
-async def get_most_recent_temperatures(dw: DW):
+async def get_most_recent_temperatures(dw: DW, sensors: TemperatureSensors):
     """
     Get the most recent temperature information.
     """
-    _timestamps_query = text("SELECT TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day), "
-                             "CONCAT_WS(':', d.hour, d.min, d.sec)) AS timestamp "
-                             "FROM sensors_dim s "
-                             "JOIN temperatures_fact t ON s.sensor_key = t.sensor_key "
-                             "JOIN dates_dim d ON t.date_key = d.date_key "
-                             "WHERE (t.date_key, t.sensor_key) IN "
-                             "(SELECT MAX(date_key), sensor_key FROM temperatures_fact GROUP BY sensor_key) "
-                             "AND t.sensor_key IN "
-                             "(:indoor_sensor_key, :outdoor_mast_sensor_key, :tb_indoor_sensor_key, :wc_indoor_sensor_key);")
-    timestamp_rows = dw.execute(_timestamps_query, {
-        "indoor_sensor_key": 125,
-        "outdoor_mast_sensor_key": 229,
-        "tb_indoor_sensor_key": 116,
-        "wc_indoor_sensor_key": 7
-    })
-
-    timestamp_data = timestamp_rows.mappings().all()
-    dates = [timestamp["timestamp"] for timestamp in timestamp_data]
-    oldest_timestamp = str(min(dates))
-
-    _sensor_data_query = text("SELECT CONCAT_WS(': ', s.device_name, s.sensor_name) AS sensor, "
-                              "s.sensor_id, t.value AS C "
-                              "FROM sensors_dim s "
-                              "JOIN temperatures_fact t ON s.sensor_key = t.sensor_key "
-                              "JOIN dates_dim d ON t.date_key = d.date_key "
-                              "WHERE (t.date_key, t.sensor_key) IN "
-                              "(SELECT MAX(date_key), sensor_key FROM temperatures_fact GROUP BY sensor_key) "
-                              "AND t.sensor_key IN "
-                              "(:indoor_sensor_key, :outdoor_mast_sensor_key, "
-                              ":tb_indoor_sensor_key, :wc_indoor_sensor_key);")
-    sensor_data_rows = dw.execute(_sensor_data_query, {
-        "indoor_sensor_key": 125,
-        "outdoor_mast_sensor_key": 229,
-        "tb_indoor_sensor_key": 116,
-        "wc_indoor_sensor_key": 7
-    })
-    sensor_data = sensor_data_rows.mappings().all()
-    formatted_data = [{"oldest_time": oldest_timestamp}, sensor_data]
+    await latest_readings.ensure_loaded(dw)
+    readings = latest_readings.latest("temperatures_fact", sensors)
+
+    dates = [reading["timestamp"] for reading in readings]
+    oldest_timestamp = str(min(dates)) if dates else None
+
+    sensor_data = [{"sensor": f"{reading['device_name']}: {reading['sensor_name']}",
+                    "sensor_id": reading["sensor_id"], "C": reading["value"]} for reading in readings]
+    formatted_data = [{"oldest_time": oldest_timestamp, "refreshed_at": latest_readings.refreshed_at}, sensor_data]
 
     return {"data": formatted_data}
 
@@ -63,160 +45,102 @@ async def get_most_recent_temperatures(dw: DW):
 # Haetaan edellisten 7 päivän keskiarvolämpötilat, jotka lajitellaan
 # päiväkohtaisesti. Tämä on MainScreenin PANEELIN graafia varten.
 @router.get("/avg/indoor/seven_day_period/{date}")
-async def get_indoor_avg_temperature_statistic_seven_day_period(dw: DW, date: str):
+async def get_indoor_avg_temperature_statistic_seven_day_period(dw: DW, date: str, sensors: IndoorSensors,
+                                                                response_format: ResponseFormat):
     """
     Get daily temperatures (avg) from 7 days before the given date
     (7-day period) grouped by day. String ISO 8601 format YYYY-MM-DD.
     """
-    _query = text("SELECT DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) as date, AVG(t.value) AS avg_C "
-                  "FROM temperatures_fact t "
-                  "JOIN dates_dim d ON t.date_key = d.date_key "
-                  "WHERE DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) "
-                  "BETWEEN DATE_SUB(DATE(:date), INTERVAL 6 DAY) AND :date "
-                  "AND t.sensor_key = :sensor_key "
-                  "GROUP BY date;")
-    rows = dw.execute(_query, {"date": date, "sensor_key": 125})
-    fetched_data = rows.mappings().all()
-
-    time_key = "date"
-    temperature_unit_key = "avg_C"
-
-    if len(fetched_data) > 0:
-        time_key = tuple(fetched_data[0].keys())[0]
-        temperature_unit_key = tuple(fetched_data[0].keys())[1]
+    series = await fetch_series(dw, SeriesQuery("temperatures_fact", periods.seven_days(date), "day",
+                                                aggregation="avg", sensors=sensors))
 
-    _date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
-    data = generate_zero_for_missing_days_in_7_day_period_with_keys(fetched_data, _date, time_key, temperature_unit_key)
-
-    return {"data": data}
+    return {"data": series.data(response_format, "date", "avg_C")}
 
 
 # Haetaan annetun päivän keskiarvolämpötilat, jotka lajitellaan
 # tuntikohtaisesti. Tämä on total consumption chartin DAY nappia varten.
 @router.get("/avg/indoor/hourly/{date}")
-async def get_indoor_avg_temperature_statistic_hourly_by_day(dw: DW, date: str):
+async def get_indoor_avg_temperature_statistic_hourly_by_day(dw: DW, date: str, sensors: IndoorSensors,
+                                                             response_format: ResponseFormat):
     """
     Get hourly temperatures (avg) from a given day.
     String ISO 8601 format YYYY-MM-DD.
     """
-    _query = text("SELECT d.hour, AVG(t.value) AS avg_C "
-                  "FROM temperatures_fact t "
-                  "JOIN dates_dim d ON t.date_key = d.date_key "
-                  "WHERE DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) = DATE(:date) "
-                  "AND t.sensor_key = :sensor_key "
-                  "GROUP BY d.hour "
-                  "ORDER BY d.hour;")
-    rows = dw.execute(_query, {"date": date, "sensor_key": 125})
-    fetched_data = rows.mappings().all()
-
-    time_key = "hour"
-    temperature_unit_key = "avg_C"
-
-    if len(fetched_data) > 0:
-        time_key = tuple(fetched_data[0].keys())[0]
-        temperature_unit_key = tuple(fetched_data[0].keys())[1]
+    series = await fetch_series(dw, SeriesQuery("temperatures_fact", periods.day(date), "hour",
+                                                aggregation="avg", sensors=sensors))
 
-    data = generate_zero_for_missing_hours_in_day_with_keys(fetched_data, time_key, temperature_unit_key)
-
-    return {"data": data}
+    return {"data": series.data(response_format, "hour", "avg_C", label="hour")}
 
 
 # Haetaan annetun viikon keskiarvolämpötilat, jotka lajitellaan
 # päiväkohtaisesti. Tämä on total consumption chartin WEEK nappia varten.
 @router.get("/avg/indoor/daily/week/{date}")
-async def get_indoor_avg_temperature_statistic_daily_by_week(dw: DW, date: str):
+async def get_indoor_avg_temperature_statistic_daily_by_week(dw: DW, date: str, sensors: IndoorSensors,
+                                                             response_format: ResponseFormat):
     """
     Get daily temperatures (avg) from a given week.
     String ISO 8601 format YYYY-MM-DD.
     """
-    _query = text("SELECT DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) as date, AVG(t.value) AS avg_C "
-                  "FROM temperatures_fact t "
-                  "JOIN dates_dim d ON t.date_key = d.date_key "
-                  "WHERE WEEK(DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))), 1) = WEEK(:date, 1) "
-                  "AND t.sensor_key = :sensor_key "
-                  "GROUP BY date;")
-    rows = dw.execute(_query, {"date": date, "sensor_key": 125})
-    fetched_data = rows.mappings().all()
-
-    time_key = "date"
-    temperature_unit_key = "avg_C"
+    series = await fetch_series(dw, SeriesQuery("temperatures_fact", periods.week(date), "day",
+                                                aggregation="avg", sensors=sensors))
 
-    if len(fetched_data) > 0:
-        time_key = tuple(fetched_data[0].keys())[0]
-        temperature_unit_key = tuple(fetched_data[0].keys())[1]
-
-    _date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
-    data = generate_zero_for_missing_days_in_week_query_with_keys(fetched_data, _date, time_key, temperature_unit_key)
-
-    return {"data": data}
+    return {"data": series.data(response_format, "date", "avg_C")}
 
 
 # Haetaan annetun kuukauden keskiarvolämpötilat, jotka lajitellaan
 # päiväkohtaisesti. Tämä on total consumption chartin MONTH-nappia varten.
 @router.get("/avg/indoor/daily/month/{date}")
-async def get_indoor_avg_temperature_statistic_daily_by_month(dw: DW, date: str):
+async def get_indoor_avg_temperature_statistic_daily_by_month(dw: DW, date: str, sensors: IndoorSensors,
+                                                              response_format: ResponseFormat):
     """
     Get daily temperatures (avg) from a given month.
     String ISO 8601 format YYYY-MM-DD.
     """
+    series = await fetch_series(dw, SeriesQuery("temperatures_fact", periods.month(date), "day",
+                                                aggregation="avg", sensors=sensors))
 
-    _date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
-
-    year = _date.year
-    month = _date.month
-
-    _query = text("SELECT d.day, AVG(t.value) AS avg_C "
-                  "FROM temperatures_fact t "
-                  "JOIN dates_dim d ON t.date_key = d.date_key "
-                  "WHERE d.year = ':year' AND d.month = ':month' "
-                  "AND t.sensor_key = :sensor_key "
-                  "GROUP BY d.day;")
-    rows = dw.execute(_query, {"year": year, "month": month, "sensor_key": 125})
-    fetched_data = rows.mappings().all()
-
-    time_key = "day"
-    temperature_unit_key = "avg_C"
-
-    if len(fetched_data) > 0:
-        time_key = tuple(fetched_data[0].keys())[0]
-        temperature_unit_key = tuple(fetched_data[0].keys())[1]
-
-    data = generate_zero_for_missing_days_in_month_query_with_keys(fetched_data, year, month, time_key,
-                                                                   temperature_unit_key)
-
-    return {"data": data}
+    return {"data": series.data(response_format, "day", "avg_C", label="day")}
 
 
 # Haetaan annetun vuoden keskiarvolämpötilat, jotka lajitellaan
 # kuukausikohtaisesti. Tämä on total consumption chartin YEAR-nappia varten.
 @router.get("/avg/indoor/monthly/{date}")
-async def get_indoor_avg_temperature_statistic_monthly_by_year(dw: DW, date: str):
+async def get_indoor_avg_temperature_statistic_monthly_by_year(dw: DW, date: str, sensors: IndoorSensors,
+                                                               response_format: ResponseFormat):
     """
     Get monthly temperatures (avg) for a given year.
     String ISO 8601 format YYYY-MM-DD.
     """
+    series = await fetch_series(dw, SeriesQuery("temperatures_fact", periods.year(date), "month",
+                                                aggregation="avg", sensors=sensors))
 
-    _date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
-    year = _date.year
-
-    _query = text("SELECT d.month, AVG(t.value) AS avg_C "
-                  "FROM temperatures_fact t "
-                  "JOIN dates_dim d ON t.date_key = d.date_key "
-                  "WHERE d.year = ':year' AND t.sensor_key = :sensor_key "
-                  "GROUP BY d.month;")
-    rows = dw.execute(_query, {"year": year, "sensor_key": 125})
-    fetched_data = rows.mappings().all()
+    return {"data": series.data(response_format, "month", "avg_C", label="month")}
 
-    time_key = "month"
-    temperature_unit_key = "avg_C"
 
-    if len(fetched_data) > 0:
-        time_key = tuple(fetched_data[0].keys())[0]
-        temperature_unit_key = tuple(fetched_data[0].keys())[1]
+# Haetaan sisälämpötilan keskiarvo vapaalta aikaväliltä (from, to). Ämpärin koko (minute, hour, day,
+# week tai month) valitaan niin, että ämpäreitä on enintään max_buckets.
+@router.get("/avg/indoor/range")
+async def get_indoor_avg_temperature_statistic_range(dw: DW,
+                                                     start: Annotated[str, Query(alias="from")],
+                                                     end: Annotated[str, Query(alias="to")],
+                                                     sensors: IndoorSensors,
+                                                     response_format: ResponseFormat,
+                                                     max_buckets: int = RANGE_DEFAULT_BUCKETS):
+    """
+    Get temperatures (avg) between from and to (inclusive) with an automatically chosen bucket size
+    (minute, hour, day, week or month). ISO 8601 format YYYY-MM-DD
+    """
+    try:
+        granularity, series = await fetch_range_series(dw, "temperatures_fact", start, end, max_buckets,
+                                                       aggregation="avg", sensors=sensors)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
 
-    data = generate_zero_for_missing_months_in_year_query_with_keys(fetched_data, time_key, temperature_unit_key)
+    return {"data": series.data(response_format, "time", "avg_C"), "granularity": granularity}
 
-    return {"data": data}
 
 # # Testi
 # @router.get("/indoor/wind/nothing")
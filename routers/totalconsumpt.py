@@ -1,133 +1,114 @@
-from fastapi import APIRouter
-from sqlalchemy import text
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from db import DW
-from customfunctions import *
+from fastjson import FastJSONRoute
+from etag import conditional_get
+import periods
+from response_format import ResponseFormat
+from timeseries import (SeriesQuery, fetch_series, fetch_period_summary, SUMMARY_PERIODS, fetch_range_series,
+                        RANGE_DEFAULT_BUCKETS)
 
 
 router = APIRouter(
     prefix='/api/measurement/consumption/total',
-    tags=['Consumption - Total']
+    tags=['Consumption - Total'],
+    dependencies=[Depends(conditional_get("total_consumptions_fact"))],
+    route_class=FastJSONRoute
 )
 
 
 # Haetaan kulutus annetusta päivämäärästä 7-päivän jakso taaksepäin, jotka lajitellaan päiväkohtaisesti.
 # Tämä on MainScreenin PANEELIN graphia varten.
 @router.get("/seven_day_period/{date}")
-async def get_total_consumption_statistics_daily_seven_day_period(dw: DW, date: str):
+async def get_total_consumption_statistics_daily_seven_day_period(dw: DW, date: str, response_format: ResponseFormat):
     """
     Get daily consumptions(total) from 7 days before the given date (7-day period). String ISO 8601 format YYYY-MM-DD
     """
-    _query = text("SELECT DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) as date, "
-                  "sum(value) AS total_kwh "
-                  "FROM total_consumptions_fact f "
-                  "JOIN dates_dim d ON f.date_key = d.date_key "
-                  "WHERE DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) "
-                  "BETWEEN DATE_SUB(DATE(:date), INTERVAL 6 DAY) AND :date "
-                  "GROUP BY d.day "
-                  "ORDER BY date;")
-
-    rows = dw.execute(_query, {"date": date})
-    fetched_data = rows.mappings().all()
-    _date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
-
-    time_key = "date"
-    consumption_key = "total_kwh"
-
-    if len(fetched_data) > 0:
-        time_key = tuple(fetched_data[0].keys())[0]
-        consumption_key = tuple(fetched_data[0].keys())[1]
-
-    data = generate_zero_for_missing_days_in_7_day_period_with_keys(fetched_data, _date, time_key, consumption_key)
+    series = await fetch_series(dw, SeriesQuery("total_consumptions_fact", periods.seven_days(date), "day"))
 
-    return {"data": data}
+    return {"data": series.data(response_format, "date", "total_kwh")}
 
 
 # Tämä on total consumption chartin DAY nappia varten.
 @router.get("/hourly/{date}")
-async def get_total_consumption_statistic_hourly_by_day(dw: DW, date: str):
+async def get_total_consumption_statistic_hourly_by_day(dw: DW, date: str, response_format: ResponseFormat):
     """
     Get hourly consumptions(total) from a given day. String ISO 8601 format YYYY-MM-DD
     """
-    _query = text("SELECT d.hour as hour, sum(f.value) as total_kwh FROM total_consumptions_fact f "
-                  "LEFT JOIN dates_dim d ON d.date_key = f.date_key "
-                  "LEFT JOIN sensors_dim s ON s.sensor_key = f.sensor_key "
-                  "WHERE DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) = :date "
-                  "GROUP BY d.hour;")
+    series = await fetch_series(dw, SeriesQuery("total_consumptions_fact", periods.day(date), "hour"))
 
-    rows = dw.execute(_query, {"date": date})
-    fetched_data = rows.mappings().all()
-
-    data = generate_zero_for_missing_hours_in_day_query(fetched_data)
-
-    return {"data": data}
+    return {"data": series.data(response_format, "hour", "total_kwh", label="hour")}
 
 
 # Tämä on total consumption chartin WEEK nappia varten.
 @router.get("/daily/week/{date}")
-async def get_total_consumption_statistic_daily_by_week(dw: DW, date: str):
+async def get_total_consumption_statistic_daily_by_week(dw: DW, date: str, response_format: ResponseFormat):
     """
     Get daily consumptions(total) from a given week.
     """
-    _query = text("SELECT DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) as date, sum(f.value) as total_kwh "
-                  "FROM total_consumptions_fact f "
-                  "JOIN dates_dim d ON d.date_key = f.date_key "
-                  "WHERE WEEK(CONCAT(d.year, '-', d.month, '-', d.day), 1) = WEEK(:date,1) "
-                  "GROUP BY d.day;")
-
-    rows = dw.execute(_query, {"date": date})
-    fetched_data = rows.mappings().all()
+    series = await fetch_series(dw, SeriesQuery("total_consumptions_fact", periods.week(date), "day"))
 
-    _date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
-    data = generate_zero_for_missing_days_in_week_query(fetched_data, _date)
-
-    return {"data": data}
+    return {"data": series.data(response_format, "date", "total_kwh")}
 
 
 # Tämä on total consumption chartin MONTH nappia varten
 @router.get("/daily/month/{date}")
-async def get_total_consumption_statistic_daily_by_month(dw: DW, date: str):
+async def get_total_consumption_statistic_daily_by_month(dw: DW, date: str, response_format: ResponseFormat):
     """
     Get daily consumptions(total) from a given month. Month is calculated from date string, ISO 8601 format YYYY-MM-DD
     """
+    series = await fetch_series(dw, SeriesQuery("total_consumptions_fact", periods.month(date), "day"))
 
-    _date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
-
-    year = _date.year
-    month = _date.month
-
-    _query = text("SELECT d.day, sum(f.value) as total_kwh FROM total_consumptions_fact f "
-                  "JOIN dates_dim d ON d.date_key = f.date_key "
-                  "WHERE d.year = ':year' AND d.month = ':month'"
-                  "GROUP BY d.day;")
-
-    rows = dw.execute(_query, {"year": year, "month": month})
-    fetched_data = rows.mappings().all()
-
-    # Generoidaan puuttuvat nolla tietueet mukaan dataan ja palautetaan se.
-    data = generate_zero_for_missing_days_in_month_query(fetched_data, year, month)
-    return {"data": data}
+    return {"data": series.data(response_format, "day", "total_kwh", label="day")}
 
 
 # Tämä on total consumption chartin YEAR nappia varten
 @router.get("/monthly/{date}")
-async def get_total_consumption_statistic_monthly_by_year(dw: DW, date: str):
+async def get_total_consumption_statistic_monthly_by_year(dw: DW, date: str, response_format: ResponseFormat):
     """
     Get monthly consumptions(total) from a given year. ISO 8601 format YYYY-MM-DD
     """
+    series = await fetch_series(dw, SeriesQuery("total_consumptions_fact", periods.year(date), "month"))
 
-    _date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
-    year = _date.year
-
-    _query = text("SELECT d.month, sum(f.value) as total_kwh FROM total_consumptions_fact f "
-                  "JOIN dates_dim d ON d.date_key = f.date_key "
-                  "WHERE d.year = ':year'"
-                  "GROUP BY d.month;")
-
-    rows = dw.execute(_query, {"year": year})
-    fetched_data = rows.mappings().all()
+    return {"data": series.data(response_format, "month", "total_kwh", label="month")}
 
-    # Generoidaan puuttuvat nolla tietueet mukaan dataan ja palautetaan se.
-    data = generate_zero_for_missing_months_in_year_query(fetched_data)
-
-    return {"data": data}
 
+# Jakson kokonaiskulutuksen yhteenveto (summa, keskiarvo, min, max ja huippu) yhdellä
+# kyselyllä. period on day, week, month, year tai seven_day_period.
+@router.get("/summary/{period}/{date}")
+async def get_total_consumption_summary(dw: DW, period: str, date: str):
+    """
+    Get consumption summary (sum, buckets, avg, min, max, peak) for a given period
+    (day, week, month, year or seven_day_period). ISO 8601 format YYYY-MM-DD
+    """
+    if period not in SUMMARY_PERIODS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unknown period",
+        )
+
+    return {"data": await fetch_period_summary(dw, "total_consumptions_fact", period, date)}
+
+
+# Haetaan kokonaiskulutus vapaalta aikaväliltä (from, to). Ämpärin koko (minute, hour, day,
+# week tai month) valitaan niin, että ämpäreitä on enintään max_buckets.
+@router.get("/range")
+async def get_total_consumption_statistic_range(dw: DW,
+                                                start: Annotated[str, Query(alias="from")],
+                                                end: Annotated[str, Query(alias="to")],
+                                                response_format: ResponseFormat,
+                                                max_buckets: int = RANGE_DEFAULT_BUCKETS):
+    """
+    Get consumptions(total) between from and to (inclusive) with an automatically chosen bucket size
+    (minute, hour, day, week or month). ISO 8601 format YYYY-MM-DD
+    """
+    try:
+        granularity, series = await fetch_range_series(dw, "total_consumptions_fact", start, end, max_buckets)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
+
+    return {"data": series.data(response_format, "time", "total_kwh"), "granularity": granularity}
@@ -1,153 +1,122 @@
-from fastapi import APIRouter
-from sqlalchemy import text
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 
-from customfunctions import generate_zero_for_missing_days_in_7_day_period_with_keys, \
-    generate_zero_for_missing_hours_in_day_with_keys, generate_zero_for_missing_days_in_week_query, \
-    generate_zero_for_missing_days_in_month_query, generate_zero_for_missing_months_in_year_query
 from db import DW
-import datetime
+from fastjson import FastJSONRoute
+from etag import conditional_get
+import periods
+from response_format import ResponseFormat
+from timeseries import (SeriesQuery, fetch_series, fetch_period_summary, SUMMARY_PERIODS, fetch_range_series,
+                        RANGE_DEFAULT_BUCKETS)
 
 
 router = APIRouter(
     prefix='/api/measurement/production/total',
-    tags=['Production - Total']
+    tags=['Production - Total'],
+    dependencies=[Depends(conditional_get("productions_fact"))],
+    route_class=FastJSONRoute
 )
 
 
 # Haetaan 7 edelliseltä päivältä kokonaistuotto, joka ryhmitellään päivittäin.
 # Tämä on MainScreenin PANEELIN graafia varten.
 @router.get("/seven_day_period/{date}")
-async def get_total_production_statistic_daily_seven_day_period(dw: DW, date: str):
+async def get_total_production_statistic_daily_seven_day_period(dw: DW, date: str, response_format: ResponseFormat):
     """
     Get production stats (total) from 7 days before the given date
     (7-day period) grouped by day. String format YYYY-MM-DD.
     """
-    _query = text("SELECT DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) as date, "
-                  "SUM(p.value) AS total_kwh "
-                  "FROM productions_fact p "
-                  "JOIN dates_dim d ON p.date_key = d.date_key "
-                  "WHERE DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) "
-                  "BETWEEN DATE_SUB(DATE(:date), INTERVAL 6 DAY) AND :date "
-                  "GROUP BY d.day "
-                  "ORDER BY date;")
-
-    rows = dw.execute(_query, {"date": date})
-    fetched_data = rows.mappings().all()
-    _date = datetime.datetime.strptime(date, "%Y-%m-%d").date()
-
-    time_key = "date"
-    consumption_key = "total_kwh"
+    series = await fetch_series(dw, SeriesQuery("productions_fact", periods.seven_days(date), "day"))
 
-    if len(fetched_data) > 0:
-        time_key = tuple(fetched_data[0].keys())[0]
-        consumption_key = tuple(fetched_data[0].keys())[1]
-
-    data = generate_zero_for_missing_days_in_7_day_period_with_keys(fetched_data, _date, time_key, consumption_key)
-
-    return {"data": data}
+    return {"data": series.data(response_format, "date", "total_kwh")}
 
 
 # Haetaan päiväkohtainen kokonaistuotto tunneittain ryhmiteltynä:
 # Tämä on total production chartin DAY nappia varten.
 @router.get("/hourly/{date}")
-async def get_total_production_statistic_hourly_by_day(dw: DW, date: str):
+async def get_total_production_statistic_hourly_by_day(dw: DW, date: str, response_format: ResponseFormat):
     """
     Get production stats (sum) from a given day grouped by hour.
     String format YYYY-MM-DD.
     """
-    _query = text("SELECT d.hour, SUM(p.value) AS total_kwh "
-                  "FROM productions_fact p "
-                  "JOIN dates_dim d ON p.date_key = d.date_key "
-                  "WHERE DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) = :date "
-                  "GROUP BY d.hour "
-                  "ORDER BY d.hour;")
-
-    rows = dw.execute(_query, {"date": date})
-    fetched_data = rows.mappings().all()
-    time_key = "hour"
-    consumption_key = "total_kwh"
+    series = await fetch_series(dw, SeriesQuery("productions_fact", periods.day(date), "hour"))
 
-    if len(fetched_data) > 0:
-        time_key = tuple(fetched_data[0].keys())[0]
-        consumption_key = tuple(fetched_data[0].keys())[1]
-
-    data = generate_zero_for_missing_hours_in_day_with_keys(fetched_data, time_key, consumption_key)
-
-    return {"data": data}
+    return {"data": series.data(response_format, "hour", "total_kwh", label="hour")}
 
 
 # Haetaan viikkokohtainen kokonaistuotto päivittäin ryhmiteltynä.
 # Tämä on total production chartin WEEK nappia varten.
 @router.get("/daily/week/{date}")
-async def get_total_production_statistic_daily_by_week(dw: DW, date: str):
+async def get_total_production_statistic_daily_by_week(dw: DW, date: str, response_format: ResponseFormat):
     """
     Get production stats from a given week grouped by day. String format YYYY-MM-DD
     """
-    _query = text("SELECT DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) as date, "
-                  "SUM(p.value) AS total_kwh FROM productions_fact p "
-                  "JOIN dates_dim d ON p.date_key = d.date_key "
-                  "WHERE WEEK(CONCAT(d.year, '-', d.month, '-', d.day), 1) = WEEK(:date,1) "
-                  "GROUP BY d.day;")
-    rows = dw.execute(_query, {"date": date})
-    fetched_data = rows.mappings().all()
-
-    _date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
-    data = generate_zero_for_missing_days_in_week_query(fetched_data, _date)
+    series = await fetch_series(dw, SeriesQuery("productions_fact", periods.week(date), "day"))
 
-    return {"data": data}
+    return {"data": series.data(response_format, "date", "total_kwh")}
 
 
 # Haetaan kuukausikohtainen kokonaistuotto päivittäin ryhmiteltynä:
 # Tämä on total production chartin MONTH nappia varten.
 @router.get("/daily/month/{date}")
-async def get_total_production_statistics_daily_for_a_month(dw: DW, date: str):
+async def get_total_production_statistics_daily_for_a_month(dw: DW, date: str, response_format: ResponseFormat):
     """
     Get total production from a given month grouped by day.
     Month is calculated from date string, ISO 8601 format YYYY-MM-DD.
     """
+    series = await fetch_series(dw, SeriesQuery("productions_fact", periods.month(date), "day"))
 
-    _date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
-
-    year = _date.year
-    month = _date.month
-
-    _query = text("SELECT d.day, SUM(p.value) AS total_kwh "
-                  "FROM productions_fact p "
-                  "JOIN dates_dim d ON p.date_key = d.date_key "
-                  "WHERE d.year = ':year' AND d.month = ':month' "
-                  "GROUP BY d.day;")
-    rows = dw.execute(_query, {"year": year, "month": month})
-    fetched_data = rows.mappings().all()
-
-    # Generoidaan puuttuvat nollatietueet mukaan dataan ja palautetaan se.
-    data = generate_zero_for_missing_days_in_month_query(fetched_data, year, month)
-
-    return {"data": data}
+    return {"data": series.data(response_format, "day", "total_kwh", label="day")}
 
 
 # Haetaan vuosikohtainen kokonaistuotto kuukausittain ryhmiteltynä.
 # Tämä on total production chartin YEAR nappia varten.
 @router.get("/monthly/{date}")
-async def get_total_production_statistic_monthly_by_year(dw: DW, date: str):
+async def get_total_production_statistic_monthly_by_year(dw: DW, date: str, response_format: ResponseFormat):
     """
     Get production stats from a given year grouped by month. ISO 8601 format YYYY-MM-DD
     """
-    _date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
-    year = _date.year
-
-    _query = text("SELECT d.month, SUM(p.value) AS total_kwh "
-                  "FROM productions_fact p "
-                  "JOIN dates_dim d ON p.date_key = d.date_key "
-                  "WHERE d.year = ':year' "
-                  "GROUP BY d.month;")
-    rows = dw.execute(_query, {"year": year})
-    fetched_data = rows.mappings().all()
-
-    # Generoidaan puuttuvat nollatietueet mukaan dataan ja palautetaan se.
-    data = generate_zero_for_missing_months_in_year_query(fetched_data)
-
-    return {"data": data}
-
+    series = await fetch_series(dw, SeriesQuery("productions_fact", periods.year(date), "month"))
 
+    return {"data": series.data(response_format, "month", "total_kwh", label="month")}
 
 
+# Jakson kokonaistuoton yhteenveto (summa, keskiarvo, min, max ja huippu) yhdellä
+# kyselyllä. period on day, week, month, year tai seven_day_period.
+@router.get("/summary/{period}/{date}")
+async def get_total_production_summary(dw: DW, period: str, date: str):
+    """
+    Get production summary (sum, buckets, avg, min, max, peak) for a given period
+    (day, week, month, year or seven_day_period). ISO 8601 format YYYY-MM-DD
+    """
+    if period not in SUMMARY_PERIODS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unknown period",
+        )
+
+    return {"data": await fetch_period_summary(dw, "productions_fact", period, date)}
+
+
+# Haetaan kokonaistuotto vapaalta aikaväliltä (from, to). Ämpärin koko (minute, hour, day,
+# week tai month) valitaan niin, että ämpäreitä on enintään max_buckets.
+@router.get("/range")
+async def get_total_production_statistic_range(dw: DW,
+                                               start: Annotated[str, Query(alias="from")],
+                                               end: Annotated[str, Query(alias="to")],
+                                               response_format: ResponseFormat,
+                                               max_buckets: int = RANGE_DEFAULT_BUCKETS):
+    """
+    Get productions(total) between from and to (inclusive) with an automatically chosen bucket size
+    (minute, hour, day, week or month). ISO 8601 format YYYY-MM-DD
+    """
+    try:
+        granularity, series = await fetch_range_series(dw, "productions_fact", start, end, max_buckets)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
+
+    return {"data": series.data(response_format, "time", "total_kwh"), "granularity": granularity}
@@ -1,14 +1,28 @@
-import datetime
-from fastapi import APIRouter
-from sqlalchemy import text
+from fastapi import APIRouter, Depends
 from db import DW
+from fastjson import FastJSONRoute
+from etag import conditional_get
+import periods
+from periods import Period
+from timeseries import SeriesQuery, fetch_summary
 
 router = APIRouter(
     prefix='/api/measurement/production/total/sum',
-    tags=['Production - Total - Sum']
+    tags=['Production - Total - Sum'],
+    dependencies=[Depends(conditional_get("productions_fact"))],
+    route_class=FastJSONRoute
 )
 
 
+# Lasketaan jakson kokonaistuotto koosteista. Ämpärin koko (tunti, päivä tai
+# kuukausi) on sama kuin /avg endpointeissa, joten saman jakson summa ja
+# keskiarvo saadaan samasta välimuistin tietueesta (ks. fetch_summary).
+async def get_total_production_sum(dw: DW, period: Period, bucket: str):
+    summary = await fetch_summary(dw, SeriesQuery("productions_fact", period, bucket))
+
+    return [{"sum_kwh": summary.total}]
+
+
 # Haetaan 7 päivän jakson kokonaistuoton summa.
 # Tämä on MainScreenin PANEELIN graphia varten.
 @router.get("/seven_day_period/{date}")
@@ -17,18 +31,7 @@ async def get_total_production_statistics_sum_seven_day_period(dw: DW, date: str
     Get production (sum) for a given 7-day period.
     ISO 8601 format YYYY-MM-DD. String ISO 8601 format YYYY-MM-DD.
     """
-    _query = text("SELECT sum(value) AS sum_kwh FROM productions_fact p "
-                  "JOIN dates_dim d ON p.date_key = d.date_key "
-                  "WHERE DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) "
-                  "BETWEEN DATE_SUB(CURDATE(), INTERVAL 6 DAY) AND :date ")
-
-    rows = dw.execute(_query, {"date": date})
-    data = rows.mappings().all()
-
-    if len(data) == 0:
-        data = [{"sum_kwh": 0}]
-
-    return {"data": data}
+    return {"data": await get_total_production_sum(dw, periods.seven_days(date), "day")}
 
 
 # Haetaan päiväkohtainen kokonaistuotto.
@@ -38,17 +41,7 @@ async def get_total_production_statistic_sum_day(dw: DW, date: str):
     """
     Get production stats (sum) from a given day. ISO 8601 format YYYY-MM-DD.
     """
-    _query = text("SELECT SUM(p.value) AS sum_kwh "
-                  "FROM productions_fact p "
-                  "JOIN dates_dim d ON p.date_key = d.date_key "
-                  "WHERE DATE(TIMESTAMP(CONCAT_WS('-', d.year, d.month, d.day))) = :date;")
-    rows = dw.execute(_query, {"date": date})
-    data = rows.mappings().all()
-
-    if len(data) == 0:
-        data = [{"sum_kwh": 0}]
-
-    return {"data": data}
+    return {"data": await get_total_production_sum(dw, periods.day(date), "hour")}
 
 
 # Haetaan viikkokohtainen kokonaistuotto:
@@ -58,17 +51,7 @@ async def get_total_production_statistic_sum_week(dw: DW, date: str):
     """
     Get production (sum) stats for a given week. ISO 8601 format YYYY-MM-DD
     """
-    _query = text("SELECT SUM(p.value) AS sum_kwh "
-                  "FROM productions_fact p "
-                  "JOIN dates_dim d ON p.date_key = d.date_key "
-                  "WHERE WEEK(CONCAT_WS('-', d.year, d.month, d.day), 1) = WEEK(:date, 1);")
-    rows = dw.execute(_query, {"date": date})
-    data = rows.mappings().all()
-
-    if len(data) == 0:
-        data = [{"sum_kwh": 0}]
-
-    return {"data": data}
+    return {"data": await get_total_production_sum(dw, periods.week(date), "day")}
 
 
 # Haetaan kuukausikohtainen kokonaistuotto.
@@ -78,17 +61,7 @@ async def get_total_production_statistic_sum_month(dw: DW, date: str):
     """
     Get production stats from a given month. String format YYYY-MM-DD
     """
-    _query = text("SELECT SUM(p.value) AS sum_kwh "
-                  "FROM productions_fact p "
-                  "JOIN dates_dim d ON p.date_key = d.date_key "
-                  "WHERE MONTH(CONCAT_WS('-', d.year, d.month, d.day)) = MONTH(:date);")
-    rows = dw.execute(_query, {"date": date})
-    data = rows.mappings().all()
-
-    if len(data) == 0:
-        data = [{"sum_kwh": 0}]
-
-    return {"data": data}
+    return {"data": await get_total_production_sum(dw, periods.month(date), "day")}
 
 
 # Haetaan vuosikohtainen kokonaistuotto.
@@ -98,17 +71,4 @@ async def get_total_production_statistic_sum_year(dw: DW, date: str):
     """
     Get production stats from a given year. ISO 8601 format YYYY-MM-DD.
     """
-    _date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
-    year = _date.year
-
-    _query = text("SELECT SUM(p.value) AS sum_kwh "
-                  "FROM productions_fact p "
-                  "JOIN dates_dim d ON p.date_key = d.date_key "
-                  "WHERE d.year = ':year';")
-    rows = dw.execute(_query, {"year": year})
-    data = rows.mappings().all()
-
-    if len(data) == 0:
-        data = [{"sum_kwh": 0}]
-
-    return {"data": data}
+    return {"data": await get_total_production_sum(dw, periods.year(date), "month")}
@@ -0,0 +1,165 @@
+import asyncio
+import os
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from db import dw_session
+
+# Kuinka usein (sekunteina) tarkistetaan, ovatko sensors_dim tai
+# sensor_roles taulut muuttuneet.
+SENSOR_REGISTRY_REFRESH_INTERVAL = int(os.environ.get("SENSOR_REGISTRY_REFRESH_INTERVAL", 60))
+
+# Roolit kannoille, joissa ei vielä ole sensor_roles taulua
+# (ks. sql/cooldev_olap.sql). Rooli -> sensor_keyt järjestyksessä.
+DEFAULT_ROLES = {
+    "temperature": (125, 229, 116, 7),
+    "indoor_temperature": (125,),
+    "solar_production": (276,),
+    "wind_production": (286,),
+}
+
+# Oletusroolit, joihin kuuluvat laitteen kaikki anturit sensor_id:n mukaan
+# järjestettynä
+DEFAULT_DEVICE_ROLES = {
+    "battery": "TB_batterypack",
+}
+
+
+# Muistissa pidettävä sensors_dim ja antureiden roolit. Routerit hakevat
+# anturit roolin tai sensor_id:n perusteella täältä, joten requestit eivät
+# tarvitse sensors_dim hakuja. Taulut ladataan uudelleen vain, kun niiden
+# CHECKSUM muuttuu.
+class SensorRegistry:
+    def __init__(self):
+        # sensor_key -> sensors_dim rivi
+        self.sensors = {}
+        # sensor_id -> sensor_key
+        self.keys_by_id = {}
+        # rooli -> sensor_keyt järjestyksessä
+        self.roles = {}
+
+        self.loaded = False
+        self._checksum = None
+        self._lock = asyncio.Lock()
+
+    async def _table_checksum(self, dw):
+        rows = (await dw.execute(text("CHECKSUM TABLE sensors_dim, sensor_roles;"))).all()
+        return tuple(row[1] for row in rows)
+
+    async def _load_roles(self, dw):
+        try:
+            rows = (await dw.execute(text("SELECT r.role, r.sensor_key FROM sensor_roles r "
+                                          "JOIN sensors_dim s ON s.sensor_key = r.sensor_key "
+                                          "ORDER BY r.role, r.position, s.sensor_id;"))).all()
+        except DBAPIError as e:
+            print(f"Sensor roles not available, using defaults: {e}")
+            rows = []
+
+        roles = {}
+        for role, sensor_key in rows:
+            roles.setdefault(role, []).append(sensor_key)
+
+        if not roles:
+            roles = {role: list(sensor_keys) for role, sensor_keys in DEFAULT_ROLES.items()}
+            roles.update({role: self.device(device_id) for role, device_id in DEFAULT_DEVICE_ROLES.items()})
+
+        self.roles = {role: tuple(sensor_keys) for role, sensor_keys in roles.items()}
+
+    # Lataa taulut, jos ne ovat muuttuneet edellisestä latauksesta
+    async def refresh(self, dw):
+        async with self._lock:
+            checksum = await self._table_checksum(dw)
+            if self.loaded and checksum == self._checksum:
+                return
+
+            _query = text("SELECT sensor_key, sensor_id, sensor_name, device_id, device_name, unit FROM sensors_dim;")
+            rows = (await dw.execute(_query)).mappings().all()
+            self.sensors = {row["sensor_key"]: dict(row) for row in rows}
+            self.keys_by_id = {row["sensor_id"]: row["sensor_key"] for row in rows}
+            await self._load_roles(dw)
+
+            self._checksum = checksum
+            self.loaded = True
+
+    async def ensure_loaded(self, dw):
+        if not self.loaded:
+            await self.refresh(dw)
+
+    def get(self, sensor_key: int):
+        return self.sensors.get(sensor_key)
+
+    # Roolin sensor_keyt, tai tyhjä tuple, jos roolia ei ole
+    def role(self, role: str):
+        return self.roles.get(role, ())
+
+    # Laitteen kaikkien antureiden sensor_keyt sensor_id:n mukaan järjestettynä
+    def device(self, device_id: str):
+        sensors = sorted((sensor for sensor in self.sensors.values() if sensor["device_id"] == device_id),
+                         key=lambda sensor: sensor["sensor_id"])
+        return [sensor["sensor_key"] for sensor in sensors]
+
+    # Annetuista antureista ne, joiden yksikkö on jokin annetuista
+    def with_unit(self, sensor_keys, units):
+        return [sensor_key for sensor_key in sensor_keys if self.sensors.get(sensor_key, {}).get("unit") in units]
+
+    # sensor_id -> sensor_key annetuille antureille. Jos jotain ei löydy,
+    # taulut tarkistetaan kerran uudelleen. Tuntemattomat jäävät pois.
+    async def resolve(self, dw, sensor_ids):
+        await self.ensure_loaded(dw)
+
+        if any(sensor_id not in self.keys_by_id for sensor_id in sensor_ids):
+            await self.refresh(dw)
+
+        return {sensor_id: self.keys_by_id[sensor_id] for sensor_id in sensor_ids if sensor_id in self.keys_by_id}
+
+
+# Sovelluksen yhteinen rekisteri
+sensor_registry = SensorRegistry()
+
+
+# Roolin sensor_keyt. Jos rekisteriä ei ole vielä ladattu, se ladataan
+# omalla sessiolla.
+async def role_keys(role: str):
+    if not sensor_registry.loaded:
+        async with dw_session() as _dw:
+            await sensor_registry.ensure_loaded(_dw)
+
+    return sensor_registry.role(role)
+
+
+# Riippuvuus routereille: palauttaa anturit sensor_id query-parametrista
+# (pilkulla erotettu lista) tai, jos sitä ei ole annettu, roolin anturit.
+def role_sensors(role: str):
+    async def dependency(sensor_id: str | None = None):
+        if sensor_id is None:
+            return await role_keys(role)
+
+        sensor_ids = [s for s in sensor_id.split(",") if s]
+        if not sensor_registry.loaded or any(s not in sensor_registry.keys_by_id for s in sensor_ids):
+            async with dw_session() as _dw:
+                await sensor_registry.resolve(_dw, sensor_ids)
+
+        unknown = [s for s in sensor_ids if s not in sensor_registry.keys_by_id]
+        if unknown or not sensor_ids:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Unknown sensors: {', '.join(unknown)}",
+            )
+
+        return tuple(sensor_registry.keys_by_id[s] for s in sensor_ids)
+
+    return dependency
+
+
+# Taustatehtävä, joka käynnistetään main.py:n lifespanissa
+async def maintain_sensor_registry():
+    while True:
+        try:
+            async with dw_session() as _dw:
+                await sensor_registry.refresh(_dw)
+        except Exception as e:
+            print(f"Sensor registry refresh failed: {e}")
+
+        await asyncio.sleep(SENSOR_REGISTRY_REFRESH_INTERVAL)
@@ -41,7 +41,8 @@ CREATE TABLE IF NOT EXISTS `cooldev_olap`.`dates_dim` (
   `min` INT NOT NULL,
   `sec` INT NOT NULL,
   `ms` INT NOT NULL,
-  PRIMARY KEY (`date_key`))
+  PRIMARY KEY (`date_key`),
+  INDEX `dates_dim_calendar_idx` (`year` ASC, `month` ASC, `day` ASC, `hour` ASC))
 ENGINE = InnoDB;
 
 
@@ -207,6 +208,101 @@ CREATE TABLE IF NOT EXISTS `cooldev_olap`.`temperatures_fact` (
 ENGINE = InnoDB;
 
 
+-- -----------------------------------------------------
+-- Table `cooldev_olap`.`hourly_rollups`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `cooldev_olap`.`hourly_rollups` (
+  `fact_table` VARCHAR(64) NOT NULL,
+  `sensor_key` INT NOT NULL,
+  `date` DATE NOT NULL,
+  `hour` INT NOT NULL,
+  `value_sum` DOUBLE NOT NULL,
+  `value_count` INT NOT NULL,
+  `value_min` FLOAT(10,3) NOT NULL,
+  `value_max` FLOAT(10,3) NOT NULL,
+  PRIMARY KEY (`fact_table`, `date`, `hour`, `sensor_key`),
+  INDEX `hourly_rollups_sensor_idx` (`fact_table`, `sensor_key`, `date`, `hour`))
+ENGINE = InnoDB;
+
+
+-- -----------------------------------------------------
+-- Table `cooldev_olap`.`daily_rollups`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `cooldev_olap`.`daily_rollups` (
+  `fact_table` VARCHAR(64) NOT NULL,
+  `sensor_key` INT NOT NULL,
+  `date` DATE NOT NULL,
+  `value_sum` DOUBLE NOT NULL,
+  `value_count` INT NOT NULL,
+  `value_min` FLOAT(10,3) NOT NULL,
+  `value_max` FLOAT(10,3) NOT NULL,
+  PRIMARY KEY (`fact_table`, `date`, `sensor_key`),
+  INDEX `daily_rollups_sensor_idx` (`fact_table`, `sensor_key`, `date`))
+ENGINE = InnoDB;
+
+
+-- -----------------------------------------------------
+-- Table `cooldev_olap`.`monthly_rollups`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `cooldev_olap`.`monthly_rollups` (
+  `fact_table` VARCHAR(64) NOT NULL,
+  `sensor_key` INT NOT NULL,
+  `year` INT NOT NULL,
+  `month` INT NOT NULL,
+  `value_sum` DOUBLE NOT NULL,
+  `value_count` INT NOT NULL,
+  `value_min` FLOAT(10,3) NOT NULL,
+  `value_max` FLOAT(10,3) NOT NULL,
+  PRIMARY KEY (`fact_table`, `year`, `month`, `sensor_key`),
+  INDEX `monthly_rollups_sensor_idx` (`fact_table`, `sensor_key`, `year`, `month`))
+ENGINE = InnoDB;
+
+
+-- -----------------------------------------------------
+-- Table `cooldev_olap`.`rollup_watermarks`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `cooldev_olap`.`rollup_watermarks` (
+  `fact_table` VARCHAR(64) NOT NULL,
+  `date_key` INT NOT NULL,
+  `updated_at` DATETIME NOT NULL,
+  `write_count` BIGINT NOT NULL DEFAULT 0,
+  `closed_changes` BIGINT NOT NULL DEFAULT 0,
+  `changed_from` DATE NULL,
+  PRIMARY KEY (`fact_table`))
+ENGINE = InnoDB;
+
+
+-- -----------------------------------------------------
+-- Table `cooldev_olap`.`sensor_roles`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `cooldev_olap`.`sensor_roles` (
+  `role` VARCHAR(64) NOT NULL,
+  `sensor_key` INT NOT NULL,
+  `position` INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (`role`, `sensor_key`),
+  INDEX `fk_sensor_roles_sensors_dim_idx` (`sensor_key` ASC),
+  CONSTRAINT `fk_sensor_roles_sensors_dim`
+    FOREIGN KEY (`sensor_key`)
+    REFERENCES `cooldev_olap`.`sensors_dim` (`sensor_key`)
+    ON DELETE CASCADE
+    ON UPDATE NO ACTION)
+ENGINE = InnoDB;
+
+INSERT IGNORE INTO `cooldev_olap`.`sensor_roles` (`role`, `sensor_key`, `position`)
+SELECT r.role, r.sensor_key, r.position FROM (
+  SELECT 'temperature' AS role, 125 AS sensor_key, 0 AS position
+  UNION ALL SELECT 'temperature', 229, 1
+  UNION ALL SELECT 'temperature', 116, 2
+  UNION ALL SELECT 'temperature', 7, 3
+  UNION ALL SELECT 'indoor_temperature', 125, 0
+  UNION ALL SELECT 'solar_production', 276, 0
+  UNION ALL SELECT 'wind_production', 286, 0) r
+JOIN `cooldev_olap`.`sensors_dim` s ON s.sensor_key = r.sensor_key;
+
+INSERT IGNORE INTO `cooldev_olap`.`sensor_roles` (`role`, `sensor_key`, `position`)
+SELECT 'battery', sensor_key, 0 FROM `cooldev_olap`.`sensors_dim` WHERE device_id = 'TB_batterypack';
+
+
 SET SQL_MODE=@OLD_SQL_MODE;
 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS;
 SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS;
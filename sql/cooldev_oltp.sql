@@ -52,4 +52,6 @@ SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS;
 SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS;
 
 
-INSERT INTO `auth_roles` (`role_id`, `role_name`) VALUES (NULL, 'user');
\ No newline at end of file
+INSERT INTO `auth_roles` (`role_id`, `role_name`) VALUES (NULL, 'user');
+INSERT INTO `auth_roles` (`role_id`, `role_name`) VALUES (NULL, 'admin');
+INSERT INTO `auth_roles` (`role_id`, `role_name`) VALUES (NULL, 'ingest');
\ No newline at end of file
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Testit ajetaan repon juuresta: python -m pytest
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,111 @@
+import datetime
+import time
+
+import pytest
+
+import cache
+from cache import ResponseCache
+
+_MARCH_5 = datetime.date(2024, 3, 5)
+_MARCH_15 = datetime.date(2024, 3, 15)
+_MARCH_25 = datetime.date(2024, 3, 25)
+
+
+# date_key n on maaliskuun n. päivä
+@pytest.fixture(autouse=True)
+def key_dates(monkeypatch):
+    monkeypatch.setattr(cache, "_key_date", lambda date_key: datetime.date(2024, 3, date_key))
+
+
+def _versions(watermark=20, write_count=0, max_key=0, closed_changes=0, changed_from=None):
+    return {"t": {"watermark": watermark, "write_count": write_count, "max_key": max_key,
+                  "closed_changes": closed_changes, "changed_from": changed_from}}
+
+
+@pytest.fixture
+def response_cache():
+    response_cache = ResponseCache(10, 60)
+    response_cache.sync_versions(_versions())
+    generation = response_cache.generation("t")
+    response_cache.put("closed_early", "a", "t", _MARCH_5, generation)
+    response_cache.put("closed_late", "b", "t", _MARCH_15, generation)
+    response_cache.put("open", "c", "t", _MARCH_25, generation)
+    return response_cache
+
+
+def test_periods_before_watermark_date_are_closed(response_cache):
+    assert response_cache.is_closed("t", _MARCH_15)
+    assert not response_cache.is_closed("t", datetime.date(2024, 3, 20))
+    assert not response_cache.is_closed("other", _MARCH_5)
+    assert response_cache.stats()["closed_entries"] == 2
+
+
+def test_watermark_advance_drops_only_open_entries(response_cache):
+    response_cache.sync_versions(_versions(watermark=21))
+
+    assert response_cache.get("closed_early") == "a"
+    assert response_cache.get("closed_late") == "b"
+    assert response_cache.get("open") is None
+
+
+def test_write_count_drops_open_entries(response_cache):
+    response_cache.sync_versions(_versions(write_count=1))
+
+    assert response_cache.get("closed_late") == "b"
+    assert response_cache.get("open") is None
+
+
+def test_max_key_only_changes_data_version(response_cache):
+    before = response_cache.data_version("t")
+    response_cache.sync_versions(_versions(max_key=7))
+
+    assert response_cache.data_version("t") != before
+    assert response_cache.get("open") == "c"
+
+
+def test_closed_change_drops_closed_entries_from_changed_date(response_cache):
+    response_cache.sync_versions(_versions(write_count=1, closed_changes=1, changed_from=datetime.date(2024, 3, 10)))
+
+    assert response_cache.get("closed_early") == "a"
+    assert response_cache.get("closed_late") is None
+    assert response_cache.get("open") is None
+
+
+def test_missed_closed_changes_drop_all_closed_entries(response_cache):
+    response_cache.sync_versions(_versions(write_count=2, closed_changes=2, changed_from=datetime.date(2024, 3, 10)))
+
+    assert response_cache.get("closed_early") is None
+    assert response_cache.get("closed_late") is None
+
+
+def test_result_from_older_generation_is_not_stored(response_cache):
+    generation = response_cache.generation("t")
+    response_cache.sync_versions(_versions(write_count=1))
+
+    response_cache.put("stale", "d", "t", _MARCH_25, generation)
+
+    assert response_cache.get("stale") is None
+
+
+def test_open_entries_expire_after_ttl(response_cache, monkeypatch):
+    now = time.monotonic()
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now + 61)
+
+    assert response_cache.get("open") is None
+    assert response_cache.get("closed_late") == "b"
+
+
+def test_invalidate_include_closed(response_cache):
+    assert response_cache.invalidate("t") == 1
+    assert response_cache.invalidate("t", include_closed=True) == 2
+    assert response_cache.stats()["entries"] == 0
+
+
+def test_lru_evicts_oldest(response_cache):
+    generation = response_cache.generation("t")
+    for i in range(10):
+        response_cache.put(i, i, "t", _MARCH_5, generation)
+
+    assert response_cache.get("closed_early") is None
+    assert response_cache.get(9) == 9
+    assert response_cache.stats()["evictions"] == 3
@@ -0,0 +1,105 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+import compression
+from compression import CompressedCache, CompressionMiddleware, choose_encoding
+
+
+@pytest.fixture
+def compressed_cache(monkeypatch):
+    compressed_cache = CompressedCache(10)
+    monkeypatch.setattr(compression, "compressed_cache", compressed_cache)
+    return compressed_cache
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    calls = {"count": 0}
+
+    @app.get("/large")
+    async def large():
+        calls["count"] += 1
+        return JSONResponse({"refreshed_at": calls["count"], "data": "x" * 4000}, headers={"ETag": 'W/"same"'})
+
+    @app.get("/constant")
+    async def constant():
+        return JSONResponse({"data": "y" * 4000}, headers={"ETag": 'W/"constant"'})
+
+    @app.get("/uncached")
+    async def uncached():
+        return JSONResponse({"data": "z" * 4000})
+
+    @app.get("/small")
+    async def small():
+        return PlainTextResponse("small")
+
+    @app.get("/stream")
+    async def stream():
+        async def rows():
+            for i in range(3):
+                yield f"{i}\n".encode() * 1000
+
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, deflate", "gzip"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("", None),
+])
+def test_choose_encoding(accept_encoding, expected):
+    assert choose_encoding(accept_encoding) == expected
+
+
+def test_large_response_is_compressed(compressed_cache, client):
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json()["data"] == "x" * 4000
+
+
+def test_small_response_is_not_compressed(compressed_cache, client):
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert response.text == "small"
+
+
+def test_streamed_response_is_compressed_in_parts(compressed_cache, client):
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == "".join(f"{i}\n" * 1000 for i in range(3))
+
+
+def test_cache_is_keyed_by_body_not_etag(compressed_cache, client):
+    first = client.get("/large", headers={"Accept-Encoding": "gzip"}).json()
+    second = client.get("/large", headers={"Accept-Encoding": "gzip"}).json()
+
+    # Sama ETag, mutta eri runko
+    assert (first["refreshed_at"], second["refreshed_at"]) == (1, 2)
+    assert compressed_cache.stats()["entries"] == 2
+
+
+def test_same_body_is_served_from_cache(compressed_cache, client):
+    for _ in range(2):
+        response = client.get("/constant", headers={"Accept-Encoding": "gzip"})
+        assert response.json() == {"data": "y" * 4000}
+
+    assert compressed_cache.stats()["entries"] == 1
+    assert compressed_cache.stats()["hits"] == 1
+
+
+def test_responses_without_etag_are_not_cached(compressed_cache, client):
+    response = client.get("/uncached", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert compressed_cache.stats()["entries"] == 0
@@ -0,0 +1,54 @@
+import datetime
+import math
+
+from downsample import Lttb
+
+_START = datetime.datetime(2024, 3, 15)
+
+
+def _downsample(series, points):
+    lttb = Lttb(len(series), points)
+    for timestamp, value in series:
+        lttb.add(timestamp, value)
+    return lttb.finish()
+
+
+def _series(count, offset=0):
+    return [(_START + datetime.timedelta(minutes=offset + i), math.sin(i / 10)) for i in range(count)]
+
+
+def test_keeps_first_and_last_point_and_returns_points():
+    series = _series(1000)
+
+    result = _downsample(series, 50)
+
+    assert len(result) == 50
+    assert result[0] == series[0]
+    assert result[-1] == series[-1]
+    assert [timestamp for timestamp, _ in result] == sorted(timestamp for timestamp, _ in result)
+
+
+def test_sparse_series_still_returns_points():
+    # Data kattaa vain pyydetyn aikavälin lopun
+    series = _series(200, offset=10000)
+
+    assert len(_downsample(series, 50)) == 50
+
+
+def test_selects_spike():
+    series = [(timestamp, 0.0) for timestamp, _ in _series(300)]
+    series[150] = (series[150][0], 100.0)
+
+    assert series[150] in _downsample(series, 10)
+
+
+def test_rows_added_after_count_go_to_last_bucket():
+    series = _series(120)
+    lttb = Lttb(100, 10)
+    for timestamp, value in series:
+        lttb.add(timestamp, value)
+
+    result = lttb.finish()
+
+    assert len(result) == 10
+    assert result[-1] == series[-1]
@@ -0,0 +1,81 @@
+import datetime
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+import cache
+import etag
+from cache import ResponseCache
+
+
+@pytest.fixture
+def response_cache(monkeypatch):
+    # date_key n on huhtikuun n. päivä, vesiraja 10.4.
+    monkeypatch.setattr(cache, "_key_date", lambda date_key: datetime.date(2024, 4, date_key))
+    response_cache = ResponseCache(10, 60)
+    monkeypatch.setattr(etag, "response_cache", response_cache)
+    return response_cache
+
+
+def _sync(response_cache, write_count=0):
+    response_cache.sync_versions({"t": {"watermark": 10, "write_count": write_count, "max_key": 0,
+                                        "closed_changes": 0, "changed_from": None}})
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/daily/month/{date}", dependencies=[Depends(etag.conditional_get("t"))])
+    async def monthly(date: str):
+        return {"data": date}
+
+    return TestClient(app)
+
+
+def test_no_etag_before_version_is_known(response_cache, client):
+    response = client.get("/daily/month/2024-03-15")
+
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+
+
+def test_closed_period_is_public(response_cache, client):
+    _sync(response_cache)
+
+    response = client.get("/daily/month/2024-03-15")
+
+    assert response.headers["etag"].startswith('W/"')
+    assert response.headers["cache-control"] == "public, no-cache"
+    assert response.headers["vary"] == "Accept"
+
+
+def test_open_period_is_no_cache(response_cache, client):
+    _sync(response_cache)
+
+    assert client.get("/daily/month/2024-04-15").headers["cache-control"] == "no-cache"
+
+
+def test_matching_if_none_match_gives_304(response_cache, client):
+    _sync(response_cache)
+    tag = client.get("/daily/month/2024-03-15").headers["etag"]
+
+    response = client.get("/daily/month/2024-03-15", headers={"If-None-Match": tag})
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == tag
+
+
+def test_etag_changes_with_shared_version_and_format(response_cache, client):
+    _sync(response_cache)
+    tag = client.get("/daily/month/2024-03-15").headers["etag"]
+
+    assert client.get("/daily/month/2024-03-15?format=columnar").headers["etag"] != tag
+    assert client.get("/daily/month/2024-03-16").headers["etag"] != tag
+
+    _sync(response_cache, write_count=1)
+    response = client.get("/daily/month/2024-03-15", headers={"If-None-Match": tag})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != tag
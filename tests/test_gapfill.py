@@ -0,0 +1,61 @@
+import datetime
+
+import pytest
+
+from gapfill import BucketGrid, fill
+
+_HOUR = datetime.timedelta(hours=1)
+_DAY = datetime.datetime(2024, 3, 15)
+
+
+def test_between_includes_both_ends():
+    grid = BucketGrid.between(_DAY, _DAY + 23 * _HOUR, _HOUR)
+
+    assert len(grid) == 24
+    assert grid.labels[0] == _DAY
+    assert grid.labels[-1] == _DAY + 23 * _HOUR
+
+
+def test_months_between_crosses_year():
+    grid = BucketGrid.months_between(datetime.date(2023, 11, 1), datetime.date(2024, 2, 1))
+
+    assert grid.labels == [datetime.date(2023, 11, 1), datetime.date(2023, 12, 1),
+                           datetime.date(2024, 1, 1), datetime.date(2024, 2, 1)]
+
+
+def test_index_outside_grid_is_none():
+    grid = BucketGrid.between(_DAY, _DAY + 2 * _HOUR, _HOUR)
+
+    assert grid.index(_DAY + 90 * datetime.timedelta(minutes=1)) == 1
+    assert grid.index(_DAY - _HOUR) is None
+    assert grid.index(_DAY + 3 * _HOUR) is None
+
+
+@pytest.mark.parametrize("policy, expected", [
+    ("zero", [0, 1.0, 0, 3.0, 0]),
+    ("null", [None, 1.0, None, 3.0, None]),
+    ("ffill", [None, 1.0, 1.0, 3.0, 3.0]),
+])
+def test_fill_policies(policy, expected):
+    grid = BucketGrid.between(_DAY, _DAY + 4 * _HOUR, _HOUR)
+    rows = [(_DAY + _HOUR, 1.0), (_DAY + 3 * _HOUR, 3.0), (_DAY + 9 * _HOUR, 9.0)]
+
+    assert fill(grid, rows, policy) == expected
+
+
+def test_fill_keeps_none_values_from_rows():
+    grid = BucketGrid.between(_DAY, _DAY + 2 * _HOUR, _HOUR)
+
+    assert fill(grid, [(_DAY, None), (_DAY + _HOUR, 2.0)], "ffill") == [None, 2.0, 2.0]
+
+
+def test_fill_columns():
+    grid = BucketGrid.between(_DAY, _DAY + _HOUR, _HOUR)
+    rows = [(_DAY + _HOUR, {"value": 5.0, "count": 2})]
+
+    assert fill(grid, rows, columns=("value", "count")) == {"value": [0, 5.0], "count": [0, 2]}
+
+
+def test_fill_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        fill(BucketGrid.between(_DAY, _DAY, _HOUR), [], "mean")
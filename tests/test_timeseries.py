@@ -0,0 +1,43 @@
+import datetime
+
+import pytest
+
+from periods import Period
+from timeseries import RANGE_MAX_BUCKETS, _fill_policy, range_period
+
+
+def test_range_period_picks_smallest_granularity_within_max_buckets():
+    assert range_period("2024-03-15", "2024-03-15", 1440) == \
+        ("minute", Period(datetime.date(2024, 3, 15), datetime.date(2024, 3, 15)))
+    assert range_period("2024-03-01", "2024-03-07", 500)[0] == "hour"
+    assert range_period("2024-01-01", "2024-12-31", 500)[0] == "day"
+
+
+def test_range_period_extends_to_whole_weeks():
+    granularity, period = range_period("2024-01-03", "2024-12-31", 100)
+
+    assert granularity == "week"
+    assert period == Period(datetime.date(2024, 1, 1), datetime.date(2025, 1, 5))
+
+
+def test_range_period_extends_to_whole_months():
+    granularity, period = range_period("2020-01-15", "2024-02-10", 100)
+
+    assert granularity == "month"
+    assert period == Period(datetime.date(2020, 1, 1), datetime.date(2024, 2, 29))
+
+
+@pytest.mark.parametrize("start, end, max_buckets", [
+    ("2024-03-15", "2024-03-01", 500),
+    ("2024-03-01", "2024-03-15", 0),
+    ("2024-03-01", "2024-03-15", RANGE_MAX_BUCKETS + 1),
+    ("2024-03-01", "15.3.2024", 500),
+])
+def test_range_period_rejects_invalid_ranges(start, end, max_buckets):
+    with pytest.raises(ValueError):
+        range_period(start, end, max_buckets)
+
+
+def test_fill_policy_by_aggregation():
+    assert [_fill_policy(aggregation) for aggregation in ("sum", "count", "avg", "min", "max")] == \
+        ["zero", "zero", "null", "null", "null"]
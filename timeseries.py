@@ -0,0 +1,525 @@
+import datetime
+import os
+import time
+from dataclasses import dataclass, replace
+from functools import cached_property
+
+from sqlalchemy import text
+
+import periods
+from cache import response_cache
+from gapfill import BucketGrid, fill
+from periods import Period
+from rollups import FACT_TABLES
+
+# Kyselyt, joiden kesto ylittää rajan (millisekunteina), tulostetaan lokiin.
+SLOW_QUERY_MS = float(os.environ.get("TIMESERIES_SLOW_QUERY_MS", 500))
+
+# Ämpärin koko -> koostetaulu, valittavat sarakkeet ja sarakkeet, joilla
+# ryhmitellään. Viikot lasketaan päiväkoosteista (viikko alkaa maanantaina).
+# Minuuteille ei ole koosteita, joten ne luetaan faktataulusta (ks.
+# _build_raw_statement).
+_GRANULARITIES = {
+    "minute": (None, None, None),
+    "hour": ("hourly_rollups", "date, hour", "date, hour"),
+    "day": ("daily_rollups", "date", "date"),
+    "week": ("daily_rollups", "DATE_SUB(date, INTERVAL WEEKDAY(date) DAY) AS week", "week"),
+    "month": ("monthly_rollups", "year, month", "year, month"),
+}
+
+# Ämpärin arvo koosteen sarakkeista laskettuna
+_AGGREGATIONS = {
+    "sum": "SUM(value_sum)",
+    "avg": "SUM(value_sum) / SUM(value_count)",
+    "min": "MIN(value_min)",
+    "max": "MAX(value_max)",
+    "count": "SUM(value_count)",
+}
+
+# Sama faktataulun riveistä laskettuna
+_RAW_AGGREGATIONS = {
+    "sum": "SUM(f.value)",
+    "avg": "AVG(f.value)",
+    "min": "MIN(f.value)",
+    "max": "MAX(f.value)",
+    "count": "COUNT(*)",
+}
+
+# Aikavälikyselyiden ämpärien koot hienoimmasta karkeimpaan
+RANGE_GRANULARITIES = ("minute", "hour", "day", "week", "month")
+
+# Columnar vastausten ajat ovat sekunteja tästä hetkestä. Ajat ovat kannan
+# aikaa sellaisenaan, niitä ei muunneta aikavyöhykkeestä toiseen.
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+_SECOND = datetime.timedelta(seconds=1)
+
+# Aikavälikyselyn ämpärien oletusmäärä ja yläraja
+RANGE_DEFAULT_BUCKETS = int(os.environ.get("RANGE_DEFAULT_BUCKETS", 500))
+RANGE_MAX_BUCKETS = int(os.environ.get("RANGE_MAX_BUCKETS", 1440))
+
+
+# Aikasarjakysely: mistä faktataulusta, miltä antureilta (None = kaikki),
+# miltä jaksolta, millä ämpärin koolla ja miten ämpärin arvo lasketaan.
+# Jos by_sensor on True, ämpärit lasketaan jokaiselle anturille erikseen.
+# Kysely on muuttumaton ja hashattava, joten sitä voi käyttää avaimena.
+@dataclass(frozen=True)
+class SeriesQuery:
+    fact_table: str
+    period: Period
+    granularity: str
+    aggregation: str = "sum"
+    sensors: tuple | None = None
+    by_sensor: bool = False
+
+    def __post_init__(self):
+        if self.fact_table not in FACT_TABLES:
+            raise ValueError(f"Unknown fact table: {self.fact_table}")
+        if self.granularity not in _GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {self.granularity}")
+        if self.aggregation not in _AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation: {self.aggregation}")
+
+
+# Aikasarja sarakkeittain: ämpärien alut ja arvot samassa järjestyksessä.
+# Ämpärin alku on minuuteille ja tunneille datetime, päiville, viikoille ja
+# kuukausille date.
+@dataclass
+class Series:
+    labels: list
+    values: list
+
+    # Muuttaa sarjan routereiden palauttamaan muotoon
+    # [{time_key: ..., value_key: ...}]. Jos label on annettu, ajankohdaksi
+    # otetaan ämpärin alun kyseinen attribuutti (esim. "hour", "day", "month").
+    def records(self, time_key: str, value_key: str, label: str | None = None):
+        if label is None:
+            return [{time_key: t, value_key: v} for t, v in zip(self.labels, self.values)]
+        return [{time_key: getattr(t, label), value_key: v} for t, v in zip(self.labels, self.values)]
+
+    # Ämpärien alut epoch sekunteina. Lasketaan kerran sarjaa kohden, joten
+    # välimuistissa olevan sarjan columnar vastaukset eivät laske niitä
+    # uudelleen.
+    @cached_property
+    def epochs(self):
+        return epoch_seconds(self.labels)
+
+    # {"t": ämpärien alut epoch sekunteina, "v": arvot}
+    def columnar(self):
+        return {"t": self.epochs, "v": self.values}
+
+    # Sarja vastausmuodon (rows tai columnar) mukaan
+    def data(self, format: str, time_key: str, value_key: str, label: str | None = None):
+        return self.columnar() if format == "columnar" else self.records(time_key, value_key, label)
+
+
+# Ämpärien alut epoch sekunteina. Päivämäärät ovat keskiyöllä.
+def epoch_seconds(labels):
+    if labels and isinstance(labels[0], datetime.datetime):
+        return [(label - _EPOCH) // _SECOND for label in labels]
+    return [(label.toordinal() - _EPOCH_ORDINAL) * 86400 for label in labels]
+
+
+# Ämpärin koko -> ruudukon askel. Kuukaudet lasketaan kalenterin mukaan.
+_GRID_STEPS = {
+    "minute": datetime.timedelta(minutes=1),
+    "hour": datetime.timedelta(hours=1),
+    "day": datetime.timedelta(days=1),
+    "week": datetime.timedelta(days=7),
+}
+
+
+# Jakson kaikkien ämpärien ruudukko (ks. gapfill.BucketGrid). Ämpärin alku
+# on minuuteille ja tunneille datetime, päiville, viikoille ja kuukausille
+# date.
+def bucket_grid(period: Period, granularity: str):
+    if granularity == "month":
+        return BucketGrid.months_between(period.start.replace(day=1), period.end)
+
+    first, last = period.start, period.end
+    if granularity == "week":
+        first -= datetime.timedelta(days=first.weekday())
+    elif granularity in ("hour", "minute"):
+        first = datetime.datetime(first.year, first.month, first.day)
+        last = datetime.datetime(last.year, last.month, last.day, 23, 59)
+
+    return BucketGrid.between(first, last, _GRID_STEPS[granularity])
+
+
+# Rakentaa kyselylle yhden SQL lauseen ja sen parametrit. Jakso rajataan
+# koostetaulujen pääavaimen sarakkeilla, jotta haku on range scan.
+# Jos fact_tables on annettu, kysely lukee kaikki taulut kerralla ja
+# riveillä on lisäksi fact_table-sarake (query.fact_table ohitetaan).
+# key_range on minuuttikyselyn jakson date_key-väli (ks. _build_raw_statement).
+def build_statement(query: SeriesQuery, fact_tables: tuple | None = None, key_range: tuple | None = None):
+    if query.granularity == "minute":
+        return _build_raw_statement(query, fact_tables, key_range)
+
+    table, select_columns, group_columns = _GRANULARITIES[query.granularity]
+    period = query.period
+
+    if fact_tables is None:
+        params = {"fact_table": query.fact_table}
+        where = ["fact_table = :fact_table"]
+    else:
+        params = {f"fact_table_{i}": fact_table for i, fact_table in enumerate(fact_tables)}
+        where = ["fact_table IN (" + ", ".join(f":{name}" for name in params) + ")"]
+        select_columns = f"fact_table, {select_columns}"
+        group_columns = f"fact_table, {group_columns}"
+
+    if query.granularity == "month":
+        where.append("year BETWEEN :start_year AND :end_year")
+        where.append("year * 12 + month BETWEEN :start_month AND :end_month")
+        params.update({"start_year": period.start.year, "end_year": period.end.year,
+                       "start_month": period.start.year * 12 + period.start.month,
+                       "end_month": period.end.year * 12 + period.end.month})
+    else:
+        where.append("date BETWEEN :start AND :end")
+        params.update({"start": period.start, "end": period.end})
+
+    if query.sensors is not None:
+        sensor_params = {f"sensor_key_{i}": key for i, key in enumerate(query.sensors)}
+        where.append("sensor_key IN (" + ", ".join(f":{name}" for name in sensor_params) + ")")
+        params.update(sensor_params)
+
+    if query.by_sensor:
+        select_columns = f"sensor_key, {select_columns}"
+        group_columns = f"sensor_key, {group_columns}"
+
+    statement = (f"SELECT {select_columns}, {_AGGREGATIONS[query.aggregation]} AS value, "
+                 "MIN(value_min) AS value_min, MAX(value_max) AS value_max "
+                 f"FROM {table} "
+                 f"WHERE {' AND '.join(where)} "
+                 f"GROUP BY {group_columns} "
+                 f"ORDER BY {group_columns};")
+
+    return text(statement), params
+
+
+# Minuuttiämpärit luetaan faktataulusta. Jakson date_key-väli
+# (periods.resolve_date_keys, yleensä kalenteri-indeksistä) rajaa
+# faktarivit pääavaimella, ja dates_dim ehto pudottaa välille osuneet
+# muiden jaksojen rivit (jälkikäteen ladatut ajankohdat). Aikavälikyselyt
+# valitsevat minuutit vain lyhyille jaksoille. Usean taulun rivit
+# yhdistetään UNION ALLilla ennen ryhmittelyä, jolloin jokainen osa käyttää
+# oman taulunsa indeksejä.
+def _build_raw_statement(query: SeriesQuery, fact_tables: tuple | None = None, key_range: tuple | None = None):
+    predicate, params = periods.calendar_predicate(query.period)
+    where = [predicate]
+
+    if key_range is not None:
+        where.append("f.date_key BETWEEN :first_key AND :last_key")
+        params.update({"first_key": key_range[0], "last_key": key_range[1]})
+
+    if query.sensors is not None:
+        sensor_params = {f"sensor_key_{i}": key for i, key in enumerate(query.sensors)}
+        where.append("f.sensor_key IN (" + ", ".join(f":{name}" for name in sensor_params) + ")")
+        params.update(sensor_params)
+
+    if fact_tables is None:
+        source = f"{query.fact_table} f JOIN dates_dim d ON d.date_key = f.date_key WHERE {' AND '.join(where)}"
+        group_columns = "d.year, d.month, d.day, d.hour, d.min"
+    else:
+        parts = [f"SELECT '{fact_table}' AS fact_table, f.sensor_key, d.year, d.month, d.day, d.hour, d.min, f.value "
+                 f"FROM {fact_table} f JOIN dates_dim d ON d.date_key = f.date_key WHERE {' AND '.join(where)}"
+                 for fact_table in fact_tables]
+        source = "(" + " UNION ALL ".join(parts) + ") f"
+        group_columns = "f.fact_table, f.year, f.month, f.day, f.hour, f.min"
+
+    if query.by_sensor:
+        group_columns = f"f.sensor_key, {group_columns}"
+
+    statement = (f"SELECT {group_columns}, {_RAW_AGGREGATIONS[query.aggregation]} AS value, "
+                 "MIN(f.value) AS value_min, MAX(f.value) AS value_max "
+                 f"FROM {source} "
+                 f"GROUP BY {group_columns} "
+                 f"ORDER BY {group_columns};")
+
+    return text(statement), params
+
+
+def _row_label(row, granularity: str):
+    if granularity == "minute":
+        return datetime.datetime(row["year"], row["month"], row["day"], row["hour"], row["min"])
+    if granularity == "hour":
+        return datetime.datetime(row["date"].year, row["date"].month, row["date"].day, row["hour"])
+    if granularity == "day":
+        return row["date"]
+    if granularity == "week":
+        return row["week"]
+    return datetime.date(row["year"], row["month"], 1)
+
+
+# Ajaa kyselyn ja palauttaa ämpärit, joilta löytyy dataa
+async def _fetch_rows(dw, query: SeriesQuery, fact_tables: tuple | None = None):
+    # Tyhjällä anturilistalla ei ole rivejä, eikä tyhjä IN () ole kelvollista SQL:ää
+    if query.sensors is not None and len(query.sensors) == 0:
+        return []
+
+    key_range = None
+    if query.granularity == "minute":
+        key_range = await periods.resolve_date_keys(dw, query.period)
+        # Jaksolla ei ole yhtään dates_dim riviä
+        if key_range is None:
+            return []
+
+    statement, params = build_statement(query, fact_tables, key_range)
+
+    start = time.perf_counter()
+    rows = (await dw.execute(statement, params)).mappings().all()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if elapsed_ms > SLOW_QUERY_MS:
+        print(f"Slow time-series query {query}: {elapsed_ms:.0f} ms")
+
+    return rows
+
+
+# Hakee aikasarjan ja täyttää ämpärit, joilta ei löydy dataa (ks.
+# _fill_policy). Tulos tallennetaan välimuistiin, joten sitä ei saa muokata.
+async def fetch_series(dw, query: SeriesQuery) -> Series:
+    key = ("series", query)
+    series = response_cache.get(key)
+
+    if series is None:
+        generation = response_cache.generation(query.fact_table)
+        grid = bucket_grid(query.period, query.granularity)
+        rows = await _fetch_rows(dw, query)
+        series = Series(grid.labels, fill(grid, ((_row_label(row, query.granularity), row["value"]) for row in rows),
+                                          _fill_policy(query.aggregation)))
+        response_cache.put(key, series, query.fact_table, query.period.end, generation)
+
+    return series
+
+
+# Hakee saman sarjan usealle faktataululle. Kyselyt saavat erota vain
+# fact_tablen osalta. Välimuistista löytyvät sarjat käytetään sellaisinaan
+# (samat avaimet kuin fetch_series), ja puuttuvat taulut haetaan yhdellä
+# fact_table IN (...) -kyselyllä. Palauttaa sarjat kyselyiden järjestyksessä.
+async def fetch_series_many(dw, queries) -> list[Series]:
+    template = queries[0]
+    if any(replace(query, fact_table=template.fact_table) != template for query in queries):
+        raise ValueError("fetch_series_many queries may only differ by fact_table")
+
+    results = {query: response_cache.get(("series", query)) for query in queries}
+    missing = [query for query in results if results[query] is None]
+
+    if len(missing) == 1:
+        results[missing[0]] = await fetch_series(dw, missing[0])
+    elif missing:
+        generations = {query: response_cache.generation(query.fact_table) for query in missing}
+        grid = bucket_grid(template.period, template.granularity)
+        found = {query.fact_table: [] for query in missing}
+
+        for row in await _fetch_rows(dw, template, tuple(found)):
+            found[row["fact_table"]].append((_row_label(row, template.granularity), row["value"]))
+
+        policy = _fill_policy(template.aggregation)
+        for query in missing:
+            series = Series(grid.labels, fill(grid, found[query.fact_table], policy))
+            response_cache.put(("series", query), series, query.fact_table, query.period.end, generations[query])
+            results[query] = series
+
+    return [results[query] for query in queries]
+
+
+# Usean anturin sarjat yhteisellä aika-akselilla sarakkeittain:
+# values[sensor_key] on samassa järjestyksessä kuin labels.
+@dataclass
+class SensorSeries:
+    labels: list
+    values: dict
+
+    def _by_key(self):
+        return {str(sensor_key): values for sensor_key, values in self.values.items()}
+
+    def as_dict(self):
+        return {"time": self.labels, "series": self._by_key()}
+
+    @cached_property
+    def epochs(self):
+        return epoch_seconds(self.labels)
+
+    def columnar(self):
+        return {"t": self.epochs, "v": self._by_key()}
+
+    def data(self, format: str):
+        return self.columnar() if format == "columnar" else self.as_dict()
+
+
+# Summat ja lukumäärät täytetään nollalla, keskiarvot, minimit ja maksimit
+# NULLilla, koska nolla olisi niille oikea mittausarvo
+def _fill_policy(aggregation: str):
+    return "zero" if aggregation in ("sum", "count") else "null"
+
+
+# Hakee annettujen antureiden sarjat yhdellä sensor_key IN (...) -kyselyllä,
+# joka ryhmitellään anturin ja ämpärin mukaan. Ämpärit, joilta anturilla
+# ei ole dataa, täytetään (ks. _fill_policy).
+async def fetch_sensor_series(dw, query: SeriesQuery) -> SensorSeries:
+    if query.sensors is None or not query.by_sensor:
+        raise ValueError("fetch_sensor_series needs a sensor list and by_sensor=True")
+
+    key = ("sensor_series", query)
+    series = response_cache.get(key)
+
+    if series is None:
+        generation = response_cache.generation(query.fact_table)
+        grid = bucket_grid(query.period, query.granularity)
+        found = {sensor_key: [] for sensor_key in query.sensors}
+
+        for row in await _fetch_rows(dw, query):
+            found[row["sensor_key"]].append((_row_label(row, query.granularity), row["value"]))
+
+        policy = _fill_policy(query.aggregation)
+        series = SensorSeries(grid.labels, {sensor_key: fill(grid, rows, policy) for sensor_key, rows in found.items()})
+        response_cache.put(key, series, query.fact_table, query.period.end, generation)
+
+    return series
+
+
+# Jakson yhteenveto. Summa, keskiarvo ja huippu lasketaan ämpärien
+# arvoista, minimi ja maksimi yksittäisistä mittauksista.
+@dataclass
+class Summary:
+    total: float
+    buckets: int
+    minimum: float | None
+    maximum: float | None
+    peak_time: datetime.date | None
+    peak_value: float | None
+
+    # Keskiarvo ämpäriä kohden. Jos count on annettu, käytetään sitä
+    # ämpäreiden lukumääränä, muuten ämpärit, joilta löytyy dataa.
+    def average(self, count: int | None = None):
+        count = self.buckets if count is None else count
+        return self.total / count if count else 0
+
+    def as_dict(self, count: int | None = None):
+        return {
+            "sum": self.total,
+            "buckets": self.buckets,
+            "avg": self.average(count),
+            "min": self.minimum,
+            "max": self.maximum,
+            "peak": None if self.peak_time is None else {"time": self.peak_time, "value": self.peak_value},
+        }
+
+
+# Laskee yhteenvedon samasta ryhmitellystä kyselystä kuin fetch_series,
+# joten summa, ämpärien määrä, keskiarvo, min, max ja huippu saadaan
+# yhdellä kannan kierroksella.
+async def fetch_summary(dw, query: SeriesQuery) -> Summary:
+    key = ("summary", query)
+    summary = response_cache.get(key)
+
+    if summary is None:
+        generation = response_cache.generation(query.fact_table)
+        summary = _summarize(await _fetch_rows(dw, query), query.granularity)
+        response_cache.put(key, summary, query.fact_table, query.period.end, generation)
+
+    return summary
+
+
+def _summarize(rows, granularity: str):
+    if len(rows) == 0:
+        return Summary(0, 0, None, None, None, None)
+
+    peak = max(rows, key=lambda row: row["value"])
+
+    return Summary(
+        total=sum(row["value"] for row in rows),
+        buckets=len(rows),
+        minimum=min(row["value_min"] for row in rows),
+        maximum=max(row["value_max"] for row in rows),
+        peak_time=_row_label(peak, granularity),
+        peak_value=peak["value"],
+    )
+
+
+# /summary/{period}/{date} -endpointtien jaksot ja niiden ämpärit samoin
+# kuin /avg/-endpointeissa
+SUMMARY_PERIODS = {
+    "day": (periods.day, "hour"),
+    "week": (periods.week, "day"),
+    "month": (periods.month, "day"),
+    "year": (periods.year, "month"),
+    "seven_day_period": (periods.seven_days, "day"),
+}
+
+
+# Nimetyn jakson yhteenveto sanakirjana. 7 päivän jakson keskiarvo
+# lasketaan aina seitsemälle päivälle kuten /avg/seven_day_period.
+async def fetch_period_summary(dw, fact_table: str, name: str, date: str, **kwargs):
+    make_period, granularity = SUMMARY_PERIODS[name]
+    period = make_period(date)
+    summary = await fetch_summary(dw, SeriesQuery(fact_table, period, granularity, **kwargs))
+
+    return summary.as_dict(count=period.days() if name == "seven_day_period" else None)
+
+
+# Ämpärien määrä jaksolla annetulla ämpärin koolla
+def bucket_count(period: Period, granularity: str):
+    if granularity == "minute":
+        return period.days() * 24 * 60
+    if granularity == "hour":
+        return period.days() * 24
+    if granularity == "day":
+        return period.days()
+    if granularity == "week":
+        first_monday = period.start - datetime.timedelta(days=period.start.weekday())
+        return (period.end - first_monday).days // 7 + 1
+    return (period.end.year - period.start.year) * 12 + period.end.month - period.start.month + 1
+
+
+# Hienoin ämpärin koko, jolla jakson ämpäreitä on enintään max_buckets.
+# Koska ämpärit karkenevat jakson kasvaessa, vastauksen koko ja kyselyn
+# lukemien rivien määrä pysyvät rajattuina.
+def range_granularity(period: Period, max_buckets: int):
+    for granularity in RANGE_GRANULARITIES:
+        if bucket_count(period, granularity) <= max_buckets:
+            return granularity
+    return RANGE_GRANULARITIES[-1]
+
+
+# Laajentaa jakson kokonaisiin viikkoihin tai kuukausiin, jotta ensimmäinen
+# ja viimeinen ämpäri eivät jää vajaiksi
+def whole_buckets(period: Period, granularity: str):
+    if granularity == "week":
+        return Period(period.start - datetime.timedelta(days=period.start.weekday()),
+                      period.end + datetime.timedelta(days=6 - period.end.weekday()))
+    if granularity == "month":
+        return Period(period.start.replace(day=1), periods.month(period.end.isoformat()).end)
+    return period
+
+
+# /range endpointtien aikaväli: palauttaa (granularity, jakso kokonaisina
+# ämpäreinä). Virheellisestä aikavälistä nostetaan ValueError.
+def range_period(start: str, end: str, max_buckets: int = RANGE_DEFAULT_BUCKETS):
+    if not 1 <= max_buckets <= RANGE_MAX_BUCKETS:
+        raise ValueError(f"max_buckets must be between 1 and {RANGE_MAX_BUCKETS}")
+
+    period = periods.between(start, end)
+    granularity = range_granularity(period, max_buckets)
+    return granularity, whole_buckets(period, granularity)
+
+
+# Aikavälin sarja automaattisesti valitulla ämpärin koolla. Palauttaa
+# (granularity, Series).
+async def fetch_range_series(dw, fact_table: str, start: str, end: str, max_buckets: int = RANGE_DEFAULT_BUCKETS,
+                             **kwargs):
+    granularity, period = range_period(start, end, max_buckets)
+    series = await fetch_series(dw, SeriesQuery(fact_table, period, granularity, **kwargs))
+
+    return granularity, series
+
+
+# Usean anturin sarjat aikaväliltä samalla ämpärin koon valinnalla kuin
+# fetch_range_series. Palauttaa (granularity, SensorSeries).
+async def fetch_range_sensor_series(dw, fact_table: str, sensors: tuple, start: str, end: str,
+                                    max_buckets: int = RANGE_DEFAULT_BUCKETS, aggregation: str = "avg"):
+    granularity, period = range_period(start, end, max_buckets)
+    query = SeriesQuery(fact_table, period, granularity, aggregation, sensors=tuple(sorted(set(sensors))),
+                        by_sensor=True)
+
+    return granularity, await fetch_sensor_series(dw, query)